@@ -1,6 +1,8 @@
 import json
 from datetime import datetime
 from app.personas import PERSONAS
+from app.recall import RECALL, RECALL_SHARE
+from app.tokens import count
 
 AGENT4OM = {
     "name": "Agent4oM",
@@ -42,6 +44,7 @@ def remember(message, role="user"):
     entry = {"timestamp": datetime.now().isoformat(), "message": message}
     AGENT4OM["memory"].append(entry)
     save_memory()
+    RECALL.index(AGENT4OM["name"], [{"role": "user", "content": message}])
 
 def build_prompt(user_input: str) -> list[dict]:
     sys_prompt = (
@@ -55,4 +58,11 @@ def build_prompt(user_input: str) -> list[dict]:
     history = AGENT4OM["memory"][-10:]
     history_msgs = [{"role": "user", "content": m["message"]} for m in history]
 
-    return [{"role": "system", "content": sys_prompt}] + history_msgs + [{"role": "user", "content": user_input}]
+    # Recent window plus the most relevant older turns from the recall archive
+    from app.registry import AGENTS        # app.registry imports this package
+    budget = AGENTS[AGENT4OM["name"]].budget
+    recalled = RECALL.relevant(AGENT4OM["name"], user_input, history_msgs,
+                               int(budget.prompt * RECALL_SHARE), lambda m: count(m, budget.family))
+
+    return ([{"role": "system", "content": sys_prompt}] + ([recalled] if recalled else [])
+            + history_msgs + [{"role": "user", "content": user_input}])
@@ -1,9 +1,12 @@
-from app.memory import load_memory, save_memory, trim_history
+import asyncio
 
-def handle_chat(agent_name, user_input):
+from app         import tokens
+from app.persistence import WRITER
+
+async def handle_chat(agent_name, user_input, family=None):
     # 🧠 Always support memory for all agents, including prompt-based ones
-    history = load_memory(agent_name)
-    trim_history(history)
-    history.append({"role": "user", "content": user_input})
-    save_memory(agent_name, history)
-    return history
+    msg = {"role": "user", "content": user_input}
+    if family:
+        tokens.count(msg, family)      # cached on the message, persisted with it
+    WRITER.append(agent_name, msg)
+    return await asyncio.to_thread(WRITER.view, agent_name)   # disk read + flock: off the loop
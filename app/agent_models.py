@@ -15,3 +15,56 @@ model_routes: dict[str, str] = {
     "Agent4.1M":          "openai:gpt-4.1", # ✅ New memory-persistent OpenAI agent   
     "Agent4oMP":          "openai:gpt-4o",  # ✅ ChatGPT-4o prompt agent with local memory
 }
+
+# ------------------------------------------------------------------
+# Per-agent behaviour switches (all optional)
+#   cache      – replay identical requests from app.response_cache
+#   cache_ttl  – seconds a cached reply stays valid (default RESPONSE_CACHE_TTL)
+#   digest     – summarize turns before they leave the window (app.digest)
+#   digest_model – local Ollama tag that writes the digest (default DIGEST_MODEL)
+#   recall     – archive turns and inject the most relevant past ones (app.recall)
+#   options    – Ollama request options (num_ctx, num_predict, num_thread, ...);
+#                defaults to num_ctx = context and num_predict = reserve from
+#                model_budgets, and a num_ctx here resizes the agent's budget
+#   prefix_block – share of the prompt budget evicted at once, to keep the
+#                prompt prefix cacheable (default PREFIX_BLOCK; 0 = exact fit)
+# ------------------------------------------------------------------
+
+agent_settings: dict[str, dict] = {
+    # "Agent4oMP": {"cache": True, "cache_ttl": 900},
+    "Agent4oM":     {"digest": True, "recall": True},
+    "Agent4oMP":    {"digest": True, "recall": True},
+    "LlamaAgent42": {"recall": True},
+}
+
+# ------------------------------------------------------------------
+# Context budgets per model tag, in tokens (see app.tokens)
+#   context    – context window; sent to Ollama as options.num_ctx
+#   reserve    – held back for the reply
+#   max_prompt – optional cap on prompt size (cost / latency)
+# Tags missing here get app.tokens.DEFAULT_BUDGET.
+# ------------------------------------------------------------------
+
+model_budgets: dict[str, dict] = {
+    "llama3:8b-instruct-q2_K":   {"context": 8192, "reserve": 1024},
+    "llama3:8b-instruct-q3_K_M": {"context": 8192, "reserve": 1024},
+    "llama3:8b-instruct-q4_K_M": {"context": 8192, "reserve": 1024},
+    "llama3:8b-instruct-q4_K":   {"context": 8192, "reserve": 1024},
+    "openai:gpt-4o":             {"context": 128_000,   "reserve": 4096, "max_prompt": 24_000},
+    "openai:gpt-4.1":            {"context": 1_047_576, "reserve": 8192, "max_prompt": 24_000},
+}
+
+# ------------------------------------------------------------------
+# Ollama model lifecycle per tag (see app.model_lifecycle)
+#   keep_alive – how long Ollama keeps the model loaded after a request
+#                ("30m", "-1" = until evicted, "0" = unload right away)
+#   preload    – load it in the background at startup, in this order, as
+#                many as OLLAMA_MAX_LOADED_MODELS allows per node
+# ------------------------------------------------------------------
+
+model_lifecycle: dict[str, dict] = {
+    "llama3:8b-instruct-q4_K_M": {"keep_alive": "30m", "preload": True},   # LlamaAgent42, WoloDaemon, Q4
+    "llama3:8b-instruct-q3_K_M": {"keep_alive": "10m"},
+    "llama3:8b-instruct-q2_K":   {"keep_alive": "5m"},
+    "llama3:8b-instruct-q4_K":   {"keep_alive": "10m"},
+}
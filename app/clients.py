@@ -0,0 +1,116 @@
+"""
+clients.py — shared, pooled upstream clients (Ollama + OpenAI)
+
+One keep-alive httpx pool per upstream, opened in the app lifespan and closed
+on shutdown, so chat turns reuse warm connections instead of paying a fresh
+TCP (and TLS) handshake each time.  Accessors create the clients lazily too,
+which keeps scripts and benches that never start the app working.
+"""
+
+from __future__ import annotations
+import asyncio, os
+from typing import AsyncIterator, Optional, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+def _env_float(name: str, default: float) -> Optional[float]:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return None if raw.lower() in ("", "none", "0") else float(raw)
+
+
+# ─────────────────────────── config ───────────────────────────
+OLLAMA_MAX_CONNECTIONS  = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_MAX_KEEPALIVE    = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "16"))
+OLLAMA_CONNECT_TIMEOUT  = _env_float("OLLAMA_CONNECT_TIMEOUT", 5.0)
+OLLAMA_READ_TIMEOUT     = _env_float("OLLAMA_READ_TIMEOUT", 120.0)      # gap between chunks
+OLLAMA_FIRST_BYTE       = _env_float("OLLAMA_FIRST_BYTE_TIMEOUT", 300.0)  # covers cold model loads
+
+OPENAI_MAX_CONNECTIONS  = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+OPENAI_MAX_KEEPALIVE    = int(os.getenv("OPENAI_MAX_KEEPALIVE", "32"))
+OPENAI_CONNECT_TIMEOUT  = _env_float("OPENAI_CONNECT_TIMEOUT", 10.0)
+OPENAI_READ_TIMEOUT     = _env_float("OPENAI_READ_TIMEOUT", 120.0)
+OPENAI_FIRST_BYTE       = _env_float("OPENAI_FIRST_BYTE_TIMEOUT", 60.0)
+OPENAI_MAX_RETRIES      = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+KEEPALIVE_EXPIRY        = _env_float("UPSTREAM_KEEPALIVE_EXPIRY", 60.0)
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = os.getenv("OPENAI_HTTP2", "1") == "1"
+except ImportError:                                                   # optional dependency
+    HTTP2 = False
+
+_ollama: Optional[httpx.AsyncClient] = None
+_openai = None
+
+
+def _pool(max_connections: int, max_keepalive: int, connect: Optional[float],
+          read: Optional[float], http2: bool = False) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(connect=connect, read=read, write=connect, pool=connect),
+    )
+
+
+def ollama() -> httpx.AsyncClient:
+    global _ollama
+    if _ollama is None or _ollama.is_closed:
+        _ollama = _pool(OLLAMA_MAX_CONNECTIONS, OLLAMA_MAX_KEEPALIVE,
+                        OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+    return _ollama
+
+
+def openai():
+    """Shared ``openai.AsyncOpenAI``; raises ``RuntimeError`` without an API key."""
+    global _openai
+    if _openai is None:
+        import openai as sdk
+
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not set in environment.")
+        _openai = sdk.AsyncOpenAI(
+            api_key=api_key,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=_pool(OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE,
+                              OPENAI_CONNECT_TIMEOUT, OPENAI_READ_TIMEOUT, http2=HTTP2),
+        )
+    return _openai
+
+
+async def first_byte(stream: AsyncIterator[T], timeout: Optional[float]) -> AsyncIterator[T]:
+    """Re-yield ``stream``, failing with ``TimeoutError`` if its first item is slower than ``timeout``."""
+    it = stream.__aiter__()
+    try:
+        first = await asyncio.wait_for(it.__anext__(), timeout)
+    except StopAsyncIteration:
+        return
+    yield first
+    async for item in it:
+        yield item
+
+
+async def startup() -> None:
+    ollama()
+    if os.getenv("OPENAI_API_KEY"):
+        openai()
+
+
+async def shutdown() -> None:
+    global _ollama, _openai
+    if _ollama is not None:
+        await _ollama.aclose()
+        _ollama = None
+    if _openai is not None:
+        await _openai.close()
+        _openai = None
@@ -0,0 +1,257 @@
+"""
+digest.py — rolling summaries of old conversation memory
+
+Applies to agents with ``"digest": True`` in ``app.agent_models.agent_settings``.
+When such an agent's live memory takes more than ``DIGEST_TRIGGER`` of its
+prompt budget, a background task folds the oldest turns into a "memory
+digest", keeping ``DIGEST_KEEP`` of the budget as raw recent turns.  Only
+after that does it evict the folded turns from the raw log.  Each pass
+summarizes the previous digest plus the newly evicted span, so no turn is
+summarized twice.
+
+Digests live in their own log (``<agent>.digest.jsonl``, newest last), apart
+from the raw turns.  ``with_digest`` puts the latest digest in front of the
+recent window when a prompt is built.  The summarizer is any
+``async (previous, span) -> str``: the default asks a local Ollama model
+through the scheduler, and benches pass a stub.
+"""
+
+from __future__ import annotations
+import asyncio, os
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from app              import clients, memory, tokens
+from app.model_lifecycle import MODELS
+from app.ollama_pool  import POOL
+from app.scheduler    import SCHEDULER
+
+DIGEST_MODEL   = os.getenv("DIGEST_MODEL", "llama3:8b-instruct-q4_K_M")
+DIGEST_TRIGGER = float(os.getenv("DIGEST_TRIGGER", "0.75"))   # share of the prompt budget
+DIGEST_KEEP    = float(os.getenv("DIGEST_KEEP", "0.4"))
+DIGEST_PREFIX  = "Memory digest of the earlier conversation:\n"
+
+Summarizer = Callable[[Optional[str], List[Dict]], Awaitable[str]]
+
+_INSTRUCTIONS = (
+    "You keep a running memory digest for a chat assistant. Merge the previous "
+    "digest with the new conversation excerpt into one concise digest of at most "
+    "200 words. Keep names, facts, decisions, preferences and open tasks; drop "
+    "small talk. Reply with the digest only."
+)
+
+
+def digest_key(agent: str) -> str:
+    return f"{agent}.digest"
+
+
+def latest(agent: str) -> Optional[Dict]:
+    found = memory.tail_memory(digest_key(agent), 1)
+    return found[0] if found else None
+
+
+def with_digest(agent: str, history: List[Dict]) -> List[Dict]:
+    """``history`` with the agent's latest digest after any leading system messages."""
+    digest = latest(agent)
+    if digest is None:
+        return history
+    digest = {k: digest[k] for k in ("role", "content", "tokens") if k in digest}
+    i = 0
+    while i < len(history) and history[i].get("role") == "system":
+        i += 1
+    return history[:i] + [digest] + history[i:]
+
+
+def _excerpt(previous: Optional[str], span: List[Dict]) -> List[Dict]:
+    lines = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in span)
+    return [
+        {"role": "system", "content": _INSTRUCTIONS},
+        {"role": "user", "content": f"Previous digest:\n{previous or '(none)'}\n\nNew excerpt:\n{lines}"},
+    ]
+
+
+async def ollama_summarize(model: str, agent: str, previous: Optional[str], span: List[Dict]) -> str:
+    """One non-streaming Ollama call, queued behind chat traffic like any other stream."""
+    ticket = SCHEDULER.submit(f"{agent}:digest", model)
+    try:
+        await ticket.acquire()
+        node = POOL.pick(model)
+        if node is None:
+            raise RuntimeError("No healthy Ollama node")
+        payload = {
+            "model":    model,
+            "stream":   False,
+            "messages": _excerpt(previous, span),
+            "options":  MODELS.options(model),            # same load options: no reload
+        }
+        if MODELS.keep_alive(model) is not None:
+            payload["keep_alive"] = MODELS.keep_alive(model)
+        node.outstanding += 1
+        try:
+            resp = await clients.ollama().post(node.chat_url, json=payload)
+            resp.raise_for_status()
+        except httpx.HTTPError as exc:
+            status = exc.response.status_code if isinstance(exc, httpx.HTTPStatusError) else None
+            if status is None or status >= 500:
+                node.failed()
+            raise
+        finally:
+            node.outstanding -= 1
+        node.succeeded()
+        return resp.json()["message"]["content"]
+    finally:
+        ticket.release()
+
+
+class Digester:
+    def __init__(self, summarizer: Optional[Summarizer] = None,
+                 trigger: float = DIGEST_TRIGGER, keep: float = DIGEST_KEEP):
+        self.summarizer = summarizer
+        self.trigger    = trigger
+        self.keep       = keep
+        self.waiting: Set[str] = set()
+        self.current: Optional[str] = None
+        self.passes   = 0
+        self.folded   = 0
+        self.failures = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task:  Optional[asyncio.Task]  = None
+
+    # ── request path ─────────────────────────────────────────
+    def poke(self, rec) -> None:
+        """Note that ``rec`` took a turn; cheap, the check itself runs in the background."""
+        if not rec.digest or rec.name in self.waiting:
+            return
+        self._ensure_running()
+        self.waiting.add(rec.name)
+        self._queue.put_nowait(rec)
+
+    # ── background side ──────────────────────────────────────
+    def _span(self, rec) -> List[Dict]:
+        """Oldest unpinned turns to fold, or ``[]`` while under the trigger."""
+        view   = memory.load_memory(rec.name)
+        family = rec.budget.family
+        total  = tokens.prompt_tokens(view, family)
+        if total <= rec.budget.prompt * self.trigger:
+            return []
+        keep  = rec.budget.prompt * self.keep
+        room  = tokens.budget_for(rec.digest_model or DIGEST_MODEL).prompt // 2   # summarizer input
+        taken = 0
+        end   = 1
+        while end < len(view) - 2 and total - taken > keep:
+            n = tokens.count(view[end], family)
+            if taken and taken + n > room:
+                break
+            taken += n
+            end   += 1
+        return view[1:end]
+
+    async def _summarize(self, rec, previous: Optional[str], span: List[Dict]) -> str:
+        if self.summarizer is not None:
+            return await self.summarizer(previous, span)
+        return await ollama_summarize(rec.digest_model or DIGEST_MODEL, rec.name, previous, span)
+
+    @staticmethod
+    def _commit(agent: str, record: Dict, span: List[Dict]) -> int:
+        """Store the digest, then evict whatever of ``span`` is still at the front."""
+        memory.update_memory(digest_key(agent), lambda view: view.append(record))
+
+        def drop(view: List[Dict]) -> int:
+            if len(view) < 2 or view[1] not in span:
+                return 0                                 # already trimmed away elsewhere
+            j = span.index(view[1])
+            n = 0
+            while j + n < len(span) and 1 + n < len(view) - 2 and view[1 + n] == span[j + n]:
+                n += 1
+            del view[1:1 + n]
+            return n
+
+        return memory.update_memory(agent, drop)
+
+    async def compact(self, rec) -> int:
+        """Fold until ``rec`` is back under its trigger; returns turns folded."""
+        lock = _try_lock(rec.name)
+        if lock is None:
+            return 0                                     # another worker is on it
+        folded = 0
+        try:
+            while True:
+                span = await asyncio.to_thread(self._span, rec)
+                if not span:
+                    return folded
+                prev = await asyncio.to_thread(latest, rec.name)
+                text = await self._summarize(rec, prev and prev["content"][len(DIGEST_PREFIX):], span)
+                record = {
+                    "role":    "system",
+                    "content": DIGEST_PREFIX + text.strip(),
+                    "covers":  (prev or {}).get("covers", 0) + len(span),
+                }
+                tokens.count(record, rec.budget.family)
+                dropped = await asyncio.to_thread(self._commit, rec.name, record, span)
+                self.passes += 1
+                self.folded += dropped
+                folded      += dropped
+                if not dropped:
+                    return folded
+        finally:
+            _unlock(lock)
+
+    async def _run(self) -> None:
+        while True:
+            rec = await self._queue.get()
+            self.waiting.discard(rec.name)
+            self.current = rec.name
+            try:
+                await self.compact(rec)
+            except Exception as exc:
+                self.failures += 1
+                print("🧠 [DIGEST ERROR]:", rec.name, repr(exc))
+            finally:
+                self.current = None
+
+    def _ensure_running(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def start(self) -> None:
+        self._ensure_running()
+
+    async def drain(self) -> None:
+        """Wait until every poked agent has been checked."""
+        while self.waiting or self.current is not None:
+            await asyncio.sleep(0.01)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {"waiting": len(self.waiting), "passes": self.passes,
+                "folded": self.folded, "failures": self.failures}
+
+
+def _try_lock(agent: str) -> Optional[int]:
+    """Non-blocking cross-process claim on compacting ``agent``; ``None`` if taken."""
+    fd = os.open(memory.lock_path(f"{agent}.digesting"), os.O_RDWR | os.O_CREAT, 0o644)
+    if memory.fcntl is not None:
+        try:
+            memory.fcntl.flock(fd, memory.fcntl.LOCK_EX | memory.fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+    return fd
+
+
+def _unlock(fd: int) -> None:
+    os.close(fd)                                         # closing drops the flock
+
+
+DIGESTS = Digester()
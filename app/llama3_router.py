@@ -3,28 +3,41 @@ llama3_router.py — FastAPI ↔ LLM bridge (Ollama or OpenAI)
 """
 
 from __future__ import annotations
-import json, os
-from typing import AsyncGenerator, Dict, List
+import asyncio, os, time
+from contextlib import aclosing
+from dataclasses import replace
+from functools import partial
+from typing import AsyncGenerator, Dict, List, Optional, Union
 
 import httpx
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-
-from app.agent_models import model_routes
-from app.memory       import load_memory, save_memory, trim_history
-from app.loadouts     import LOADOUTS
-from app.personas     import PERSONAS
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+from app              import clients, metrics, sse, tokens
+from app.digest       import DIGESTS, with_digest
+from app.recall       import RECALL, RECALL_SHARE
+from app.looplag      import LOOP_LAG
+from app.model_lifecycle import MODELS
+from app.persistence  import WRITER
+from app.ollama_pool  import POOL
+from app.registry     import AGENTS, AGENT_NAMES, OLLAMA_MODELS
+from app.response_cache import CACHE, cache_key
+from app.scheduler    import SCHEDULER, QueueStatus
+from app.singleflight import FLIGHTS, SINGLEFLIGHT, Flight, flight_key
+from app.stream_decode import OllamaDecoder, OllamaStats
 
 from agents.chat_engine      import handle_chat
-from agents.agent4_1m_core   import Agent4_1M
 
-OLLAMA_URL        = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
-EXCLUDE_MEMORY    = {"LlamaBear", "Agent4o"}
 router            = APIRouter()
 
+MESSAGES_PAGE     = int(os.getenv("MESSAGES_PAGE", "20"))
+MESSAGES_MAX_PAGE = int(os.getenv("MESSAGES_MAX_PAGE", "500"))
+SEND_MANY_MAX     = int(os.getenv("SEND_MANY_MAX", "16"))         # agents per /send_many
+SSE_HEADERS       = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 def list_agents() -> List[str]:
-    return sorted(model_routes.keys())
+    return list(AGENT_NAMES)
 
 
 @router.get("/agents")
@@ -32,218 +45,449 @@ async def agents():
     return list_agents()
 
 
+def _etag_matches(header: str, etag: str) -> bool:
+    """``If-None-Match`` check: a list of tags or ``*``, compared weakly (RFC 9110)."""
+    want = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == want:
+            return True
+    return False
+
+
 @router.get("/messages/{agent}")
-async def history(agent: str):
-    raw = load_memory(agent)[-20:]
-    shaped: List[Dict[str, str]] = []
-    for m in raw:
-        role = m.get("role")
+async def history(agent: str, req: Request, before: Optional[int] = None,
+                  limit: int = MESSAGES_PAGE, compact: bool = False):
+    """
+    A page of the agent's history, oldest first: ``limit`` records older than
+    record ``before`` (default: the newest).  ``X-Next-Before`` (and a
+    ``Link: rel="next"``) point at the next older page.  The ``ETag`` changes
+    only when the history does, so pollers get 304s.  ``compact=1`` returns
+    ``[id, from, text]`` triples.
+    """
+    if agent not in AGENTS:
+        raise HTTPException(404, detail=f"Unknown agent: {agent}")
+    if not 1 <= limit <= MESSAGES_MAX_PAGE:
+        raise HTTPException(400, detail=f"limit must be between 1 and {MESSAGES_MAX_PAGE}")
+    if before is not None and before < 0:
+        raise HTTPException(400, detail="before must be >= 0")
+
+    etag = f'W/"{await asyncio.to_thread(WRITER.stamp, agent)}-{limit}-{int(compact)}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(req.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    page, _ = await asyncio.to_thread(WRITER.page, agent, before, limit)
+    shaped: List = []
+    for seq, m in page:
         text = (m.get("content") or "").strip()
         if not text: continue
-        shaped.append({
-            "from": "me" if role == "user" else agent,
-            "text": text,
-        })
-    return shaped
+        sender = "me" if m.get("role") == "user" else agent
+        shaped.append([seq, sender, text] if compact else {"id": seq, "from": sender, "text": text})
+
+    if page and page[0][0] > 0:
+        older = page[0][0]
+        headers["X-Next-Before"] = str(older)
+        link = req.url.include_query_params(before=older)
+        headers["Link"] = f'<{link}>; rel="next"'
+    return JSONResponse(shaped, headers=headers)
 
 
 @router.get("/health")
 async def health():
-    try:
-        async with httpx.AsyncClient(timeout=2) as c:
-            ok = (await c.get(OLLAMA_URL.replace("/chat", "/tags"))).status_code == 200
-    except httpx.RequestError:
-        ok = False
-    return {"ollama_up": ok}
-
-
-def resolve_loadout(agent: str):
-    loadout = LOADOUTS.get(agent)
-    if loadout:
-        return (
-            loadout["persona"],
-            model_routes.get(loadout["model"], loadout["model"]),
-            loadout.get("tools", []),
-        )
-    return agent, model_routes.get(agent, agent), []
-
-
-async def _ollama_stream(payload: Dict) -> AsyncGenerator[str, None]:
-    headers = {"Accept": "text/event-stream"}
-    try:
-        async with httpx.AsyncClient(timeout=None) as cli, \
-                   cli.stream("POST", OLLAMA_URL, json=payload, headers=headers) as resp:
-
-            if resp.status_code == 404:
-                raise RuntimeError("Ollama daemon not reachable")
+    return {
+        "ollama_up":     POOL.up,
+        "ollama_nodes":  POOL.status(),
+        "agents":        len(AGENT_NAMES),
+        "ollama_models": OLLAMA_MODELS,
+        "ollama_queue":  SCHEDULER.snapshot(),
+        "ollama_lifecycle": MODELS.stats(),
+        "response_cache": CACHE.stats(),
+        "singleflight":  FLIGHTS.stats(),
+        "memory_writer": WRITER.stats(),
+        "memory_digest": DIGESTS.stats(),
+        "recall":        RECALL.stats(),
+        "loop_lag":      LOOP_LAG.stats(),
+    }
+
+
+metrics.Callback("chat_ollama_queued", "Requests waiting for a scheduler ticket.", lambda: SCHEDULER.queued)
+metrics.Callback("chat_ollama_running", "Ollama streams holding a scheduler ticket.", lambda: SCHEDULER.active)
+metrics.Callback("chat_memory_pending", "Memory appends not yet on disk.", lambda: WRITER.queued)
+metrics.Callback("chat_loop_lag_p99_seconds", "Event-loop stall p99 over the recent window.",
+                 lambda: (LOOP_LAG.stats()["p99_ms"] or 0) / 1000)
+
+
+@router.get("/metrics")
+async def prometheus():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+async def _ollama_stream(payload: Dict) -> AsyncGenerator[Union[str, OllamaStats], None]:
+    """
+    Stream from the best Ollama node, failing over to the next one until the
+    first token.  Yields content strings, then the final ``OllamaStats``.
+    """
+    cli     = clients.ollama()
+    tried: List = []
+    error: Exception = RuntimeError("No healthy Ollama node")
+
+    while True:
+        node = POOL.pick(payload.get("model"), exclude=tried)
+        if node is None:
+            if isinstance(error, asyncio.TimeoutError):
+                raise HTTPException(504, "Ollama first-byte timeout") from error
+            raise HTTPException(502, str(error)) from error
+        tried.append(node)
+
+        started = False
+        node.outstanding += 1
+        try:
+            req  = cli.build_request("POST", node.chat_url, json=payload)
+            resp = await asyncio.wait_for(cli.send(req, stream=True), clients.OLLAMA_FIRST_BYTE)
+            try:
+                if resp.status_code == 404:
+                    raise RuntimeError("Ollama daemon not reachable")
 
-            resp.raise_for_status()
+                resp.raise_for_status()
 
-            async for line in resp.aiter_lines():
-                if not line or not line.startswith("data:"): continue
-                try:
-                    obj   = json.loads(line[5:].lstrip())
-                    chunk = obj.get("message", {}).get("content") or ""
-                    if chunk:
+                decoder = OllamaDecoder()
+                async for data in clients.first_byte(resp.aiter_bytes(), clients.OLLAMA_FIRST_BYTE):
+                    for chunk in decoder.feed(data):
+                        started = True
                         yield chunk
-                    if obj.get("done"):
+                    if decoder.done:
                         break
-                except json.JSONDecodeError:
-                    continue
-    except (httpx.HTTPError, RuntimeError) as exc:
-        raise HTTPException(502, str(exc)) from exc
-
-
-async def _openai_stream(payload: Dict) -> AsyncGenerator[str, None]:
-    import openai
+                for chunk in decoder.close():
+                    started = True
+                    yield chunk
+            finally:
+                await resp.aclose()
+            node.succeeded()
+            if decoder.stats is not None:
+                yield decoder.stats
+            return
+        except (httpx.HTTPError, RuntimeError, asyncio.TimeoutError) as exc:
+            status = exc.response.status_code if isinstance(exc, httpx.HTTPStatusError) else None
+            if not isinstance(exc, RuntimeError) and (status is None or status >= 500):
+                node.failed()                      # a 404/4xx is about the model, not the node
+            if started:
+                raise HTTPException(502, str(exc)) from exc
+            error = exc
+        finally:
+            node.outstanding -= 1
+
+
+async def _ollama_scheduled(payload: Dict, agent: str) -> AsyncGenerator[Union[str, QueueStatus], None]:
+    """``_ollama_stream`` behind the scheduler; yields ``QueueStatus`` while waiting, then ``SENT``."""
+    ticket = SCHEDULER.submit(agent, payload["model"])
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY not set in environment.")
-
-        client = openai.AsyncOpenAI(api_key=api_key)
+        async for status in ticket.wait():
+            yield status
+        metrics.QUEUE_WAIT.labels(agent, payload["model"]).observe(time.monotonic() - ticket.enqueued)
+        yield metrics.SENT                         # TTFT and latency start here, not at submit
+        async for chunk in _ollama_stream(payload):
+            yield chunk
+    finally:
+        ticket.release()
+
+
+async def _openai_stream(payload: Dict) -> AsyncGenerator[Union[str, metrics.PromptUsage], None]:
+    """Yields content strings, then the reported prompt usage (``PromptUsage``)."""
+    try:
+        client = clients.openai()
 
         if "prompt" in payload:
-            response = await client.responses.create(
-                prompt=payload["prompt"],
-                input=payload["input"],
+            # Responses API: text arrives as response.output_text.delta events.
+            response = await asyncio.wait_for(
+                client.responses.create(
+                    prompt=payload["prompt"],
+                    input=payload["input"],
+                    stream=True,
+                ),
+                clients.OPENAI_FIRST_BYTE,
             )
-            yield response.output_text
+            async with response:                   # closing the flight drops the upstream request
+                async for event in clients.first_byte(response, clients.OPENAI_FIRST_BYTE):
+                    if event.type == "response.output_text.delta":
+                        yield event.delta
+                    elif event.type == "response.completed" and event.response.usage:
+                        usage  = event.response.usage
+                        cached = getattr(usage.input_tokens_details, "cached_tokens", 0) or 0
+                        yield metrics.PromptUsage(usage.input_tokens, cached)
+                    elif event.type == "response.failed":
+                        raise RuntimeError(getattr(event.response.error, "message", None) or "response failed")
+                    elif event.type == "error":
+                        raise RuntimeError(event.message)
             return
 
-        response = await client.chat.completions.create(
-            model=payload["model"],
-            messages=payload["messages"],
-            stream=True,
+        response = await asyncio.wait_for(
+            client.chat.completions.create(
+                model=payload["model"],
+                messages=payload["messages"],
+                stream=True,
+                stream_options={"include_usage": True},
+            ),
+            clients.OPENAI_FIRST_BYTE,
         )
 
-        async for part in response:
-            if part.choices:
-                chunk = part.choices[0].delta.content or ""
-                if isinstance(chunk, bytes):
-                    chunk = chunk.decode("utf-8")
-                yield chunk
+        async with response:
+            async for part in clients.first_byte(response, clients.OPENAI_FIRST_BYTE):
+                if part.choices:
+                    chunk = part.choices[0].delta.content or ""
+                    if isinstance(chunk, bytes):
+                        chunk = chunk.decode("utf-8")
+                    yield chunk
+                elif part.usage:                       # last chunk, from include_usage
+                    details = part.usage.prompt_tokens_details
+                    yield metrics.PromptUsage(part.usage.prompt_tokens,
+                                              getattr(details, "cached_tokens", 0) or 0)
 
     except Exception as e:
         print("🧠 [OPENAI STREAM ERROR]:", repr(e))
         raise HTTPException(status_code=500, detail=f"OpenAI Error: {str(e)}")
 
 
+def _remember(rec, role: str, text: str) -> None:
+    msg = { "role": role, "content": text }
+    tokens.count(msg, rec.budget.family)            # counted once, stored with the message
+    WRITER.append(rec.name, msg)
+
+
+def _reply_text(chunks: List) -> str:
+    return "".join(c for c in chunks if isinstance(c, str))
+
+
+async def _recalled(backend, rec, user_text: str, payload: Dict) -> AsyncGenerator:
+    """
+    Run ``backend`` with the most relevant archived turns added after the
+    leading system messages, or, when the agent keeps a stable prompt prefix
+    (``budget.block``), just before the newest message, so that the per-turn
+    block doesn't break the cached prefix.  The lookup runs inside the flight,
+    in a thread, so ``/send`` never awaits before the flight is registered.
+    """
+    field   = "input" if "input" in payload else "messages"
+    history = payload[field]
+    quoted  = await asyncio.to_thread(RECALL.relevant, rec.name, user_text, history,
+                                      int(rec.budget.prompt * RECALL_SHARE),
+                                      partial(tokens.count, family=rec.budget.family))
+    if quoted is not None:
+        i = 0
+        while i < len(history) and history[i].get("role") == "system":
+            i += 1
+        if rec.budget.block:
+            i = max(i, len(history) - 1)
+        payload = {**payload, field: history[:i] + [tokens.wire([quoted])[0]] + history[i:]}
+    async for chunk in backend(payload):
+        yield chunk
+
+
 @router.post("/send")
 async def chat(req: Request):
     body = await req.json()
     want_stream = bool(body.get("stream"))
+    window      = sse.window(body) if want_stream else None
     agent = (body.get("to") or "").strip()
 
-    if not agent or agent not in model_routes:
+    rec = AGENTS.get(agent)
+    if rec is None:
         raise HTTPException(400, detail=f"Invalid or missing agent: {agent}")
 
-    persona_tag, model_tag, tools = resolve_loadout(agent)
+    user_text = body.get("text") or body.get("message") or ""
+    is_turn   = rec.uses_prompt or "messages" not in body
+    if is_turn and not user_text.strip():
+        raise HTTPException(400, detail="Missing message content.")
 
-    if model_tag.lower() == "llama3":
-        model_tag = "llama3:8b-instruct-q4_K_M"
+    flight = _flight(rec, body, user_text, is_turn)
 
-    is_openai = model_tag.startswith("openai:")
-    backend = _openai_stream if is_openai else _ollama_stream
-    payload = {"stream": True}
+    if want_stream:
+        return StreamingResponse(
+            metrics.client(sse.frames(flight, *window), agent, rec.model),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
 
-    # Load prompt agent
-    try:
-        from importlib import import_module
+    # fallback: full non-streaming answer
+    reply = await _collect(agent, flight)
+    if "error" in reply:
+        return JSONResponse({"from": agent, "error": reply["error"]}, status_code=reply.pop("status"))
+    return reply
+
+
+@router.post("/send_many")
+async def chat_many(req: Request):
+    """
+    One message to several agents at once.  Each agent's turn runs exactly
+    as ``/send`` would run it (memory, coalescing, scheduler limits), all
+    concurrently; the streams share one SSE connection, every frame tagged
+    with its ``agent``, and a final untagged ``{"done": true}`` closes it.
+    An agent that can't start (e.g. a full Ollama queue) gets an error frame
+    and the others carry on.  Without ``stream`` the replies come back
+    together, in request order.
+    """
+    body = await req.json()
+    want_stream = bool(body.get("stream"))
+    window      = sse.window(body) if want_stream else None
+
+    names = body.get("to")
+    if not isinstance(names, list) or not names or not all(isinstance(n, str) for n in names):
+        raise HTTPException(400, detail="'to' must be a non-empty list of agent names")
+    names   = list(dict.fromkeys(n.strip() for n in names))      # each agent answers once
+    unknown = [n for n in names if n not in AGENTS]
+    if unknown:
+        raise HTTPException(400, detail=f"Invalid agents: {', '.join(unknown)}")
+    if len(names) > SEND_MANY_MAX:
+        raise HTTPException(400, detail=f"At most {SEND_MANY_MAX} agents per request")
+
+    user_text = body.get("text") or body.get("message") or ""
+    if not user_text.strip():
+        raise HTTPException(400, detail="Missing message content.")
+
+    flights: Dict[str, Union[Flight, HTTPException]] = {}
+    for agent in names:
         try:
-            agent_module = import_module(f"agents.{agent.lower().replace('.', '_')}_core")
-        except ModuleNotFoundError:
-            agent_module = import_module(f"agents.{agent.lower().replace('.', '_')}")
-        agent_class = getattr(agent_module, agent.replace(".", "_"))
-        use_prompt = hasattr(agent_class, "prompt_id")
-        prompt_class = agent_class if use_prompt else None
-    except Exception as e:
-        print("❌ Prompt agent import failed:", repr(e))
-        use_prompt = False
-        prompt_class = None
-
-    if use_prompt:
-        user_text = body.get("text") or body.get("message") or ""
-        if not user_text.strip():
-            raise HTTPException(400, detail="Missing message content.")
-        payload["prompt"] = {
-            "id": prompt_class.prompt_id,
-            "version": prompt_class.prompt_version or "1"
+            flights[agent] = _flight(AGENTS[agent], {"text": user_text}, user_text, True)
+        except HTTPException as exc:                       # this agent can't start; the rest can
+            flights[agent] = exc
+
+    if want_stream:
+        streams = {
+            agent: sse.failed(f.detail) if isinstance(f, HTTPException)
+                   else metrics.client(sse.frames(f, *window), agent, AGENTS[agent].model)
+            for agent, f in flights.items()
         }
-        payload["input"] = user_text
+        return StreamingResponse(sse.multiplex(streams), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def reply(agent: str, f) -> Dict:
+        if isinstance(f, HTTPException):
+            return {"from": agent, "error": f.detail}
+        out = await _collect(agent, f)
+        out.pop("status", None)
+        return out
+
+    return {"replies": await asyncio.gather(*(reply(a, f) for a, f in flights.items()))}
+
+
+def _flight(rec, body: Dict, user_text: str, is_turn: bool) -> Flight:
+    """
+    The flight that answers ``body`` for ``rec``: one already running for the
+    same turn or payload, or a new one that persists the reply when it ends.
+    """
+    agent = rec.name
+    # A repeated memory turn (UI retry, second tab) would differ from the
+    # original only by its own duplicated user message, so such turns are
+    # coalesced on (agent, text) before anything is persisted.
+    key    = None
+    flight = None
+    if SINGLEFLIGHT and is_turn and rec.memory:
+        key    = flight_key("turn", agent, user_text)
+        flight = FLIGHTS.get(key)
+
+    if flight is not None:
+        return flight
+    if not rec.is_openai:
+        SCHEDULER.check_capacity()                 # refuse with 503 before streaming starts
+
+    def on_done(chunks: List) -> None:
+        answer = _reply_text(chunks)
+        if rec.memory and answer.strip():
+            _remember(rec, "assistant", answer)
+            DIGESTS.poke(rec)
+
+    if is_turn and rec.memory:
+        # The history comes from disk: load it inside the flight, in a thread,
+        # so nothing awaits between the lookup above and registering the flight.
+        return FLIGHTS.start(key, _memory_turn(rec, body, user_text), on_done=on_done)
+
+    backend, payload, prompt = _build_request(rec, body, user_text)
+    if SINGLEFLIGHT:
+        key    = flight_key("payload", payload)
+        flight = FLIGHTS.get(key)
+        if flight is not None:
+            return flight
+    stream = metrics.upstream(backend(payload), agent, rec.model, prompt)
+    return FLIGHTS.start(key, stream, on_done=on_done)
+
+
+async def _memory_turn(rec, body: Dict, user_text: str) -> AsyncGenerator:
+    """
+    A memory agent's own turn: persist the user message, load the history (and
+    digest) off the loop, then stream the reply.  Prompt agents keep memory
+    under their own name; the others share their persona's.
+    """
+    try:
+        # 🧠 handle_chat persists the user turn for memory agents
+        history = await handle_chat(rec.name if rec.uses_prompt else rec.persona, user_text, rec.budget.family)
+        if rec.digest:
+            history = await asyncio.to_thread(with_digest, rec.name, _with_persona(rec, history))
+    except (OSError, ValueError) as exc:
+        print("🧠 [MEMORY LOAD ERROR]:", rec.name, repr(exc))
+        raise HTTPException(500, detail=f"Memory error: {exc}")
+    backend, payload, prompt = _build_request(rec, body, user_text, history)
+    async with aclosing(metrics.upstream(backend(payload), rec.name, rec.model, prompt)) as stream:
+        async for chunk in stream:
+            yield chunk
+
+
+async def _collect(agent: str, flight: Flight) -> Dict:
+    """The whole reply of ``flight``, or its error (with the HTTP ``status``)."""
+    try:
+        chunks = [ch async for ch in flight.subscribe()]
+    except HTTPException as exc:
+        return {"from": agent, "error": exc.detail, "status": exc.status_code}
 
-        # 🧠 Save user input for prompt agents
-        if agent not in EXCLUDE_MEMORY:
-            history = load_memory(agent)
-            trim_history(history)
-            history.append({ "role": "user", "content": user_text })
-            save_memory(agent, history)
+    reply = {"from": agent, "text": _reply_text(chunks)}
+    stats = next((c for c in chunks if isinstance(c, OllamaStats)), None)
+    if stats is not None:
+        reply["stats"] = stats.as_dict()
+    return reply
 
-    else:
-        if "messages" in body:
-            history = body["messages"]
-        else:
-            user_text = body.get("text") or body.get("message") or ""
-            if not user_text.strip():
-                raise HTTPException(400, detail="Missing message content.")
-            history = handle_chat(persona_tag, user_text)
-
-            # 🧠 Save user input for regular chat agents
-            if agent not in EXCLUDE_MEMORY:
-                mem = load_memory(agent)
-                trim_history(mem)
-                mem.append({ "role": "user", "content": user_text })
-                save_memory(agent, mem)
-
-        if is_openai and not any(m["role"] == "system" for m in history):
-            history.insert(0, {"role": "system", "content": persona_tag})
-
-        payload["model"] = model_tag.split("openai:")[-1]
-        payload["messages"] = history
 
-    print("🛰️ [PAYLOAD SENT TO BACKEND]", json.dumps(payload, indent=2))
+def _with_persona(rec, history: List[Dict]) -> List[Dict]:
+    if rec.is_openai and not rec.uses_prompt and (not history or history[0]["role"] != "system"):
+        history.insert(0, {"role": "system", "content": rec.system_prompt})   # persona first, always
+    return history
 
-    if want_stream:
-        async def sse():
-            collected: List[str] = []
-            try:
-                async for chunk in backend(payload):
-                    if chunk.strip():
-                        collected.append(chunk)
-                        text = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
-                        yield f"data: {json.dumps({'data': text, 'done': False})}\n\n".encode()
-            except HTTPException as exc:
-                yield f"data: {json.dumps({'error': exc.detail, 'done': True})}\n\n".encode()
-                return
-
-            yield b'data: {"done": true}\n\n'
-
-            if collected and agent not in EXCLUDE_MEMORY:
-                history = load_memory(agent)
-                trim_history(history)
-                history.append({ "role": "assistant", "content": "".join(collected) })
-                save_memory(agent, history)
 
-        return StreamingResponse(
-            sse(),
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
-        )
+def _build_request(rec, body: Dict, user_text: str, history: Optional[List[Dict]] = None):
+    """
+    Pick the backend and build the upstream payload.  ``history`` is a memory
+    turn's loaded history (see ``_memory_turn``); without it the body's
+    ``messages``, or just the turn, go upstream.
+    """
+    agent   = rec.name
+    backend = _openai_stream if rec.is_openai else partial(_ollama_scheduled, agent=agent)
+    payload = {"stream": True}
 
-    # fallback: full non-streaming answer
-    try:
-        answer_parts: List[str] = []
-        async for ch in backend(payload):
-            if ch.strip():
-                answer_parts.append(ch)
-        answer = "".join(answer_parts)
-    except HTTPException as exc:
-        return JSONResponse(exc.status_code, {"from": agent, "error": exc.detail})
+    # Prompt agents always answer the turn from their own memory (kept under
+    # their name); the stored prompt carries the instructions.
+    own = rec.uses_prompt or "messages" not in body
+    if history is None:
+        history = [{"role": "user", "content": user_text}] if own else body["messages"]
+    history = _with_persona(rec, history)
+
+    budget = rec.budget
+    if rec.recall and own:
+        # Hold back RECALL_SHARE of the prompt for the recalled turns.
+        budget  = replace(budget, reserve=budget.reserve + int(budget.prompt * RECALL_SHARE))
+        backend = partial(_recalled, backend, rec, user_text)
+    history = tokens.fit(history, budget)
+    prompt  = tokens.prompt_tokens(history, budget.family)
+    history = tokens.wire(history)
+
+    if rec.uses_prompt:
+        payload["prompt"] = {"id": rec.prompt_id, "version": rec.prompt_version}
+        payload["input"]  = history
+    else:
+        payload["model"]    = rec.model
+        payload["messages"] = history
+        if not rec.is_openai:
+            payload["options"] = dict(rec.options)          # num_ctx matches the fitted history
+            if rec.keep_alive is not None:
+                payload["keep_alive"] = rec.keep_alive
 
-    if agent not in EXCLUDE_MEMORY:
-        history = load_memory(agent)
-        trim_history(history)
-        history.append({ "role": "assistant", "content": answer })
-        save_memory(agent, history)
+    if rec.cache:
+        backend = partial(CACHE.stream, cache_key(rec, payload), backend, ttl=rec.cache_ttl)
 
-    return {"from": agent, "text": answer}
+    metrics.log_payload(agent, payload)
+    return backend, payload, prompt
@@ -0,0 +1,51 @@
+"""
+looplag.py — event-loop stall monitor
+
+A ticker sleeps ``interval`` seconds in a loop and records how late it wakes
+up.  Anything blocking the loop (sync file I/O, heavy JSON) shows up as lag,
+so stalls are visible in ``/health`` rather than only as slow streams.
+"""
+
+from __future__ import annotations
+import asyncio, time
+from collections import deque
+from typing import Dict, Optional
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.05, window: int = 1200):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=window)
+        self.worst    = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - t0 - self.interval)
+            self.samples.append(lag)
+            self.worst = max(self.worst, lag)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        if not self.samples:
+            return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+        ordered = sorted(self.samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+        return {"p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": round(self.worst * 1000, 2)}
+
+
+LOOP_LAG = LoopLagMonitor()
@@ -3,16 +3,54 @@ Application bootstrap
 Only the /api/chat router is exposed (no legacy aliases).
 """
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app import clients
+from app.digest import DIGESTS
+from app.looplag import LOOP_LAG
+from app.model_lifecycle import MODELS
+from app.ollama_pool import POOL
+from app.persistence import WRITER
+from app.recall import RECALL
+from app.registry import AGENTS
 from app.llama3_router import router as chat_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await clients.startup()          # pooled upstream connections
+    POOL.start()                     # background Ollama node health checks
+    MODELS.start()                   # preload hot models; readiness doesn't wait
+    WRITER.start()                   # write-behind memory flusher
+    DIGESTS.start()                  # background memory summarization
+    RECALL.enable(r.name for r in AGENTS.values() if r.recall)
+    warm = asyncio.create_task(asyncio.to_thread(RECALL.warm))   # load archives off the loop
+    LOOP_LAG.start()
+    try:
+        yield
+    finally:
+        await WRITER.stop()          # drain pending memory before anything else
+        try:
+            await warm               # the thread can't be cancelled; let it finish
+        except Exception as exc:
+            print("🧠 [RECALL WARM ERROR]:", repr(exc))
+        await LOOP_LAG.stop()
+        await DIGESTS.stop()
+        await MODELS.stop()
+        await POOL.stop()
+        await clients.shutdown()
+
+
 app = FastAPI(
     title="Llama-Chat API",
     version="0.2.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
 )
 
 # ─────────────────────────── CORS ────────────────────────────
@@ -1,25 +1,686 @@
-import os
-import json
+"""
+memory.py — per-agent conversation store
+
+Every agent owns an append-only JSONL log (``<agent>.jsonl``, one message per
+line) and a binary offset index (``<agent>.idx``).  A turn appends only the new
+messages; trimming just moves the window start kept in the index header, so a
+turn costs the same whether the log holds a hundred messages or a million.
+
+    idx layout:  magic "LCIX" | u32 version | u64 window start | u64 log inode
+                 followed by one little-endian u64 byte offset per record
+
+Record 0 is pinned (``trim_history`` never evicts index 0), so the live history
+is ``[record 0] + records[start:]``.  Dead records are reclaimed by compaction,
+which rewrites both files via fsync + rename.  Legacy ``<agent>.json`` files
+are migrated on first access, or in bulk with ``python -m app.memory migrate``.
+
+Every operation runs under a per-agent lock: a thread lock inside the process
+plus an advisory ``flock`` on ``<agent>.lock`` across processes, and refreshes
+from disk first.  That makes the store safe under ``uvicorn --workers N``:
+concurrent turns from any worker append, never overwrite each other.
+``on_save`` hooks (the recall archive) see every saved message once the lock
+is released, whichever entry point saved it.
+"""
+
+from __future__ import annotations
+import json, os, struct, sys, threading
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from app.metrics import MEMORY_IO, timed
+
+MEMORY_DIR        = os.getenv("MEMORY_DIR") or os.path.join(os.path.dirname(__file__), '..', 'memory')
+MAX_HISTORY_CHARS = 96_000
+TRIM_BLOCK_CHARS  = int(os.getenv("MEMORY_TRIM_BLOCK", "12000"))   # trim this far below the cap at once
+COMPACT_MIN_DEAD  = 512                                  # dead records before compaction kicks in
+FSYNC_APPENDS     = os.getenv("MEMORY_FSYNC", "0") == "1"
+
+try:
+    import fcntl
+except ImportError:                                      # non-POSIX: in-process locking only
+    fcntl = None
+
+_IDX_MAGIC   = b"LCIX"
+_IDX_VERSION = 1
+_IDX_HEADER  = struct.Struct("<4sIQQ")
 
-MEMORY_DIR = os.path.join(os.path.dirname(__file__), '..', 'memory')
 os.makedirs(MEMORY_DIR, exist_ok=True)
 
+
 def memory_path(agent_name):
+    """Legacy whole-file JSON path (migration source only)."""
     return os.path.join(MEMORY_DIR, f"{agent_name}.json")
 
+
+def log_path(agent_name):
+    return os.path.join(MEMORY_DIR, f"{agent_name}.jsonl")
+
+
+def index_path(agent_name):
+    return os.path.join(MEMORY_DIR, f"{agent_name}.idx")
+
+
+def lock_path(agent_name):
+    return os.path.join(MEMORY_DIR, f"{agent_name}.lock")
+
+
+def _chat_records(records) -> List[Dict]:
+    """
+    Legacy records as chat messages: ``{timestamp, message}`` entries (the old
+    Agent4oM store) become user messages; anything else without ``content``
+    is skipped.
+    """
+    out = []
+    for rec in records if isinstance(records, list) else []:
+        if not isinstance(rec, dict):
+            continue
+        if isinstance(rec.get("content"), str):
+            out.append(rec)
+        elif isinstance(rec.get("message"), str):
+            out.append({"role": rec.get("role") or "user", "content": rec["message"]})
+    return out
+
+
+def _encode(msg: Dict) -> bytes:
+    return json.dumps(msg).encode() + b"\n"
+
+
+def _offsets_to_bytes(offsets: array) -> bytes:
+    if sys.byteorder == "big":
+        offsets = array("Q", offsets)
+        offsets.byteswap()
+    return offsets.tobytes()
+
+
+def _offsets_from_bytes(raw: bytes) -> array:
+    offsets = array("Q")
+    offsets.frombytes(raw[: len(raw) - len(raw) % 8])
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return offsets
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class History:
+    """
+    Conversation history with message 0 pinned and the rest in a deque.
+    Running character (and, given ``count_tokens``, token) totals are kept as
+    messages come and go, so trimming costs O(evicted) rather than a full
+    re-sum per eviction.  Round-trips the stored list-of-dicts format via
+    ``from_list`` / ``to_list``.
+    """
+
+    __slots__ = ("head", "body", "chars", "tokens", "count_tokens")
+
+    def __init__(self, messages: Iterable[Dict] = (),
+                 count_tokens: Optional[Callable[[Dict], int]] = None):
+        self.head: Optional[Dict] = None
+        self.body: deque = deque()
+        self.chars  = 0
+        self.tokens = 0
+        self.count_tokens = count_tokens
+        self.extend(messages)
+
+    @classmethod
+    def from_list(cls, messages: Iterable[Dict],
+                  count_tokens: Optional[Callable[[Dict], int]] = None) -> "History":
+        return cls(messages, count_tokens)
+
+    def to_list(self) -> List[Dict]:
+        return list(self)
+
+    def __len__(self) -> int:
+        return len(self.body) + (self.head is not None)
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self.head is not None:
+            yield self.head
+        yield from self.body
+
+    def _account(self, msg: Dict, sign: int) -> None:
+        self.chars += sign * len(msg.get("content") or "")
+        if self.count_tokens:
+            self.tokens += sign * self.count_tokens(msg)
+
+    def append(self, msg: Dict) -> None:
+        if self.head is None:
+            self.head = msg
+        else:
+            self.body.append(msg)
+        self._account(msg, 1)
+
+    def extend(self, msgs: Iterable[Dict]) -> None:
+        for m in msgs:
+            self.append(m)
+
+    def evict(self, n: int = 1) -> int:
+        """Drop up to ``n`` of the oldest unpinned messages; returns how many went."""
+        n = min(n, len(self.body))
+        for _ in range(n):
+            self._account(self.body.popleft(), -1)
+        return n
+
+    def tail(self, n: int) -> List[Dict]:
+        if n <= 0:
+            return []
+        if n >= len(self):
+            return self.to_list()
+        return list(islice(reversed(self.body), n))[::-1]
+
+    def trim(self, max_chars: int = MAX_HISTORY_CHARS, max_tokens: Optional[int] = None) -> int:
+        """
+        Once over budget, evict in one go to ``TRIM_BLOCK_CHARS`` (at most an
+        eighth of the cap) under it, so the window start moves once per block
+        rather than every turn; the pinned head and newest message stay.
+        """
+        if self.chars <= max_chars and (max_tokens is None or self.tokens <= max_tokens):
+            return 0
+        max_chars -= min(TRIM_BLOCK_CHARS, max_chars // 8)
+        evicted = 0
+        while len(self.body) > 1 and (
+            self.chars > max_chars or (max_tokens is not None and self.tokens > max_tokens)
+        ):
+            self._account(self.body.popleft(), -1)
+            evicted += 1
+        return evicted
+
+
+class MemoryView(list):
+    """
+    The list ``load_memory`` hands out: copies of the stored messages, so
+    editing one never touches the store's cache.  It remembers which objects
+    (and which ``content`` strings) it was loaded with, so ``save_memory`` can
+    tell a front trim plus appends, the common case, from any other edit
+    without comparing contents; anything else is saved by a full rewrite.
+    ``chars`` carries the store's running total so ``trim_history`` need not
+    re-sum an untouched view.
+    """
+
+    __slots__ = ("agent", "base", "chars", "chars_at")
+
+    def __init__(self, agent: str, items: List[Dict], chars: Optional[int] = None):
+        super().__init__(dict(m) for m in items)
+        self._rebase(agent)
+        self._stamp_chars(chars)
+
+    def _rebase(self, agent: str) -> None:
+        self.agent = agent
+        self.base  = [(m, m.get("content")) for m in self]
+
+    def _kept(self) -> Optional[int]:
+        """
+        How many loaded messages were trimmed off the front if the view is
+        otherwise the loaded one plus appends, else ``None``.
+        """
+        base = self.base
+        if not base:
+            return 0
+        tail = base[-1][0]
+        for last in range(min(len(self), len(base)) - 1, -1, -1):
+            if self[last] is tail:
+                break
+        else:
+            return None
+        evict = len(base) - (last + 1)
+        if evict < 0 or (evict and last < 1):
+            return None
+        ours = islice(self, last + 1)
+        kept = base[:1] + base[1 + evict:] if evict else base
+        if all(m is b and m.get("content") is c for m, (b, c) in zip(ours, kept)):
+            return evict
+        return None
+
+    def _stamp_chars(self, chars: Optional[int]) -> None:
+        self.chars    = chars
+        self.chars_at = (len(self), self[-1] if self else None)
+
+    def known_chars(self) -> Optional[int]:
+        if self.chars is None:
+            return None
+        n, last = self.chars_at
+        if len(self) != n or (self[-1] if self else None) is not last:
+            return None
+        return self.chars
+
+
+class _AgentLog:
+    """Open state of one agent's log + index; refreshed when the files change."""
+
+    def __init__(self, agent: str):
+        self.agent    = agent
+        self.log      = log_path(agent)
+        self.idx      = index_path(agent)
+        self.offsets  = array("Q")
+        self.start    = 1
+        self.size     = 0
+        self.stamp: Optional[tuple] = None
+        self.cache: Optional[History] = None            # parsed live window
+        self.mutex    = threading.RLock()
+        self.depth    = 0
+        self.lock_fd: Optional[int] = None
+        self.fresh: List[Dict] = []                     # saved since the lock was taken
+
+    @contextmanager
+    def locked(self):
+        """
+        Exclusive across threads and processes; re-entrant within a thread.
+        Messages saved under the lock go to the ``on_save`` hooks once the
+        outermost hold is released, so hooks never run under it.
+        """
+        fresh = None
+        with self.mutex:
+            if fcntl is not None and self.depth == 0:
+                if self.lock_fd is None:
+                    self.lock_fd = os.open(lock_path(self.agent), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+            self.depth += 1
+            try:
+                yield self
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    if fcntl is not None:
+                        fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+                    fresh, self.fresh = self.fresh, []
+        if fresh:
+            _notify(self.agent, fresh)
+
+    def _stamp(self, st: os.stat_result) -> tuple:
+        """Log identity + size, and the index mtime (catches header-only window moves)."""
+        try:
+            idx_mtime = os.stat(self.idx).st_mtime_ns
+        except FileNotFoundError:
+            idx_mtime = 0
+        return st.st_ino, st.st_size, idx_mtime
+
+    # ── state ────────────────────────────────────────────────
+    @property
+    def count(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def live(self) -> int:
+        return 0 if not self.offsets else 1 + self.count - self.start
+
+    def refresh(self) -> None:
+        try:
+            st = os.stat(self.log)
+        except FileNotFoundError:
+            legacy = memory_path(self.agent)
+            self.offsets, self.start, self.size, self.stamp = array("Q"), 1, 0, None
+            self.cache = None
+            if os.path.exists(legacy):
+                with open(legacy, "r") as f:
+                    self.rewrite(_chat_records(json.load(f)))
+            return
+
+        if self.stamp == self._stamp(st):
+            return
+        self.cache = None
+        if self.stamp and self.stamp[0] == st.st_ino and st.st_size > self.size:
+            self._load_index(st, since=self.count)          # another writer appended
+        else:
+            self._load_index(st, since=0)
+
+    def _load_index(self, st: os.stat_result, since: int) -> None:
+        header = None
+        try:
+            with open(self.idx, "rb") as f:
+                header = _IDX_HEADER.unpack(f.read(_IDX_HEADER.size))
+                f.seek(_IDX_HEADER.size + 8 * since)
+                fresh = _offsets_from_bytes(f.read())
+        except (FileNotFoundError, struct.error):
+            fresh = None
+
+        if header is None or fresh is None or header[0] != _IDX_MAGIC or header[3] != st.st_ino:
+            self._rebuild(st)
+            return
+
+        if since:
+            self.offsets.extend(fresh)
+        else:
+            self.offsets = fresh
+        self.start = header[2]
+        self.size  = st.st_size
+        self._recover()
+        self.stamp = self._stamp(os.stat(self.log))
+
+    def _rebuild(self, st: os.stat_result) -> None:
+        self.offsets, self.start, self.size = array("Q"), 1, st.st_size
+        self._recover()
+        self._write_index()
+        self.stamp = self._stamp(os.stat(self.log))
+
+    def _recover(self) -> None:
+        """Index any records appended after the last indexed offset; drop a torn tail."""
+        before = (self.count, self.start)
+        while self.offsets and self.offsets[-1] >= self.size:
+            self.offsets.pop()
+        pos = self.offsets[-1] if self.offsets else 0
+        with open(self.log, "rb") as f:
+            f.seek(pos)
+            tail = f.read()
+
+        known = bool(self.offsets)
+        cut   = 0
+        while True:
+            nl = tail.find(b"\n", cut)
+            if nl < 0:
+                break
+            if known:
+                known = False                               # first line is already indexed
+            else:
+                self.offsets.append(pos + cut)
+            cut = nl + 1
+
+        if cut < len(tail):                                 # torn write from a crash
+            if self.offsets and self.offsets[-1] == pos + cut:
+                self.offsets.pop()
+            with open(self.log, "r+b") as f:
+                f.truncate(pos + cut)
+            self.size = pos + cut
+        self.start = max(1, min(self.start, self.count))
+        if (self.count, self.start) != before:
+            self._write_index()
+
+    # ── io ───────────────────────────────────────────────────
+    def _write_index(self, header_only: bool = False) -> None:
+        if not os.path.exists(self.log):
+            return
+        ino = os.stat(self.log).st_ino
+        header = _IDX_HEADER.pack(_IDX_MAGIC, _IDX_VERSION, self.start, ino)
+        if header_only and os.path.exists(self.idx):
+            with open(self.idx, "r+b") as f:
+                f.write(header)
+            return
+        with open(self.idx, "wb") as f:
+            f.write(header + _offsets_to_bytes(self.offsets))
+
+    def _read_range(self, f, first: int, last: int) -> List[Dict]:
+        """Records ``first`` .. ``last`` (exclusive) from an open log handle."""
+        if first >= last:
+            return []
+        begin = self.offsets[first]
+        end   = self.offsets[last] if last < self.count else self.size
+        f.seek(begin)
+        return [json.loads(line) for line in f.read(end - begin).splitlines()]
+
+    def read(self) -> List[Dict]:
+        return self.window().to_list()
+
+    def window(self) -> History:
+        if self.cache is None:
+            if not self.offsets:
+                self.cache = History()
+            else:
+                with open(self.log, "rb") as f:
+                    self.cache = History(self._read_range(f, 0, 1) + self._read_range(f, self.start, self.count))
+        return self.cache
+
+    def tail(self, n: int) -> List[Dict]:
+        if not self.offsets or n <= 0:
+            return []
+        if n >= self.live or self.cache is not None:
+            return self.window().tail(n)
+        with open(self.log, "rb") as f:
+            return self._read_range(f, self.count - n, self.count)
+
+    def page(self, before: int, limit: int) -> List[tuple]:
+        """
+        Up to ``limit`` live records numbered below ``before``, oldest first,
+        as ``(seq, message)``.  Only the page is read from disk.
+        """
+        before = min(before, self.count)
+        if not self.offsets or limit <= 0 or before <= 0:
+            return []
+        hi = before
+        lo = max(self.start, hi - limit)
+        with open(self.log, "rb") as f:
+            out = list(zip(range(lo, hi), self._read_range(f, lo, hi))) if lo < hi else []
+            if len(out) < limit and (lo <= self.start or hi <= self.start):
+                out[:0] = [(0, self._read_range(f, 0, 1)[0])]     # the pinned record
+        return out
+
+    def append(self, msgs: List[Dict], evict: int = 0) -> None:
+        if not msgs and evict <= 0:
+            return
+        if msgs:
+            lines = [_encode(m) for m in msgs]
+            with open(self.log, "ab") as f:
+                pos = f.tell()
+                f.write(b"".join(lines))
+                f.flush()
+                if FSYNC_APPENDS:
+                    os.fsync(f.fileno())
+            new = array("Q")
+            for line in lines:
+                new.append(pos)
+                pos += len(line)
+            first_write = not self.offsets
+            self.offsets.extend(new)
+            self.size = pos
+            if first_write or not os.path.exists(self.idx):
+                self._write_index()
+            else:
+                with open(self.idx, "ab") as f:
+                    f.write(_offsets_to_bytes(new))
+
+        if evict > 0:
+            self.start = min(self.start + evict, self.count)
+            self._write_index(header_only=True)
+        if self.cache is not None:
+            self.cache.extend(dict(m) for m in msgs)        # the caller keeps its own objects
+            self.cache.evict(evict)
+        self.stamp = self._stamp(os.stat(self.log))
+
+        dead = self.start - 1
+        if dead >= COMPACT_MIN_DEAD and dead > self.live:
+            self.compact()
+
+    def rewrite(self, msgs: List[Dict]) -> None:
+        """Atomically replace log + index with ``msgs`` (fsync, then rename)."""
+        window = History(dict(m) for m in msgs)         # fails here, before any file changes
+        offsets, pos, chunks = array("Q"), 0, []
+        for m in msgs:
+            line = _encode(m)
+            offsets.append(pos)
+            chunks.append(line)
+            pos += len(line)
+
+        tmp_log, tmp_idx = self.log + ".tmp", self.idx + ".tmp"
+        with open(tmp_log, "wb") as f:
+            f.write(b"".join(chunks))
+            f.flush()
+            os.fsync(f.fileno())
+            ino = os.fstat(f.fileno()).st_ino
+        with open(tmp_idx, "wb") as f:
+            f.write(_IDX_HEADER.pack(_IDX_MAGIC, _IDX_VERSION, 1, ino) + _offsets_to_bytes(offsets))
+            f.flush()
+            os.fsync(f.fileno())
+        # A crash between the renames leaves an index whose inode no longer
+        # matches the log; the next open notices and rebuilds from the log.
+        os.replace(tmp_log, self.log)
+        os.replace(tmp_idx, self.idx)
+        _fsync_dir(self.log)
+
+        self.offsets, self.start, self.size = offsets, 1, pos
+        self.stamp = self._stamp(os.stat(self.log))
+        self.cache = window
+
+    def compact(self) -> None:
+        self.rewrite(self.read())
+
+
+_logs: Dict[str, _AgentLog] = {}
+_hooks: List[Callable[[str, List[Dict]], None]] = []
+
+
+def on_save(hook: Callable[[str, List[Dict]], None]) -> None:
+    """Call ``hook(agent, messages)`` with the new messages of every save."""
+    _hooks.append(hook)
+
+
+def _notify(agent_name: str, msgs: List[Dict]) -> None:
+    for hook in _hooks:
+        try:
+            hook(agent_name, msgs)
+        except Exception as exc:
+            print("🧠 [MEMORY HOOK ERROR]:", agent_name, repr(exc))
+
+
+def _log(agent_name: str) -> _AgentLog:
+    log = _logs.get(agent_name)
+    if log is None:
+        log = _logs.setdefault(agent_name, _AgentLog(agent_name))
+    return log
+
+
+def has_history(agent_name) -> bool:
+    """Whether ``agent_name`` has a log (or a legacy file); takes no lock."""
+    return os.path.exists(log_path(agent_name)) or os.path.exists(memory_path(agent_name))
+
+
+def locked(agent_name):
+    """Hold ``agent_name``'s store lock across several calls (re-entrant)."""
+    return _log(agent_name).locked()
+
+
 def load_memory(agent_name):
-    path = memory_path(agent_name)
-    if not os.path.exists(path):
-        return []
-    with open(path, 'r') as f:
-        return json.load(f)
+    with timed(MEMORY_IO, agent_name, "load"), _log(agent_name).locked() as log:
+        log.refresh()
+        window = log.window()
+        return MemoryView(agent_name, window.to_list(), window.chars)
+
+
+def tail_memory(agent_name, n):
+    """Last ``n`` live messages, read straight from the index (no full load)."""
+    with _log(agent_name).locked() as log:
+        log.refresh()
+        return log.tail(n)
+
+
+def page_memory(agent_name, before: Optional[int] = None, limit: int = 20):
+    """
+    ``(page, end)``: up to ``limit`` live messages older than record number
+    ``before`` (default: the newest) as ``(seq, message)`` pairs, oldest first,
+    and the number the next appended record will get.  Cost follows ``limit``,
+    not the history length.  Seq numbers hold until the log is compacted.
+    """
+    with timed(MEMORY_IO, agent_name, "page"), _log(agent_name).locked() as log:
+        log.refresh()
+        end = log.count
+        return log.page(end if before is None else before, limit), end
+
+
+def memory_stamp(agent_name) -> str:
+    """Changes whenever the live history does (append, trim, rewrite)."""
+    with _log(agent_name).locked() as log:
+        log.refresh()
+        if log.stamp is None:
+            return "0"
+        return f"{log.stamp[0]:x}-{log.size:x}-{log.start:x}"
+
 
 def save_memory(agent_name, history):
-    path = memory_path(agent_name)
-    with open(path, 'w') as f:
-        json.dump(history, f)
-
-def trim_history(history):
-    MAX_HISTORY_CHARS = 96_000
-    while sum(len(m["content"]) for m in history) > MAX_HISTORY_CHARS and len(history) > 2:
-        history.pop(1)
+    with timed(MEMORY_IO, agent_name, "save"), _log(agent_name).locked() as log:
+        log.refresh()
+        _save(log, agent_name, history)
+
+
+def update_memory(agent_name, edit: Callable[[MemoryView], object]):
+    """
+    Load, let ``edit`` change the view in place (append / trim), and save, all
+    under one hold of the agent lock, so no other worker can interleave.
+    Returns whatever ``edit`` returns.
+    """
+    with timed(MEMORY_IO, agent_name, "save"), _log(agent_name).locked() as log:
+        log.refresh()
+        window = log.window()
+        view   = MemoryView(agent_name, window.to_list(), window.chars)
+        result = edit(view)
+        _save(log, agent_name, view)
+        return result
+
+
+def _save(log: _AgentLog, agent_name, history):
+    if isinstance(history, MemoryView) and history.agent == agent_name:
+        evict = history._kept()
+        if evict is not None:
+            # Anything other workers appended since our load stays put.
+            fresh = history[len(history.base) - evict:]
+            log.append(fresh, evict)
+            log.fresh.extend(fresh)
+            history._rebase(agent_name)
+            return
+
+    # Not a view we handed out (or edited beyond append/trim): replace wholesale.
+    stored = {(m.get("role"), m.get("content")) for m in log.window()}
+    log.rewrite(list(history))
+    log.fresh.extend(m for m in history if (m.get("role"), m.get("content")) not in stored)
+    if isinstance(history, MemoryView):
+        history._rebase(agent_name)
+
+
+def migrate_all() -> List[str]:
+    """One-shot migration of every legacy ``<agent>.json``; originals are left in place."""
+    done = []
+    for name in sorted(os.listdir(MEMORY_DIR)):
+        agent, ext = os.path.splitext(name)
+        if ext == ".json" and not os.path.exists(log_path(agent)):
+            with _log(agent).locked() as log:
+                log.refresh()
+            done.append(agent)
+    return done
+
+
+def trim_history(history, max_chars=MAX_HISTORY_CHARS):
+    """
+    Once ``history`` is over ``max_chars``, evict the oldest messages after
+    index 0 until it is ``TRIM_BLOCK_CHARS`` (at most an eighth of the cap)
+    under, keeping at least two messages.  The window start then moves once
+    per block rather than every turn, so the prompt prefix stays cacheable.
+    A ``History`` trims in O(evicted); a fresh ``load_memory`` view reuses the
+    store's running total; any other list is summed once and cut with a
+    single slice delete.
+    """
+    if isinstance(history, History):
+        return history.trim(max_chars)
+
+    total = history.known_chars() if isinstance(history, MemoryView) else None
+    if total is None:
+        total = sum(len(m.get("content") or "") for m in history)
+
+    cut = 1
+    if total > max_chars:
+        max_chars -= min(TRIM_BLOCK_CHARS, max_chars // 8)
+    while total > max_chars and len(history) - (cut - 1) > 2:
+        total -= len(history[cut]["content"])
+        cut += 1
+    if cut > 1:
+        del history[1:cut]
+    if isinstance(history, MemoryView):
+        history._stamp_chars(total)
+    return cut - 1
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        for agent in migrate_all():
+            print(f"migrated {agent}")
+    else:
+        print("usage: python -m app.memory migrate")
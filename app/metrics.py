@@ -0,0 +1,302 @@
+"""
+metrics.py — in-process request metrics, exposed in Prometheus text format
+
+Histograms keep a preallocated list of bucket counts per label set; an
+observation is one ``bisect`` and two integer adds, with no lock.  Nearly
+every observation happens on the event loop.  Memory timings also come from
+the writer's worker thread, and a lost increment there is acceptable.
+Buckets are cumulated only when ``/api/chat/metrics`` renders.  Each uvicorn
+worker keeps its own numbers, so every series carries a ``pid`` label.
+
+``log_payload`` replaces the old pretty-printed payload dump.  It samples
+``PAYLOAD_LOG_SAMPLE`` of requests and prints one JSON line capped at
+``PAYLOAD_LOG_MAX`` bytes, and nothing is serialised for unsampled requests.
+"""
+
+from __future__ import annotations
+import abc, json, os, random, time
+from bisect import bisect_left
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.stream_decode import OllamaStats
+
+PAYLOAD_LOG_SAMPLE = float(os.getenv("PAYLOAD_LOG_SAMPLE", "0.01"))
+PAYLOAD_LOG_MAX    = int(os.getenv("PAYLOAD_LOG_MAX", "2048"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+IO_BUCKETS      = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+RATE_BUCKETS    = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+
+_PID = str(os.getpid())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    pairs.append(f'pid="{_PID}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, n: float = 1) -> None:
+        self.value += n
+
+    def dec(self, n: float = 1) -> None:
+        self.value -= n
+
+
+class _Family(abc.ABC):
+    kind   = ""
+    suffix = ""                                          # on every sample name, and so on HELP/TYPE
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name   = name
+        self.help   = help
+        self.names  = tuple(labels)
+        self.series: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        child = self.series.get(values)
+        if child is None:
+            child = self.series[values] = self._child()
+        return child
+
+    def _child(self) -> object:
+        """A fresh series; a plain value unless the family keeps more."""
+        return _Value()
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name}{self.suffix} {self.help}")
+        out.append(f"# TYPE {self.name}{self.suffix} {self.kind}")
+        for values, child in list(self.series.items()):
+            self._render(out, values, child)
+
+    @abc.abstractmethod
+    def _render(self, out: List[str], values: Tuple[str, ...], child) -> None:
+        """Append the sample lines of one series."""
+
+
+class Counter(_Family):
+    kind   = "counter"
+    suffix = "_total"
+
+    def _render(self, out, values, child) -> None:
+        out.append(f"{self.name}{self.suffix}{_labels(self.names, values)} {child.value:g}")
+
+
+class Gauge(Counter):
+    kind   = "gauge"
+    suffix = ""
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)            # last slot is +Inf
+        self.sum    = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+
+    def _child(self) -> _Buckets:
+        return _Buckets(self.bounds)
+
+    def _render(self, out, values, child) -> None:
+        total = 0
+        for bound, n in zip(self.bounds + (float("inf"),), list(child.counts)):
+            total += n
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+            out.append(f"{self.name}_bucket{_labels(self.names, values, le)} {total}")
+        out.append(f"{self.name}_sum{_labels(self.names, values)} {child.sum:.6g}")
+        out.append(f"{self.name}_count{_labels(self.names, values)} {total}")
+
+
+class Callback(_Family):
+    """A gauge read from ``fn()`` at scrape time: a number, or ``{label values: number}``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def render(self, out: List[str]) -> None:
+        value = self.fn()
+        if not isinstance(value, dict):
+            value = {(): value}
+        self.series = {k if isinstance(k, tuple) else (k,): v for k, v in value.items()}
+        super().render(out)
+
+    def _render(self, out, values, value) -> None:
+        if value is not None:
+            out.append(f"{self.name}{_labels(self.names, values)} {value:g}")
+
+
+REGISTRY: List[_Family] = []
+
+
+class PromptUsage(NamedTuple):
+    """Prompt accounting an OpenAI stream reports at its end."""
+    prompt_tokens: int
+    cached_tokens: int
+
+
+SENT = object()            # a backend yields this as its request goes out, after any queue wait
+
+
+QUEUE_WAIT     = Histogram("chat_queue_wait_seconds", "Time an Ollama request waited for a scheduler ticket.",
+                           ("agent", "model"))
+TTFT           = Histogram("chat_time_to_first_token_seconds", "Upstream request sent to first text chunk.",
+                           ("agent", "model"))
+LATENCY        = Histogram("chat_stream_seconds", "Upstream request sent to the end of the reply.",
+                           ("agent", "model"))
+TOKENS_PER_S   = Histogram("chat_tokens_per_second", "Generation rate: Ollama eval stats, else chunks/s.",
+                           ("agent", "model"), buckets=RATE_BUCKETS)
+MEMORY_IO      = Histogram("chat_memory_seconds", "Memory store load/save time.",
+                           ("agent", "op"), buckets=IO_BUCKETS)
+ERRORS         = Counter("chat_upstream_errors", "Upstream streams that failed.", ("agent", "model", "status"))
+UPSTREAM_OPEN  = Gauge("chat_upstream_streams", "Upstream streams in flight.", ("agent", "model"))
+PROMPT_TOKENS  = Counter("chat_prompt_tokens", "Prompt tokens sent (OpenAI-reported, else counted here).",
+                         ("agent", "model"))
+CACHED_TOKENS  = Counter("chat_prompt_cached_tokens",
+                         "Prompt tokens served from the backend's prompt / KV cache "
+                         "(OpenAI cached_tokens; Ollama prompt tokens minus prompt_eval_count).",
+                         ("agent", "model"))
+EVAL_TOKENS    = Counter("chat_prompt_eval_tokens", "Prompt tokens Ollama evaluated (prompt_eval_count).",
+                         ("agent", "model"))
+PROMPT_EVAL    = Histogram("chat_prompt_eval_seconds", "Ollama prompt evaluation time (prompt_eval_duration).",
+                           ("agent", "model"))
+CLIENT_OPEN    = Gauge("chat_client_streams", "SSE responses currently open to clients.", ("agent", "model"))
+
+
+def render() -> str:
+    out: List[str] = []
+    for family in REGISTRY:
+        family.render(out)
+    out.append("")
+    return "\n".join(out)
+
+
+async def upstream(stream: AsyncIterator, agent: str, model: str, prompt_tokens: int = 0) -> AsyncIterator:
+    """
+    Re-yield a backend stream, recording time to first text, total time,
+    generation rate, prompt cache reuse and failures.  ``prompt_tokens`` is
+    our own count of the prompt, for backends that report only what they
+    evaluated.  A stream closed early (client gone) counts toward none of them.
+    Times run from the backend's ``SENT`` marker (not re-yielded), so the
+    scheduler wait is left to ``QUEUE_WAIT``; without one, from the start.
+    """
+    key     = (agent, model)
+    live    = UPSTREAM_OPEN.labels(*key)
+    t0      = time.perf_counter()
+    first   = None
+    pieces  = 0
+    stats: Optional[OllamaStats] = None
+    usage: Optional[PromptUsage] = None
+    live.inc()
+    try:
+        async with aclosing(stream):                    # closing us closes the upstream
+            async for chunk in stream:
+                if chunk is SENT:
+                    t0 = time.perf_counter()
+                    continue
+                if isinstance(chunk, str):
+                    if first is None and chunk:
+                        first = time.perf_counter()
+                    pieces += 1
+                elif isinstance(chunk, OllamaStats):
+                    stats = chunk
+                elif isinstance(chunk, PromptUsage):
+                    usage = chunk
+                yield chunk
+    except Exception as exc:
+        ERRORS.labels(agent, model, str(getattr(exc, "status_code", 500))).inc()
+        raise
+    finally:
+        live.dec()
+    end = time.perf_counter()
+    LATENCY.labels(*key).observe(end - t0)
+    if first is not None:
+        TTFT.labels(*key).observe(first - t0)
+        rate = stats.tokens_per_s if stats is not None else None
+        if rate is None and end > first and pieces > 1:
+            rate = (pieces - 1) / (end - first)
+        if rate:
+            TOKENS_PER_S.labels(*key).observe(rate)
+    if usage is not None:
+        PROMPT_TOKENS.labels(*key).inc(usage.prompt_tokens)
+        CACHED_TOKENS.labels(*key).inc(usage.cached_tokens)
+    elif stats is not None and stats.prompt_eval_duration:
+        EVAL_TOKENS.labels(*key).inc(stats.prompt_eval_count)
+        PROMPT_EVAL.labels(*key).observe(stats.prompt_eval_duration / 1e9)
+        if prompt_tokens:
+            PROMPT_TOKENS.labels(*key).inc(prompt_tokens)
+            CACHED_TOKENS.labels(*key).inc(max(0, prompt_tokens - stats.prompt_eval_count))
+
+
+async def client(frames: AsyncIterator[bytes], agent: str, model: str) -> AsyncIterator[bytes]:
+    """Re-yield SSE frames while counting the response as open."""
+    live = CLIENT_OPEN.labels(agent, model)
+    live.inc()
+    try:
+        async with aclosing(frames):
+            async for frame in frames:
+                yield frame
+    finally:
+        live.dec()
+
+
+class timed:
+    """``with timed(MEMORY_IO, agent, "load"):`` observes the block's duration."""
+    __slots__ = ("child", "t0")
+
+    def __init__(self, hist: Histogram, *labels: str):
+        self.child = hist.labels(*labels)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.child.observe(time.perf_counter() - self.t0)
+
+
+def log_payload(agent: str, payload: Dict) -> None:
+    """Sampled, single-line, size-capped record of what went upstream."""
+    if PAYLOAD_LOG_SAMPLE <= 0 or random.random() >= PAYLOAD_LOG_SAMPLE:
+        return
+    turns = payload.get("messages") or payload.get("input") or []
+    body  = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    record = {
+        "agent":    agent,
+        "model":    payload.get("model") or (payload.get("prompt") or {}).get("id"),
+        "turns":    len(turns) if isinstance(turns, list) else 1,
+        "bytes":    len(body),
+        "payload":  body[:PAYLOAD_LOG_MAX],
+    }
+    if len(body) > PAYLOAD_LOG_MAX:
+        record["truncated"] = True
+    print("🛰️ [PAYLOAD SENT TO BACKEND]", json.dumps(record, ensure_ascii=False))
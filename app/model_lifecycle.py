@@ -0,0 +1,106 @@
+"""
+model_lifecycle.py — keep the hot Ollama models loaded
+
+``model_lifecycle`` (app.agent_models) gives each tag a ``keep_alive``, which
+every request for it carries, and optionally ``preload``.  At startup a
+background task loads the preload tags on every node, as many as the
+scheduler's per-node ``max_loaded`` allows.  It uses an empty chat request,
+queued through the scheduler like any other stream, with the load-time
+options the agents themselves send (``num_ctx`` …), so the first real request
+neither waits for a cold load nor forces a reload.  Startup and readiness
+never wait for it.  Which models are resident, and until when, comes from
+the pool's ``/api/ps`` polling.
+"""
+
+from __future__ import annotations
+import asyncio, time
+from typing import Dict, List, Mapping, Optional
+
+from app import clients
+from app.agent_models import model_lifecycle
+from app.ollama_pool  import POOL, OllamaNode
+from app.registry     import AGENTS, LOAD_OPTIONS
+from app.scheduler    import SCHEDULER
+from app.tokens       import budget_for
+
+
+class ModelLifecycle:
+    def __init__(self, specs: Mapping[str, Dict], agents: Mapping):
+        self.specs = dict(specs)
+        self.load: Dict[str, Dict] = {}                 # tag -> load-time options the agents use
+        for rec in agents.values():
+            if rec.backend == "ollama":
+                self.load.setdefault(rec.model, {k: rec.options[k] for k in LOAD_OPTIONS if k in rec.options})
+        self.warmed: Dict[str, Dict] = {}               # "tag@node" -> outcome of the last preload
+        self._task: Optional[asyncio.Task] = None
+
+    def options(self, model: str) -> Dict:
+        """Load-time options for ``model``, for requests not made on an agent's behalf."""
+        return dict(self.load.get(model) or {"num_ctx": budget_for(model).context})
+
+    def keep_alive(self, model: str) -> Optional[str]:
+        return self.specs.get(model, {}).get("keep_alive")
+
+    @property
+    def preloads(self) -> List[str]:
+        return [tag for tag, spec in self.specs.items() if spec.get("preload")]
+
+    # ── preloading ───────────────────────────────────────────
+    async def preload(self, node: OllamaNode, model: str) -> None:
+        payload = {"model": model, "messages": [], "stream": False, "options": self.options(model)}
+        if self.keep_alive(model) is not None:
+            payload["keep_alive"] = self.keep_alive(model)
+        key    = f"{model}@{node.chat_url}"
+        ticket = None
+        try:
+            ticket = SCHEDULER.submit(f"{model}:preload", model)
+            await ticket.acquire()
+            t0 = time.perf_counter()
+            node.outstanding += 1
+            try:
+                resp = await clients.ollama().post(node.chat_url, json=payload)
+                resp.raise_for_status()
+            finally:
+                node.outstanding -= 1
+            node.resident.add(model)
+            self.warmed[key] = {"ok": True, "load_s": round(time.perf_counter() - t0, 2)}
+        except Exception as exc:                         # queue full / timeout, node down, HTTP error
+            self.warmed[key] = {"ok": False, "error": repr(exc)}
+            print("🧠 [PRELOAD ERROR]:", key, repr(exc))
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    async def _run(self) -> None:
+        per_node = max(1, SCHEDULER.max_loaded // max(1, len(POOL.nodes)))
+        models   = self.preloads[:per_node]
+        for model in models:                             # nodes in parallel, models in order
+            await asyncio.gather(*(self.preload(node, model) for node in POOL.nodes))
+
+    def start(self) -> None:
+        if self.preloads and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        out = {}
+        for model in sorted(set(self.specs) | set(self.load)):
+            out[model] = {
+                "keep_alive": self.keep_alive(model),
+                "preload":    bool(self.specs.get(model, {}).get("preload")),
+                "options":    self.load.get(model),
+                "resident":   {n.chat_url: n.expires.get(model) for n in POOL.nodes if model in n.resident},
+                "preloaded":  {k.split("@", 1)[1]: v for k, v in self.warmed.items() if k.startswith(model + "@")},
+            }
+        return out
+
+
+MODELS = ModelLifecycle(model_lifecycle, AGENTS)
@@ -0,0 +1,157 @@
+"""
+ollama_pool.py — health-aware routing across one or more Ollama nodes
+
+``OLLAMA_URLS`` (comma-separated chat URLs) lists the nodes; it defaults to
+the single ``OLLAMA_URL``.  A background task polls every node's
+``/api/tags`` and ``/api/ps`` so routing and ``/health`` work from cached
+state.  ``pick`` prefers nodes where the model is already resident, then
+nodes that have it pulled, then the one with the fewest outstanding requests.
+Repeated failures open a node's circuit for ``OLLAMA_BREAKER_COOLDOWN``
+seconds.  After that the circuit is half-open: ``pick`` hands out exactly one
+trial request, and its outcome (or the next health check) closes or reopens it.
+"""
+
+from __future__ import annotations
+import asyncio, os, time
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+
+from app import clients
+
+OLLAMA_URL   = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+OLLAMA_URLS  = [u.strip() for u in os.getenv("OLLAMA_URLS", OLLAMA_URL).split(",") if u.strip()]
+
+HEALTH_INTERVAL   = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "5"))
+HEALTH_TIMEOUT    = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+BREAKER_FAILURES  = int(os.getenv("OLLAMA_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN  = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "15"))
+
+
+class OllamaNode:
+    def __init__(self, chat_url: str):
+        self.chat_url    = chat_url
+        self.tags_url    = chat_url.replace("/chat", "/tags")
+        self.ps_url      = chat_url.replace("/chat", "/ps")
+        self.outstanding = 0
+        self.healthy: Optional[bool] = None            # None until the first check
+        self.latency_ms: Optional[float] = None
+        self.models:   Set[str] = set()
+        self.resident: Set[str] = set()
+        self.expires:  Dict[str, str] = {}             # resident model -> /api/ps expires_at
+        self.failures   = 0
+        self.open_until = 0.0                          # set while the breaker is tripped
+        self.probing    = False                        # the half-open trial request is out
+        self.checked_at = 0.0
+
+    @property
+    def circuit(self) -> str:
+        if not self.open_until:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half-open"
+
+    @property
+    def available(self) -> bool:
+        circuit = self.circuit
+        return circuit == "closed" or (circuit == "half-open" and not self.probing)
+
+    def succeeded(self) -> None:
+        self.failures   = 0
+        self.open_until = 0.0
+        self.probing    = False
+        self.healthy    = True
+
+    def failed(self) -> None:
+        self.failures += 1
+        self.probing   = False
+        if self.failures >= BREAKER_FAILURES:
+            self.healthy    = False
+            self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+    def rank(self, model: Optional[str]) -> tuple:
+        if model and model in self.resident:
+            placement = 0
+        elif model and (model in self.models or not self.models):
+            placement = 1                                 # pulled, or tags not known yet
+        else:
+            placement = 2
+        return placement, self.outstanding, self.latency_ms or 0.0
+
+    def status(self) -> Dict:
+        return {
+            "url":         self.chat_url,
+            "up":          self.healthy,
+            "circuit":     self.circuit,
+            "latency_ms":  self.latency_ms,
+            "outstanding": self.outstanding,
+            "resident":    sorted(self.resident),
+            "checked_s_ago": round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+        }
+
+
+class OllamaPool:
+    def __init__(self, urls: Iterable[str]):
+        self.nodes: List[OllamaNode] = [OllamaNode(u) for u in urls]
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self, model: Optional[str], exclude: Iterable[OllamaNode] = ()) -> Optional[OllamaNode]:
+        skip = set(exclude)
+        live = [n for n in self.nodes if n not in skip and n.available]
+        if not live:
+            return None
+        node = min(live, key=lambda n: n.rank(model))
+        if node.circuit == "half-open":
+            node.probing = True                           # the one trial; others wait for its outcome
+        return node
+
+    @property
+    def up(self) -> bool:
+        return any(n.healthy for n in self.nodes)
+
+    def status(self) -> List[Dict]:
+        return [n.status() for n in self.nodes]
+
+    # ── background health checks ───────────────────────────
+    async def check(self, node: OllamaNode) -> None:
+        cli = clients.ollama()
+        t0  = time.perf_counter()
+        try:
+            tags = await cli.get(node.tags_url, timeout=HEALTH_TIMEOUT)
+            tags.raise_for_status()
+            node.latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+            node.models     = {m.get("name") or m.get("model") for m in tags.json().get("models", [])}
+            ps = await cli.get(node.ps_url, timeout=HEALTH_TIMEOUT)
+            if ps.status_code == 200:
+                loaded = ps.json().get("models", [])
+                node.resident = {m.get("name") or m.get("model") for m in loaded}
+                node.expires  = {m.get("name") or m.get("model"): m.get("expires_at") for m in loaded}
+            node.succeeded()
+        except (httpx.HTTPError, ValueError):
+            node.healthy = False
+            node.failed()
+        finally:
+            node.checked_at = time.monotonic()
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(n) for n in self.nodes))
+
+    async def _run(self) -> None:
+        while True:
+            await self.check_all()
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+POOL = OllamaPool(OLLAMA_URLS)
@@ -0,0 +1,186 @@
+"""
+persistence.py — write-behind memory persistence
+
+Request handlers queue memory appends with ``WRITER.append`` and move on; a
+background task coalesces them per agent and writes each batch in a worker
+thread once ``MEMORY_FLUSH_BATCH`` messages are pending or
+``MEMORY_FLUSH_INTERVAL`` seconds have passed, so disk I/O never runs on the
+event loop.  ``WRITER.view`` overlays pending and in-flight messages on the
+stored history (read-your-writes).  ``stop`` drains everything on shutdown.
+
+Each agent's unwritten messages sit behind their own small lock, held only to
+copy or swap the lists.  Readers and the writer agree on what is on disk via
+the store's per-agent lock instead: a batch leaves the overlay while that lock
+is still held after writing it, so a reader holding it sees each message once.
+Until an agent has a stored history, readers take no lock at all: a batch only
+leaves the overlay once its log exists, so the overlay alone is complete.
+A slow disk (or another worker's ``flock``) therefore only stalls that agent,
+and only in threads; ``view``, ``page`` and ``stamp`` are for worker threads.
+"""
+
+from __future__ import annotations
+import asyncio, os, threading
+from typing import Dict, List, Optional, Tuple
+
+from app import memory
+
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "0.25"))
+MEMORY_FLUSH_BATCH    = int(os.getenv("MEMORY_FLUSH_BATCH", "64"))
+
+
+class _Overlay:
+    """One agent's messages not yet on disk; ``lock`` only guards the two lists."""
+    __slots__ = ("lock", "pending", "flushing")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending:  List[Dict] = []
+        self.flushing: List[Dict] = []
+
+
+class MemoryWriter:
+    def __init__(self, interval: float = MEMORY_FLUSH_INTERVAL, batch: int = MEMORY_FLUSH_BATCH):
+        self.interval = interval
+        self.batch    = batch
+        self.overlays: Dict[str, _Overlay] = {}
+        self.queued   = 0
+        self.flushes  = 0
+        self.written  = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task]  = None
+        self._stopping = False
+
+    def _overlay(self, agent: str) -> _Overlay:
+        ov = self.overlays.get(agent)
+        if ov is None:
+            ov = self.overlays.setdefault(agent, _Overlay())
+        return ov
+
+    def _unwritten(self, agent: str) -> List[Dict]:
+        ov = self.overlays.get(agent)
+        if ov is None:
+            return []
+        with ov.lock:
+            return ov.flushing + ov.pending
+
+    # ── request path ─────────────────────────────────────────
+    def append(self, agent: str, message: Dict) -> None:
+        ov = self._overlay(agent)
+        with ov.lock:
+            ov.pending.append(message)
+        self.queued += 1
+        self._ensure_running()
+        if self.queued >= self.batch:
+            self._wake.set()
+
+    # ── readers (worker threads: these wait on the agent's store lock) ──
+    def view(self, agent: str) -> List[Dict]:
+        """Stored history plus anything not yet on disk, trimmed as a save would."""
+        with memory.locked(agent):
+            history = memory.load_memory(agent)
+            extra   = self._unwritten(agent)
+        for msg in extra:
+            memory.trim_history(history)
+            history.append(msg)
+        return history
+
+    def page(self, agent: str, before: Optional[int] = None, limit: int = 20) -> Tuple[List[Tuple[int, Dict]], int]:
+        """
+        ``memory.page_memory`` with unwritten messages numbered after the stored
+        ones, as they will be once flushed.  Returns ``(page, end)``.
+        """
+        extra = self._unwritten(agent)
+        if not memory.has_history(agent):                 # nothing stored: no lock file
+            older, end = [], 0
+        else:
+            with memory.locked(agent):
+                older, end = memory.page_memory(agent, before, limit)
+                extra = self._unwritten(agent)
+        top    = end + len(extra)
+        before = top if before is None else min(before, top)
+        fresh  = list(enumerate(extra[:max(0, before - end)], start=end))[-limit:]
+        keep   = limit - len(fresh)
+        return (older[-keep:] if keep else []) + fresh, top
+
+    def stamp(self, agent: str) -> str:
+        """``memory.memory_stamp`` plus the unwritten messages; an ETag for the history."""
+        extra = self._unwritten(agent)
+        if not memory.has_history(agent):
+            return f"0-{len(extra)}"
+        with memory.locked(agent):
+            return f"{memory.memory_stamp(agent)}-{len(self._unwritten(agent))}"
+
+    # ── background side ──────────────────────────────────────
+    def _write(self, batch: Dict[str, List[Dict]]) -> None:
+        for agent, msgs in batch.items():
+            def add(history: List[Dict]) -> None:
+                for msg in msgs:
+                    memory.trim_history(history)
+                    history.append(msg)
+
+            ov = self._overlay(agent)
+            with memory.locked(agent):
+                memory.update_memory(agent, add)
+                with ov.lock:                        # on disk now: out of the overlay
+                    ov.flushing = []
+
+    async def flush(self) -> None:
+        batch: Dict[str, List[Dict]] = {}
+        for agent, ov in list(self.overlays.items()):
+            with ov.lock:
+                if ov.pending:
+                    ov.flushing, ov.pending = ov.pending, []
+                    batch[agent] = ov.flushing
+        if not batch:
+            return
+        self.queued = 0
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception:
+            for agent in batch:                      # put unwritten agents back in line
+                ov = self.overlays[agent]
+                with ov.lock:
+                    if ov.flushing:
+                        ov.pending[:0] = ov.flushing
+                        self.queued += len(ov.flushing)
+                        ov.flushing = []
+            raise
+        self.flushes += 1
+        self.written += sum(len(m) for m in batch.values())
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                print("🧠 [MEMORY FLUSH ERROR]:", repr(exc))
+
+    def _ensure_running(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    def start(self) -> None:
+        self._ensure_running()
+
+    async def stop(self) -> None:
+        """Let the flusher finish its current batch, then drain whatever is left."""
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {"pending": self.queued, "flushes": self.flushes, "written": self.written}
+
+
+WRITER = MemoryWriter()
@@ -0,0 +1,436 @@
+"""
+recall.py — per-agent retrieval over long-term memory
+
+Every message saved to the memory store for a recall-enabled agent (an
+``on_save`` hook, whichever path saved it) is also appended to that agent's
+recall archive.  The archive outlives trimming
+and compaction of the chat log, so turns stay findable long after they leave
+the prompt window.
+
+    <agent>.recall.jsonl   one {"role", "content"} per line, append-only
+    <agent>.recall.f32     one float32 vector per line (NumPy only), memory-mapped
+    <agent>.recall.bm25    snapshot of the BM25 index over a prefix of the archive
+
+Each process keeps an in-memory BM25 inverted index per agent.  It starts from
+the snapshot and replays only the archive lines written after it, then extends
+itself from the bytes appended since its last look, so neither a restart nor
+other workers' writes cost a rebuild.  A fresh snapshot is written once
+``RECALL_SNAPSHOT_EVERY`` documents have piled up past the last one.  With NumPy installed, queries also score hashed
+bag-of-words embeddings against the memory-mapped vectors, and the two
+rankings are fused by reciprocal rank.  ``relevant`` returns the top-k past
+turns that are not already in the prompt window.  ``python -m app.recall
+backfill`` seeds archives from existing memory.
+"""
+
+from __future__ import annotations
+import heapq, json, math, os, re, struct, sys, threading, zlib
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app import memory
+
+try:
+    import numpy as np
+except ImportError:                                      # BM25 only
+    np = None
+
+RECALL_K     = int(os.getenv("RECALL_K", "4"))
+RECALL_DIM   = int(os.getenv("RECALL_DIM", "128"))
+RECALL_SHARE = float(os.getenv("RECALL_SHARE", "0.15"))  # of the prompt budget
+RECALL_PREFIX = "Possibly relevant earlier conversation:\n"
+RECALL_SNAPSHOT_EVERY = int(os.getenv("RECALL_SNAPSHOT_EVERY", "5000"))   # docs replayed at most on start
+
+BM25_K1, BM25_B = 1.2, 0.75
+_RRF_K          = 60
+_CANDIDATES     = 50
+
+_SNAP_MAGIC   = b"LCRB"
+_SNAP_VERSION = 1
+_SNAP_HEADER  = struct.Struct("<4sIQQQQQ")               # magic, version, docs inode, bytes, docs, terms total, vocabulary
+_SNAP_TERM    = struct.Struct("<II")                     # term bytes, postings
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOP = frozenset(
+    "a an and are as at be but by do for from has have i if in is it its me my no not of on or "
+    "so that the this to was we were what when which who will with you your".split()
+)
+
+
+def terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOP and len(w) > 1]
+
+
+def embed(text: str, dim: int = RECALL_DIM):
+    """Hashed bag of words + bigrams, L2-normalised: no model, same on every worker."""
+    vec   = np.zeros(dim, dtype=np.float32)
+    words = terms(text)
+    for feat in words + [a + " " + b for a, b in zip(words, words[1:])]:
+        h = zlib.crc32(feat.encode())
+        vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def _content(line: bytes) -> str:
+    try:
+        return json.loads(line)["content"]
+    except (ValueError, KeyError):                       # torn by a crash; keep ids aligned
+        return ""
+
+
+def docs_path(agent: str) -> str:
+    return os.path.join(memory.MEMORY_DIR, f"{agent}.recall.jsonl")
+
+
+def vectors_path(agent: str) -> str:
+    return os.path.join(memory.MEMORY_DIR, f"{agent}.recall.f32")
+
+
+def snapshot_path(agent: str) -> str:
+    return os.path.join(memory.MEMORY_DIR, f"{agent}.recall.bm25")
+
+
+def _le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, raw) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class _Index:
+    """One agent's archive as seen by this process."""
+
+    def __init__(self, agent: str, dim: int = RECALL_DIM):
+        self.agent    = agent
+        self.dim      = dim
+        self.docs     = docs_path(agent)
+        self.vecs     = vectors_path(agent)
+        self.snap     = snapshot_path(agent)
+        self.saved    = 0                                # docs covered by the snapshot on disk
+        self.loaded   = False                            # snapshot tried
+        self.offsets  = array("Q")                       # byte offset of each doc
+        self.lengths  = array("I")                       # terms per doc
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total    = 0                                # sum of lengths
+        self.size     = 0                                # bytes of docs consumed
+        self.mutex    = threading.Lock()
+        self._matrix  = None                             # memmap over the vectors
+        self._dense: Dict[str, Tuple] = {}               # NumPy copies of hot postings
+        self._norms = None                               # BM25 length normalisation, per doc
+
+    @property
+    def count(self) -> int:
+        return len(self.offsets)
+
+    # ── maintenance ──────────────────────────────────────────
+    def refresh(self) -> None:
+        """Index whatever was appended to the archive since the last look."""
+        try:
+            st = os.stat(self.docs)
+        except FileNotFoundError:
+            return
+        if not self.loaded:
+            self.loaded = True
+            self._load_snapshot(st)
+        size = st.st_size
+        if size <= self.size:
+            return
+        with open(self.docs, "rb") as f:
+            f.seek(self.size)
+            raw = f.read(size - self.size)
+        end = raw.rfind(b"\n") + 1                       # ignore a line still being written
+        pos = self.size
+        for line in raw[:end].splitlines(keepends=True):
+            self._add(pos, _content(line))
+            pos += len(line)
+        self.size = pos
+        self._dense.clear()
+        self._norms  = None
+        self._matrix = None
+        if self.count - self.saved >= RECALL_SNAPSHOT_EVERY:
+            try:
+                self._save_snapshot(st.st_ino)
+            except OSError as exc:                       # the next start just replays more
+                print("🧠 [RECALL SNAPSHOT ERROR]:", self.agent, repr(exc))
+                self.saved = self.count
+
+    def _load_snapshot(self, st: os.stat_result) -> None:
+        """Adopt the snapshot if it covers a prefix of this very archive; else start empty."""
+        try:
+            with open(self.snap, "rb") as f:
+                raw = f.read()
+            magic, version, ino, size, count, total, vocab = _SNAP_HEADER.unpack_from(raw)
+        except (FileNotFoundError, struct.error):
+            return
+        if magic != _SNAP_MAGIC or version != _SNAP_VERSION or ino != st.st_ino or size > st.st_size:
+            return
+        view, pos = memoryview(raw), _SNAP_HEADER.size
+
+        def take(n: int):
+            nonlocal pos
+            pos += n
+            return view[pos - n:pos]
+
+        try:
+            offsets  = _from_le("Q", take(8 * count))
+            lengths  = _from_le("I", take(4 * count))
+            postings = {}
+            for _ in range(vocab):
+                width, n = _SNAP_TERM.unpack(take(_SNAP_TERM.size))
+                term = bytes(take(width)).decode()
+                postings[term] = (_from_le("I", take(4 * n)), _from_le("H", take(2 * n)))
+        except (struct.error, ValueError):               # truncated or garbled: replay everything
+            return
+        if pos != len(raw) or len(offsets) != count or len(lengths) != count:
+            return
+        self.offsets, self.lengths, self.postings = offsets, lengths, postings
+        self.total, self.size, self.saved = total, size, count
+
+    def _save_snapshot(self, ino: int) -> None:
+        """Write the index atomically; any worker may, the last rename wins."""
+        parts = [_SNAP_HEADER.pack(_SNAP_MAGIC, _SNAP_VERSION, ino, self.size, self.count,
+                                   self.total, len(self.postings)),
+                 _le(self.offsets), _le(self.lengths)]
+        for term, (docs, tfs) in self.postings.items():
+            word = term.encode()
+            parts += [_SNAP_TERM.pack(len(word), len(docs)), word, _le(docs), _le(tfs)]
+        tmp = f"{self.snap}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snap)
+        self.saved = self.count
+
+    def _add(self, offset: int, content: str) -> None:
+        doc = self.count
+        tf  = Counter(terms(content))
+        self.offsets.append(offset)
+        self.lengths.append(sum(tf.values()))
+        self.total += self.lengths[-1]
+        for term, n in tf.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("H"))
+            entry[0].append(doc)
+            entry[1].append(min(n, 0xFFFF))
+
+    def append(self, msgs: List[Dict]) -> None:
+        """Archive ``msgs`` and index them (plus anything other workers added)."""
+        lines = [json.dumps({"role": m["role"], "content": m["content"]}).encode() + b"\n" for m in msgs]
+        fd = os.open(memory.lock_path(f"{self.agent}.recall"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if memory.fcntl is not None:
+                memory.fcntl.flock(fd, memory.fcntl.LOCK_EX)
+            with open(self.docs, "ab") as f:
+                f.write(b"".join(lines))
+            self.refresh()
+            if np is not None:
+                self._append_vectors()
+        finally:
+            os.close(fd)                                 # closing drops the flock
+
+    def _append_vectors(self) -> None:
+        """Embed every doc that has no vector yet (also heals a crash between the two files)."""
+        have = os.path.getsize(self.vecs) // (4 * self.dim) if os.path.exists(self.vecs) else 0
+        if have >= self.count:
+            return
+        with open(self.docs, "rb") as f:
+            f.seek(self.offsets[have])
+            lines = f.read(self.size - self.offsets[have]).splitlines()
+        block = np.stack([embed(_content(line), self.dim) for line in lines])
+        with open(self.vecs, "r+b" if have else "wb") as f:
+            f.seek(have * 4 * self.dim)
+            f.write(block.astype("<f4").tobytes())
+
+    # ── queries ──────────────────────────────────────────────
+    def _posting(self, term: str):
+        entry = self.postings.get(term)
+        if entry is None or np is None:
+            return entry
+        dense = self._dense.get(term)
+        if dense is None:
+            dense = self._dense[term] = (np.array(entry[0], dtype=np.uint32),   # copies: arrays keep growing
+                                         np.array(entry[1], dtype=np.float32))
+        return dense
+
+    def bm25(self, query: Iterable[str], k: int) -> List[Tuple[float, int]]:
+        n = self.count
+        if not n:
+            return []
+        avgdl = self.total / n or 1.0
+        if np is not None:
+            if self._norms is None:
+                lengths     = np.array(self.lengths, dtype=np.float32)
+                self._norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avgdl)
+            norm   = self._norms
+            scores = np.zeros(n, dtype=np.float32)
+            for term in set(query):
+                entry = self._posting(term)
+                if entry is None:
+                    continue
+                docs, tf = entry
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+            top = np.argpartition(-scores, min(k, n - 1))[:k]
+            return sorted(((float(scores[d]), int(d)) for d in top if scores[d] > 0), reverse=True)
+
+        scores: Dict[int, float] = {}
+        lengths = self.lengths
+        for term in set(query):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            docs, tfs = entry
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for d, tf in zip(docs, tfs):
+                scores[d] = scores.get(d, 0.0) + idf * tf * (BM25_K1 + 1) / (
+                    tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[d] / avgdl))
+        return heapq.nlargest(k, ((s, d) for d, s in scores.items()))
+
+    def vector(self, text: str, k: int) -> List[Tuple[float, int]]:
+        if np is None or not os.path.exists(self.vecs):
+            return []
+        rows = min(self.count, os.path.getsize(self.vecs) // (4 * self.dim))
+        if not rows:
+            return []
+        if self._matrix is None or len(self._matrix) != rows:
+            self._matrix = np.memmap(self.vecs, dtype="<f4", mode="r", shape=(rows, self.dim))
+        sims = self._matrix @ embed(text, self.dim)
+        top  = np.argpartition(-sims, min(k, rows - 1))[:k]
+        return sorted(((float(sims[d]), int(d)) for d in top if sims[d] > 0), reverse=True)
+
+    def read(self, doc: int) -> Dict:
+        with open(self.docs, "rb") as f:
+            f.seek(self.offsets[doc])
+            return {"role": "user", "content": ""} | json.loads(f.readline())
+
+    def search(self, text: str, k: int) -> List[int]:
+        """Doc ids, best first: BM25 alone, or fused with vector similarity."""
+        ranked = [self.bm25(terms(text), _CANDIDATES)]
+        if np is not None:
+            ranked.append(self.vector(text, _CANDIDATES))
+        fused: Dict[int, float] = {}
+        for hits in ranked:
+            for rank, (_, doc) in enumerate(hits):
+                fused[doc] = fused.get(doc, 0.0) + 1.0 / (_RRF_K + rank)
+        return [d for d, _ in heapq.nlargest(k, fused.items(), key=lambda kv: kv[1])]
+
+
+class Recall:
+    def __init__(self, dim: int = RECALL_DIM):
+        self.dim     = dim
+        self.enabled: Set[str] = set()
+        self.indexes: Dict[str, _Index] = {}
+        self.queries = 0
+        self.indexed = 0
+
+    def enable(self, agents: Iterable[str]) -> None:
+        self.enabled.update(agents)
+
+    def _index(self, agent: str) -> _Index:
+        index = self.indexes.get(agent)
+        if index is None:
+            index = self.indexes.setdefault(agent, _Index(agent, self.dim))
+        return index
+
+    def index(self, agent: str, msgs: List[Dict]) -> None:
+        """Archive freshly saved messages; the store's ``on_save`` hook, in the saving thread."""
+        if agent not in self.enabled or not msgs:
+            return
+        msgs = [m for m in msgs if m.get("role") in ("user", "assistant")]
+        if not msgs:
+            return
+        index = self._index(agent)
+        with index.mutex:
+            index.append(msgs)
+        self.indexed += len(msgs)
+
+    def search(self, agent: str, text: str, k: int = RECALL_K,
+               skip: Callable[[Dict], bool] = lambda m: False) -> List[Dict]:
+        """Top ``k`` archived messages for ``text``, best first, minus any ``skip`` rejects."""
+        index = self._index(agent)
+        with index.mutex:
+            index.refresh()
+            found = []
+            for doc in index.search(text, k * 3):
+                msg = index.read(doc)
+                if not skip(msg):
+                    found.append(msg)
+                    if len(found) == k:
+                        break
+        self.queries += 1
+        return found
+
+    def relevant(self, agent: str, text: str, window: List[Dict], max_tokens: int,
+                 count: Callable[[Dict], int], k: int = RECALL_K) -> Optional[Dict]:
+        """
+        One system message quoting the past turns most relevant to ``text`` that
+        are not already in ``window``, cut to ``max_tokens``; ``None`` if nothing.
+        """
+        seen  = {m.get("content") for m in window}
+        hits  = self.search(agent, text, k, skip=lambda m: m["content"] in seen)
+        lines = []
+        used  = count({"role": "system", "content": RECALL_PREFIX})
+        for m in hits:
+            line = f"- {m['role']}: {m['content']}"
+            cost = count({"role": "system", "content": line})
+            if used + cost > max_tokens:
+                continue
+            lines.append(line)
+            used += cost
+        if not lines:
+            return None
+        return {"role": "system", "content": RECALL_PREFIX + "\n".join(lines)}
+
+    def warm(self) -> None:
+        """Load every enabled agent's archive (blocking; run in a thread at startup)."""
+        for agent in sorted(self.enabled):
+            index = self._index(agent)
+            with index.mutex:
+                index.refresh()
+
+    def stats(self) -> Dict:
+        return {
+            "agents":  {a: i.count for a, i in self.indexes.items()},
+            "vectors": np is not None,
+            "indexed": self.indexed,
+            "queries": self.queries,
+        }
+
+
+RECALL = Recall()
+memory.on_save(RECALL.index)
+
+
+def backfill(agents: Iterable[str]) -> Dict[str, int]:
+    """Seed empty archives from each agent's current memory window."""
+    done = {}
+    for agent in agents:
+        if os.path.exists(docs_path(agent)):
+            continue
+        msgs = [m for m in memory.load_memory(agent) if m.get("role") in ("user", "assistant")]
+        if msgs:
+            RECALL.enabled.add(agent)
+            RECALL.index(agent, msgs)
+            done[agent] = len(msgs)
+    return done
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["backfill"]:
+        from app.registry import AGENTS
+        names = sys.argv[2:] or [r.name for r in AGENTS.values() if r.recall]
+        for agent, n in backfill(names).items():
+            print(f"indexed {n} messages for {agent}")
+    else:
+        print("usage: python -m app.recall backfill [agent ...]")
@@ -0,0 +1,168 @@
+"""
+registry.py — one resolved record per chat agent, built once at import
+
+Merges ``model_routes``, ``LOADOUTS``, ``PERSONAS``, the prompt-id
+``OpenAIAgent`` subclasses, ``agents.AGENT_REGISTRY``, the model's context
+budget and its Ollama options / keep-alive, so ``/send`` does a single dict
+lookup instead of importlib probing per request.  Inconsistent config raises
+at startup rather than on the first unlucky request.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field, replace
+from importlib import import_module
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from app.agent_models import agent_settings, model_lifecycle, model_routes
+from app.loadouts     import LOADOUTS
+from app.personas     import PERSONAS
+from app.tokens       import PREFIX_BLOCK, Budget, budget_for
+
+from agents                   import AGENT_REGISTRY
+from agents.base_openai_agent import OpenAIAgent
+
+DEFAULT_LLAMA3 = "llama3:8b-instruct-q4_K_M"
+EXCLUDE_MEMORY = frozenset({"LlamaBear", "Agent4o"})
+# Options Ollama applies when it loads a model: requests that disagree on
+# these reload it, so agents sharing a tag must agree.
+LOAD_OPTIONS   = ("num_ctx", "num_batch", "num_gpu", "main_gpu", "num_thread", "use_mmap")
+
+
+@dataclass(frozen=True)
+class AgentRecord:
+    name:           str
+    backend:        str                     # "ollama" | "openai"
+    model:          str                     # tag as the backend expects it
+    persona:        str                     # persona key; also the memory key
+    system_prompt:  str                     # PERSONAS text, or the key itself
+    prompt_id:      Optional[str] = None
+    prompt_version: Optional[str] = None
+    memory:         bool = True             # persist turns to app.memory
+    tools:          Tuple[str, ...] = ()
+    cache:          bool = False            # opt-in response cache
+    cache_ttl:      Optional[float] = None
+    digest:         bool = False            # rolling summary of evicted turns
+    digest_model:   Optional[str] = None    # Ollama tag; default app.digest.DIGEST_MODEL
+    recall:         bool = False            # inject relevant past turns (app.recall)
+    budget:         Budget = budget_for("")     # context window / reply reserve
+    options:        Mapping = field(default_factory=lambda: MappingProxyType({}))   # Ollama "options"
+    keep_alive:     Optional[str] = None    # Ollama keep_alive, from model_lifecycle
+    hooks:          Mapping = field(default_factory=lambda: MappingProxyType({}))
+
+    @property
+    def is_openai(self) -> bool:
+        return self.backend == "openai"
+
+    @property
+    def uses_prompt(self) -> bool:
+        return self.prompt_id is not None
+
+
+def _prompt_class(agent: str):
+    """Same module/class convention /send used to probe per request."""
+    base = agent.lower().replace(".", "_")
+    for mod in (f"agents.{base}_core", f"agents.{base}"):
+        try:
+            module = import_module(mod)
+        except ModuleNotFoundError:
+            continue
+        cls = getattr(module, agent.replace(".", "_"), None)
+        if isinstance(cls, type) and issubclass(cls, OpenAIAgent) and cls.prompt_id:
+            return cls
+        return None
+    return None
+
+
+def _resolve(agent: str) -> AgentRecord:
+    loadout = LOADOUTS.get(agent)
+    if loadout:
+        persona = loadout["persona"]
+        tag     = model_routes.get(loadout["model"], loadout["model"])
+        tools   = tuple(loadout.get("tools", []))
+    else:
+        persona, tag, tools = agent, model_routes.get(agent, agent), ()
+
+    if tag.lower() == "llama3":
+        tag = DEFAULT_LLAMA3
+
+    backend  = "openai" if tag.startswith("openai:") else "ollama"
+    prompt   = _prompt_class(agent)
+    settings = agent_settings.get(agent, {})
+    budget   = budget_for(tag)
+    options  = {}
+    if backend == "ollama":
+        options = {"num_ctx": budget.context, "num_predict": budget.reserve, **settings.get("options", {})}
+        budget  = replace(budget, context=int(options["num_ctx"]))
+    budget = replace(budget, block=int(budget.prompt * settings.get("prefix_block", PREFIX_BLOCK)))
+    return AgentRecord(
+        name           = agent,
+        backend        = backend,
+        model          = tag.split("openai:")[-1],
+        persona        = persona,
+        system_prompt  = PERSONAS.get(persona, persona),
+        prompt_id      = prompt.prompt_id if prompt else None,
+        prompt_version = (prompt.prompt_version or "1") if prompt else None,
+        memory         = agent not in EXCLUDE_MEMORY,
+        tools          = tools,
+        cache          = bool(settings.get("cache", False)),
+        cache_ttl      = settings.get("cache_ttl"),
+        digest         = bool(settings.get("digest", False)) and agent not in EXCLUDE_MEMORY,
+        digest_model   = settings.get("digest_model"),
+        recall         = bool(settings.get("recall", False)) and agent not in EXCLUDE_MEMORY,
+        budget         = budget,
+        options        = MappingProxyType(options),
+        keep_alive     = model_lifecycle.get(tag, {}).get("keep_alive"),
+        hooks          = MappingProxyType(dict(AGENT_REGISTRY.get(agent, {}))),
+    )
+
+
+def _validate(records: Mapping[str, AgentRecord]) -> None:
+    problems = []
+    for name, loadout in LOADOUTS.items():
+        for key in ("persona", "model"):
+            if not loadout.get(key):
+                problems.append(f"loadout {name!r} has no {key!r}")
+    for name in AGENT_REGISTRY:
+        if name not in records:
+            problems.append(f"AGENT_REGISTRY entry {name!r} has no model route")
+    for name in agent_settings:
+        if name not in records:
+            problems.append(f"agent_settings entry {name!r} has no model route")
+    for rec in records.values():
+        if not rec.model:
+            problems.append(f"{rec.name}: empty model tag")
+        if rec.uses_prompt and not rec.is_openai:
+            problems.append(f"{rec.name}: prompt id set but routed to {rec.backend}")
+        if rec.backend == "ollama" and ":" not in rec.model:
+            problems.append(f"{rec.name}: Ollama tag {rec.model!r} has no variant")
+        if rec.budget.prompt <= 0:
+            problems.append(f"{rec.name}: context budget leaves no room for a prompt")
+    for name, settings in agent_settings.items():
+        rec = records.get(name)
+        if rec is not None and settings.get("options") and rec.backend != "ollama":
+            problems.append(f"{name}: Ollama options set but routed to {rec.backend}")
+    load: dict = {}
+    for rec in records.values():
+        if rec.backend == "ollama":
+            wanted = {k: rec.options[k] for k in LOAD_OPTIONS if k in rec.options}
+            first  = load.setdefault(rec.model, (rec.name, wanted))
+            if first[1] != wanted:
+                problems.append(f"{rec.name} and {first[0]} share {rec.model} but load it with "
+                                f"different options ({wanted} vs {first[1]})")
+    for tag in model_lifecycle:
+        if tag not in load:
+            problems.append(f"model_lifecycle entry {tag!r} is not an Ollama route")
+    if problems:
+        raise RuntimeError("Agent registry is inconsistent:\n  " + "\n  ".join(problems))
+
+
+def build() -> Mapping[str, AgentRecord]:
+    records = {name: _resolve(name) for name in model_routes}
+    _validate(records)
+    return MappingProxyType(records)
+
+
+AGENTS: Mapping[str, AgentRecord] = build()
+AGENT_NAMES: Tuple[str, ...]      = tuple(sorted(AGENTS))
+OLLAMA_MODELS: Tuple[str, ...]    = tuple(sorted({r.model for r in AGENTS.values() if r.backend == "ollama"}))
@@ -0,0 +1,176 @@
+"""
+response_cache.py — opt-in exact-match cache for agent replies
+
+Keyed on a normalised hash of (backend, model, system prompt, prompt id +
+version, trimmed messages / input).  Entries hold the reply's chunks, and
+Ollama's eval stats when there were any, so a hit replays through the same
+SSE framing as a live stream and yields the same response shape.  An in-memory LRU with
+TTL and a byte budget sits in front of an optional on-disk tier
+(``RESPONSE_CACHE_DIR``).  Agents enable it with ``"cache": True`` in
+``app.agent_models.agent_settings``.
+"""
+
+from __future__ import annotations
+import asyncio, hashlib, json, os, time
+from collections import OrderedDict
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from app.stream_decode import OllamaStats
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL       = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_DIR       = os.getenv("RESPONSE_CACHE_DIR") or None
+
+Chunk = Union[str, OllamaStats]
+
+
+def _norm(text) -> str:
+    return str(text or "").strip()                      # inner whitespace can change the reply
+
+
+def cache_key(rec, payload: Dict) -> str:
+    """Hash of everything that decides the reply; ``stream`` and key order don't count."""
+    basis = {
+        "backend":  rec.backend,
+        "model":    rec.model,
+        "system":   _norm(rec.system_prompt),
+        "prompt":   payload.get("prompt"),
+        "input":    _norm(payload.get("input")),
+        "messages": [[m.get("role"), _norm(m.get("content"))] for m in payload.get("messages", ())],
+    }
+    raw = json.dumps(basis, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl: float = RESPONSE_CACHE_TTL,
+                 disk_dir: Optional[str] = RESPONSE_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.ttl       = ttl
+        self.disk_dir  = disk_dir
+        self.entries: "OrderedDict[str, Tuple[float, int, Tuple[Chunk, ...]]]" = OrderedDict()
+        self.bytes     = 0
+        self.hits = self.disk_hits = self.misses = self.stores = self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ── memory tier ──────────────────────────────────────────
+    def _get(self, key: str) -> Optional[Tuple[Chunk, ...]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, size, chunks = entry
+        if expires < time.time():
+            self._drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return chunks
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def _put(self, key: str, chunks: Tuple[Chunk, ...], expires: float) -> None:
+        size = sum(len(c.encode()) for c in chunks if isinstance(c, str)) + len(key)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._drop(key)
+        self.entries[key] = (expires, size, chunks)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    # ── disk tier ────────────────────────────────────────────
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, Tuple[Chunk, ...]]]:
+        """A stored entry, or ``None`` if absent, expired or unreadable."""
+        try:
+            with open(self._path(key), "r") as f:
+                entry = json.load(f)
+            expires = float(entry["expires"])
+            chunks  = tuple(entry["chunks"])
+            stats   = entry.get("stats")
+            if not all(isinstance(c, str) for c in chunks):
+                raise ValueError("non-text chunk")
+            if stats is not None:
+                chunks += (OllamaStats.from_obj(stats),)
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError, KeyError, AttributeError):
+            expires = 0.0                                # malformed or partial: a miss
+        if expires < time.time():
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            return None
+        return expires, chunks
+
+    def _disk_put(self, key: str, chunks: Tuple[Chunk, ...], expires: float) -> None:
+        stats = next((c._asdict() for c in chunks if isinstance(c, OllamaStats)), None)
+        entry = {"expires": expires, "chunks": [c for c in chunks if isinstance(c, str)], "stats": stats}
+        tmp   = self._path(key) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(key))
+
+    # ── public ───────────────────────────────────────────────
+    async def get(self, key: str) -> Optional[Tuple[Chunk, ...]]:
+        chunks = self._get(key)
+        if chunks is None and self.disk_dir:
+            found = await asyncio.to_thread(self._disk_get, key)
+            if found:
+                expires, chunks = found
+                self._put(key, chunks, expires)
+                self.disk_hits += 1
+        if chunks is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return chunks
+
+    async def put(self, key: str, chunks: List[Chunk], ttl: Optional[float] = None) -> None:
+        if not any(isinstance(c, str) for c in chunks):
+            return
+        frozen  = tuple(chunks)
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self._put(key, frozen, expires)
+        self.stores += 1
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, frozen, expires)
+
+    async def stream(self, key: str, backend: Callable[[Dict], AsyncIterator], payload: Dict,
+                     ttl: Optional[float] = None) -> AsyncGenerator:
+        """Replay a hit, or run ``backend`` and keep its text and stats if it finishes cleanly."""
+        chunks = await self.get(key)
+        if chunks is not None:
+            for chunk in chunks:
+                yield chunk
+            return
+
+        collected: List[Chunk] = []
+        async for chunk in backend(payload):
+            if isinstance(chunk, (str, OllamaStats)):
+                collected.append(chunk)
+            yield chunk
+        await self.put(key, collected, ttl)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries":   len(self.entries),
+            "bytes":     self.bytes,
+            "hits":      self.hits,
+            "disk_hits": self.disk_hits,
+            "misses":    self.misses,
+            "hit_rate":  round(self.hits / lookups, 3) if lookups else None,
+            "stores":    self.stores,
+            "evictions": self.evictions,
+        }
+
+
+CACHE = ResponseCache()
@@ -0,0 +1,213 @@
+"""
+scheduler.py — admission control in front of the local Ollama daemon
+
+Every Ollama stream takes a ``Ticket`` first.  Tickets queue per agent and are
+granted round-robin across agents, under a global and a per-model concurrency
+cap.  Among the agents whose turn it is, requests for an already-resident
+model go first, so q2/q3/q4 variants don't evict each other on every request;
+``affinity_burst`` bounds how long that preference may starve the rest.
+
+A full queue is refused up front (503); a ticket that waits longer than
+``queue_timeout`` fails with 503 as well.  While queued, ``Ticket.wait``
+yields ``QueueStatus`` updates that the SSE stream forwards to the client.
+"""
+
+from __future__ import annotations
+import asyncio, itertools, math, os, time
+from collections import Counter, deque
+from typing import AsyncIterator, Deque, Dict, NamedTuple, Optional
+
+from fastapi import HTTPException
+
+from app.ollama_pool import OLLAMA_URLS
+
+
+class QueueStatus(NamedTuple):
+    position: int                  # tickets ahead of this one (0 = next up)
+    eta:      float                # rough seconds until granted
+
+
+class Ticket:
+    __slots__ = ("sched", "agent", "model", "seq", "enqueued", "granted", "started", "done")
+
+    def __init__(self, sched: "OllamaScheduler", agent: str, model: str, seq: int):
+        self.sched    = sched
+        self.agent    = agent
+        self.model    = model
+        self.seq      = seq
+        self.enqueued = time.monotonic()
+        self.granted  = asyncio.get_running_loop().create_future()
+        self.started  = 0.0
+        self.done     = False
+
+    async def wait(self) -> AsyncIterator[QueueStatus]:
+        """Yield position/ETA while queued; returns once granted, raises 503 on timeout."""
+        sched    = self.sched
+        deadline = self.enqueued + sched.queue_timeout
+        last     = None
+        while not self.granted.done():
+            status = sched.status(self)
+            if status != last:
+                last = status
+                yield status
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                sched.release(self)
+                raise HTTPException(503, "Ollama queue timeout")
+            changed = sched.changed
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def acquire(self) -> None:
+        async for _ in self.wait():
+            pass
+
+    def release(self) -> None:
+        self.sched.release(self)
+
+
+class OllamaScheduler:
+    def __init__(self, max_concurrency: int = 2, per_model: int = 2, max_queue: int = 64,
+                 queue_timeout: float = 60.0, affinity_burst: int = 4, max_loaded: int = 1):
+        self.max_concurrency = max_concurrency
+        self.per_model       = per_model
+        self.max_queue       = max_queue
+        self.queue_timeout   = queue_timeout
+        self.affinity_burst  = affinity_burst
+        self.max_loaded      = max(1, max_loaded)
+
+        self.queues:   Dict[str, Deque[Ticket]] = {}
+        self.rotation: Deque[str]               = deque()      # agents with queued tickets, RR order
+        self.running:  Counter                  = Counter()    # model -> active streams
+        self.resident: Deque[str]               = deque(maxlen=self.max_loaded)
+        self.queued    = 0
+        self.streak    = 0                                     # consecutive affinity-only grants
+        self.service   = 5.0                                   # EWMA seconds per stream
+        self._seq      = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+
+    # ── bookkeeping ──────────────────────────────────────────
+    @property
+    def changed(self) -> asyncio.Event:
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+        self._changed = asyncio.Event()
+
+    @property
+    def active(self) -> int:
+        return sum(self.running.values())
+
+    def status(self, ticket: Ticket) -> QueueStatus:
+        ahead = sum(1 for q in self.queues.values() for t in q if t.seq < ticket.seq)
+        eta   = math.ceil((ahead + 1) / self.max_concurrency) * self.service
+        return QueueStatus(ahead, round(eta, 1))
+
+    def check_capacity(self) -> None:
+        if self.queued >= self.max_queue:
+            raise HTTPException(503, "Ollama queue is full")
+
+    # ── lifecycle ────────────────────────────────────────────
+    def submit(self, agent: str, model: str) -> Ticket:
+        self.check_capacity()
+        ticket = Ticket(self, agent, model, next(self._seq))
+        queue  = self.queues.get(agent)
+        if queue is None:
+            queue = self.queues[agent] = deque()
+            self.rotation.append(agent)
+        queue.append(ticket)
+        self.queued += 1
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket.done:
+            return
+        ticket.done = True
+        if ticket.granted.done():
+            self.running[ticket.model] -= 1
+            if self.running[ticket.model] <= 0:
+                del self.running[ticket.model]
+            took = time.monotonic() - ticket.started
+            self.service = 0.8 * self.service + 0.2 * took
+        else:
+            queue = self.queues.get(ticket.agent)
+            if queue is not None:
+                queue.remove(ticket)
+                self.queued -= 1
+                if not queue:
+                    del self.queues[ticket.agent]
+                    self.rotation.remove(ticket.agent)
+            ticket.granted.cancel()
+        self._dispatch()
+
+    def _fits(self, ticket: Ticket) -> bool:
+        """Under the per-model cap, and not forcing Ollama to swap a busy model out."""
+        if self.running[ticket.model] >= self.per_model:
+            return False
+        return ticket.model in self.running or len(self.running) < self.max_loaded
+
+    def _pick(self) -> Optional[Ticket]:
+        heads = [self.queues[a][0] for a in self.rotation]
+        fits  = [t for t in heads if self._fits(t)]
+        warm  = [t for t in fits if t.model in self.resident]
+
+        if len(warm) < len(heads) and self.streak >= self.affinity_burst:
+            # Affinity has had its run: serve the oldest waiter, holding new
+            # grants back until the models it would evict have drained.
+            oldest = min(heads, key=lambda t: t.seq)
+            if self._fits(oldest):
+                self.streak = 0
+                return oldest
+            return None
+        if warm:
+            self.streak += len(warm) < len(heads)
+            return warm[0]
+        self.streak = 0
+        return fits[0] if fits else None
+
+    def _dispatch(self) -> None:
+        while self.active < self.max_concurrency:
+            ticket = self._pick()
+            if ticket is None:
+                break
+            queue = self.queues[ticket.agent]
+            queue.popleft()
+            self.queued -= 1
+            self.rotation.remove(ticket.agent)
+            if queue:
+                self.rotation.append(ticket.agent)             # back of the round-robin line
+            else:
+                del self.queues[ticket.agent]
+
+            self.running[ticket.model] += 1
+            if ticket.model not in self.resident:
+                self.resident.append(ticket.model)
+            ticket.started = time.monotonic()
+            ticket.granted.set_result(None)
+        self._notify()
+
+    def snapshot(self) -> Dict:
+        return {
+            "queued":   self.queued,
+            "running":  dict(self.running),
+            "resident": list(self.resident),
+            "service_s": round(self.service, 2),
+        }
+
+
+# Concurrency and residency limits are per node; the pool scales them.
+SCHEDULER = OllamaScheduler(
+    max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")) * len(OLLAMA_URLS),
+    per_model       = int(os.getenv("OLLAMA_MODEL_CONCURRENCY", "2")) * len(OLLAMA_URLS),
+    max_queue       = int(os.getenv("OLLAMA_QUEUE_MAX", "64")),
+    queue_timeout   = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "60")),
+    affinity_burst  = int(os.getenv("OLLAMA_AFFINITY_BURST", "4")),
+    max_loaded      = int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "1")) * len(OLLAMA_URLS),
+)
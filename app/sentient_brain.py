@@ -1,6 +1,10 @@
 import json
 from datetime import datetime
 
+from app.recall import RECALL, RECALL_SHARE
+from app.registry import AGENTS
+from app.tokens import count
+
 # ─────────── Configurable Memory & Personality ─────────── #
 SENTIENT_CORE = {
     "name": "LlamaAgent42",
@@ -35,6 +39,7 @@ def remember(message):
     entry = {"timestamp": datetime.now().isoformat(), "message": message}
     SENTIENT_CORE["memory"].append(entry)
     save_memory()
+    RECALL.index(SENTIENT_CORE["name"], [{"role": "user", "content": message}])
 
 # ─────────── Prompt Injection Engine ─────────── #
 def build_prompt(user_input: str) -> list[dict]:
@@ -49,8 +54,14 @@ def build_prompt(user_input: str) -> list[dict]:
     chat_history = SENTIENT_CORE["memory"][-10:]  # trim memory
     history_msgs = [{"role": "user", "content": m["message"]} for m in chat_history]
 
+    # Plus the most relevant older turns from the recall archive
+    budget = AGENTS[SENTIENT_CORE["name"]].budget
+    recalled = RECALL.relevant(SENTIENT_CORE["name"], user_input, history_msgs,
+                               int(budget.prompt * RECALL_SHARE), lambda m: count(m, budget.family))
+
     return [
         {"role": "system", "content": sys_prompt},
+        *([recalled] if recalled else []),
         *history_msgs,
         {"role": "user", "content": user_input}
     ]
@@ -0,0 +1,219 @@
+"""
+singleflight.py — coalesce identical in-flight chat requests
+
+The first request for a key starts one upstream pump task; identical requests
+arriving while it runs attach to the same flight instead of hitting
+Ollama/OpenAI again.  Chunks land in a log on the flight and each subscriber
+reads it through its own cursor, so a late joiner replays what it missed and
+a slow client never stalls the others.  The log is bounded: once it holds
+``FLIGHT_BUFFER`` chunks, everything every subscriber has read is dropped, and
+a subscriber that has fallen ``FLIGHT_BUFFER`` chunks behind is cut off with a
+503 instead of pinning the reply in memory.  A flight whose log no longer
+starts at the first chunk takes no new joiners.  The flight's ``on_done`` hook
+(the memory write) runs once, when the upstream finishes cleanly; the pump is
+cancelled if every subscriber goes away first.
+"""
+
+from __future__ import annotations
+import asyncio, hashlib, json, os
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+SINGLEFLIGHT  = os.getenv("SINGLEFLIGHT", "1") == "1"
+FLIGHT_BUFFER = int(os.getenv("FLIGHT_BUFFER", "4096"))     # chunks a subscriber may lag behind
+
+
+def flight_key(*parts) -> str:
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Cursor:
+    __slots__ = ("pos", "dropped")
+
+    def __init__(self, pos: int):
+        self.pos     = pos                              # next chunk to read, counted from the first
+        self.dropped = False
+
+
+class Flight:
+    def __init__(self, key: str, buffer: int = FLIGHT_BUFFER):
+        self.key         = key
+        self.buffer      = buffer
+        self.chunks: List = []                          # the log, from chunk ``base`` on
+        self.base        = 0
+        self.reply: List = []                           # text chunks, for ``on_done``
+        self.done        = False
+        self.error: Optional[BaseException] = None
+        self.cursors: List[_Cursor] = []
+        self.task: Optional[asyncio.Task] = None
+        self.text_bytes  = 0                            # str chunk lengths so far
+        self.dropped     = 0                            # subscribers cut off for lagging
+        self._changed    = asyncio.Event()
+        self._waiters: List = []                        # (text_bytes target, future)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self.cursors)
+
+    @property
+    def joinable(self) -> bool:
+        return self.base == 0 and not self.done
+
+    def _push(self, chunk) -> None:
+        self.chunks.append(chunk)
+        if isinstance(chunk, (str, bytes)):
+            self.reply.append(chunk)
+            if isinstance(chunk, str):
+                self.text_bytes += len(chunk)
+        if len(self.chunks) > self.buffer:
+            self._trim()
+        self._notify()
+
+    def _trim(self) -> None:
+        """Cut off subscribers ``buffer`` chunks behind, then drop what all have read."""
+        head = self.base + len(self.chunks)
+        for cur in self.cursors:
+            if head - cur.pos > self.buffer:
+                cur.dropped = True
+                self.dropped += 1
+        self.cursors = [c for c in self.cursors if not c.dropped]
+        low = min((c.pos for c in self.cursors), default=head)
+        if low > self.base:
+            del self.chunks[:low - self.base]
+            self.base = low
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+        if self._waiters:
+            keep = []
+            for target, fut in self._waiters:
+                if fut.done():
+                    continue
+                if self.done or self.text_bytes >= target:
+                    fut.set_result(None)
+                else:
+                    keep.append((target, fut))
+            self._waiters = keep
+
+    async def subscribe(self) -> AsyncIterator:
+        """Every chunk of the flight from the start, then its error (if any)."""
+        async with aclosing(self.batches()) as batches:
+            async for batch in batches:
+                for chunk in batch:
+                    yield chunk
+
+    async def batches(self, window: float = 0.0, max_bytes: int = 0) -> AsyncIterator[List]:
+        """
+        Like ``subscribe`` but in runs: everything available so far, held up to
+        ``window`` seconds for more unless ``max_bytes`` of text is already in.
+        The first text goes out as soon as it arrives; only later runs wait.
+        """
+        cur = _Cursor(self.base)
+        self.cursors.append(cur)
+        loop = asyncio.get_running_loop()
+        read = 0                                        # text bytes handed out so far
+        try:
+            while True:
+                if cur.dropped:
+                    raise HTTPException(503, detail="Client too slow; stream dropped")
+                if cur.pos == self.base + len(self.chunks) and not self.done:
+                    await self._changed.wait()
+                    continue
+                target = read + max_bytes if max_bytes else float("inf")
+                if window > 0 and read and not self.done and self.text_bytes < target:
+                    # One future per window, woken by the pump once enough text
+                    # is in, rather than a wake-up per token.
+                    fut = loop.create_future()
+                    self._waiters.append((target, fut))
+                    timer = loop.call_later(window, _resolve, fut)
+                    try:
+                        await fut
+                    finally:
+                        timer.cancel()
+                    if cur.dropped:
+                        continue
+                head = self.base + len(self.chunks)
+                if head > cur.pos:
+                    batch   = self.chunks[cur.pos - self.base:]
+                    cur.pos = head
+                    read   += sum(len(c) for c in batch if isinstance(c, str))
+                    yield batch
+                if self.done and cur.pos == self.base + len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            if cur in self.cursors:
+                self.cursors.remove(cur)
+            if not self.cursors and not self.done and self.task is not None:
+                self.task.cancel()                      # nobody left to read it
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class SingleFlight:
+    def __init__(self, buffer: int = FLIGHT_BUFFER):
+        self.buffer    = buffer
+        self.flights: Dict[str, Flight] = {}
+        self.started   = 0
+        self.coalesced = 0
+        self.dropped   = 0                              # lagging subscribers cut off
+
+    def get(self, key: str) -> Optional[Flight]:
+        """The running flight for ``key`` if a new subscriber can still replay it from the start."""
+        flight = self.flights.get(key)
+        if flight is None or not flight.joinable:
+            return None
+        self.coalesced += 1
+        return flight
+
+    def start(self, key: Optional[str], stream: AsyncIterator,
+              on_done: Optional[Callable[[List], None]] = None) -> Flight:
+        """Run ``stream`` as a flight; a ``None`` key runs it without letting others join."""
+        flight = Flight(key, self.buffer)
+        if key is not None:
+            self.flights[key] = flight
+        flight.task = asyncio.create_task(self._pump(flight, stream, on_done))
+        self.started += 1
+        return flight
+
+    async def _pump(self, flight: Flight, stream: AsyncIterator,
+                    on_done: Optional[Callable[[List], None]]) -> None:
+        try:
+            async for chunk in stream:
+                flight._push(chunk)
+            if on_done is not None:
+                # Before ``done`` so a follow-up turn already sees the reply.
+                try:
+                    on_done(flight.reply)
+                except Exception as exc:
+                    print("🧠 [FLIGHT ON_DONE ERROR]:", repr(exc))
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as exc:
+            flight.error = exc
+        finally:
+            flight.done  = True
+            flight.reply = []
+            self.dropped += flight.dropped
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            flight._notify()
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self.flights), "started": self.started, "coalesced": self.coalesced,
+                "dropped": self.dropped}
+
+
+FLIGHTS = SingleFlight()
@@ -0,0 +1,130 @@
+"""
+sse.py — server-sent event framing for /send streams
+
+Tokens are coalesced into one ``data:`` frame per window: ``SSE_WINDOW_MS``
+milliseconds or ``SSE_WINDOW_BYTES`` of text, whichever comes first.  A
+request can override either with ``window_ms`` / ``window_bytes``, and 0 ms
+means a frame per upstream read.  So a stream costs one write per window
+rather than one per token; the first text is framed as soon as it arrives, so
+the window never adds to time-to-first-token.  Frames are pre-encoded byte templates around a
+single C-level string escape instead of a ``json.dumps`` of a dict, and
+whitespace-only tokens are kept so spacing survives.  The closing frame
+carries Ollama's eval stats when the backend reported them.  When the client
+goes away the frame generator is closed, which closes its flight
+subscription; the last subscriber leaving cancels the upstream request.
+``multiplex`` interleaves several agents' frame streams on one connection
+(``/send_many``), splicing an ``"agent"`` key into each frame.
+"""
+
+from __future__ import annotations
+import asyncio, json, os
+from contextlib import aclosing
+from json.encoder import encode_basestring_ascii
+from typing import AsyncIterator, Dict, Mapping, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.scheduler import QueueStatus
+from app.stream_decode import OllamaStats
+
+SSE_WINDOW_MS    = float(os.getenv("SSE_WINDOW_MS", "20"))
+SSE_WINDOW_BYTES = int(os.getenv("SSE_WINDOW_BYTES", "256"))
+
+_DATA_HEAD = b'data: {"data": '
+_DATA_TAIL = b', "done": false}\n\n'
+DONE_FRAME = b'data: {"done": true}\n\n'
+
+
+def data_frame(text: str) -> bytes:
+    """Same bytes as ``json.dumps({'data': text, 'done': False})``, framed."""
+    return _DATA_HEAD + encode_basestring_ascii(text).encode() + _DATA_TAIL
+
+
+def queue_frame(status: QueueStatus) -> bytes:
+    return f"data: {json.dumps({'queue': status._asdict(), 'done': False})}\n\n".encode()
+
+
+def done_frame(stats: Optional[OllamaStats] = None) -> bytes:
+    if stats is None:
+        return DONE_FRAME
+    return f"data: {json.dumps({'done': True, 'stats': stats.as_dict()})}\n\n".encode()
+
+
+def error_frame(detail) -> bytes:
+    return f"data: {json.dumps({'error': detail, 'done': True})}\n\n".encode()
+
+
+def window(body: Dict) -> Tuple[float, int]:
+    """Coalescing window (seconds, bytes) for a request, clamped to sane bounds."""
+    try:
+        ms   = float(body.get("window_ms", SSE_WINDOW_MS))
+        size = int(body.get("window_bytes", SSE_WINDOW_BYTES))
+    except (TypeError, ValueError):
+        raise HTTPException(400, detail="window_ms / window_bytes must be numbers")
+    return min(max(ms, 0.0), 1000.0) / 1000, min(max(size, 0), 65536)
+
+
+async def frames(flight, seconds: float, max_bytes: int) -> AsyncIterator[bytes]:
+    """The flight as SSE frames: queue updates, coalesced text, then done (or error)."""
+    stats = None
+    async with aclosing(flight.batches(seconds, max_bytes)) as batches:
+        try:
+            async for batch in batches:
+                text = []
+                for chunk in batch:
+                    if isinstance(chunk, str):
+                        text.append(chunk)
+                    elif isinstance(chunk, QueueStatus):
+                        yield queue_frame(chunk)
+                    elif isinstance(chunk, OllamaStats):
+                        stats = chunk
+                    elif isinstance(chunk, bytes):
+                        text.append(chunk.decode("utf-8"))
+                joined = "".join(text)
+                if joined:
+                    yield data_frame(joined)
+        except HTTPException as exc:
+            yield error_frame(exc.detail)
+            return
+    yield done_frame(stats)
+
+
+async def failed(detail) -> AsyncIterator[bytes]:
+    """A stream that ends before it starts: just the error frame."""
+    yield error_frame(detail)
+
+
+async def multiplex(streams: Mapping[str, AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+    """
+    Frames from every stream as they come, each tagged ``"agent": name``, then
+    one untagged done frame once all have ended.  Closing this generator (the
+    client went away) closes every stream, and so their flight subscriptions.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(agent: str, frames: AsyncIterator[bytes]) -> None:
+        head = b'data: {"agent": ' + encode_basestring_ascii(agent).encode() + b", "
+        try:
+            async with aclosing(frames) as frames:
+                async for frame in frames:                     # every frame is b'data: {...'
+                    queue.put_nowait(head + frame[7:])
+        except Exception as exc:
+            print("🧠 [SEND_MANY ERROR]:", agent, repr(exc))
+            queue.put_nowait(head + error_frame(f"Stream error: {exc}")[7:])
+        finally:
+            queue.put_nowait(None)
+
+    tasks = [asyncio.create_task(pump(agent, frames)) for agent, frames in streams.items()]
+    try:
+        left = len(tasks)
+        while left:
+            frame = await queue.get()
+            if frame is None:
+                left -= 1
+            else:
+                yield frame
+        yield DONE_FRAME
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
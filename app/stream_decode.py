@@ -0,0 +1,109 @@
+"""
+stream_decode.py — incremental decoder for Ollama's /api/chat stream
+
+Fed raw ``aiter_bytes()`` buffers, it splits complete lines without
+decoding them to ``str`` first.  It accepts bare NDJSON (what Ollama sends)
+and SSE framing (``data:`` lines, comments, blank separators), and returns
+each ``message.content`` as it arrives.  Lines are parsed with ``jiter``
+(a dependency of the OpenAI SDK) and its key/string cache, else ``orjson``,
+else ``json``.  The final ``done`` line's timing fields are kept as an
+``OllamaStats``, and an ``{"error": ...}`` line raises.
+"""
+
+from __future__ import annotations
+from functools import partial
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    import jiter
+    _loads = partial(jiter.from_json, cache_mode="all")
+except ImportError:
+    try:
+        import orjson
+        _loads = orjson.loads
+    except ImportError:
+        import json
+        _decode = json.JSONDecoder().decode
+
+        def _loads(line: bytes):
+            return _decode(line.decode())               # skips json.loads' bytes sniffing
+
+
+class OllamaStats(NamedTuple):
+    eval_count:           int = 0
+    eval_duration:        int = 0        # ns
+    prompt_eval_count:    int = 0
+    prompt_eval_duration: int = 0        # ns
+    load_duration:        int = 0        # ns
+    total_duration:       int = 0        # ns
+
+    @classmethod
+    def from_obj(cls, obj: Dict) -> "OllamaStats":
+        return cls(*(obj.get(f) or 0 for f in cls._fields))
+
+    @property
+    def tokens_per_s(self) -> Optional[float]:
+        return self.eval_count / (self.eval_duration / 1e9) if self.eval_duration else None
+
+    def as_dict(self) -> Dict:
+        out = self._asdict()
+        out["tokens_per_s"] = round(self.tokens_per_s, 1) if self.tokens_per_s else None
+        return out
+
+
+class OllamaStreamError(RuntimeError):
+    """Ollama reported an error inside an otherwise 200 stream."""
+
+
+class OllamaDecoder:
+    __slots__ = ("_buf", "done", "stats")
+
+    def __init__(self):
+        self._buf  = b""
+        self.done  = False
+        self.stats: Optional[OllamaStats] = None
+
+    def feed(self, data: bytes) -> List[str]:
+        """Content pieces from every line completed by ``data``."""
+        buf = self._buf + data if self._buf else data
+        out: List[str] = []
+        start = 0
+        while not self.done:
+            nl = buf.find(b"\n", start)
+            if nl < 0:
+                break
+            if nl > start:
+                self._line(buf[start:nl], out)
+            start = nl + 1
+        self._buf = buf[start:] if start < len(buf) and not self.done else b""
+        return out
+
+    def close(self) -> List[str]:
+        """Whatever a final unterminated line holds."""
+        out: List[str] = []
+        if self._buf and not self.done:
+            self._line(self._buf, out)
+        self._buf = b""
+        return out
+
+    def _line(self, line: bytes, out: List[str]) -> None:
+        if line[0] != 0x7B:                                 # not "{": SSE framing or noise
+            line = line.strip()
+            if line.startswith(b"data:"):
+                line = line[5:].lstrip()
+            if not line.startswith(b"{"):
+                return                                      # comment, event:, id:, [DONE]
+        try:
+            obj = _loads(line)
+        except ValueError:
+            return
+        msg = obj.get("message")
+        if msg:
+            content = msg.get("content")
+            if content:
+                out.append(content)
+        if obj.get("done"):
+            self.done  = True
+            self.stats = OllamaStats.from_obj(obj)
+        elif "error" in obj:
+            raise OllamaStreamError(str(obj["error"]))
@@ -0,0 +1,158 @@
+"""
+tokens.py — per-model context budgets and cached token counts
+
+Budgets come from ``app.agent_models.model_budgets``.  Counts use
+``tiktoken`` when it is installed and the encoding is available locally, and
+an offline estimator otherwise.  Each message is counted once, and the count
+is stored on the message itself (``"tokens": {family: n}``), so it is
+persisted with the message and prompt assembly never re-tokenizes history.
+``fit`` cuts a history to the prompt budget (context minus reserved output);
+``wire`` strips the cached counts before a payload goes upstream.
+
+With a ``block`` set, ``fit`` only cuts in front of "boundary" messages.
+Boundaries are chosen by content: a message is one with probability
+``tokens / block``, so they fall about ``block`` tokens apart and stay put as
+the history slides.  The kept prefix is then byte-identical turn after turn
+until the window has moved a whole block, and Ollama's KV cache and OpenAI's
+prompt cache keep hitting, instead of missing on every turn once the history
+is full.
+"""
+
+from __future__ import annotations
+import os, re, zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from app.agent_models import model_budgets
+
+try:
+    import tiktoken
+except ImportError:                                      # estimator only
+    tiktoken = None
+
+# Chat-template tokens around each message, and the reply primer.
+#   llama3:  <|start_header_id|>role<|end_header_id|>\n\n … <|eot_id|>
+#   o200k:   OpenAI's documented 3 per message + 3 per reply
+MESSAGE_OVERHEAD = {"llama3": 5, "o200k": 3}
+REPLY_PRIMER     = {"llama3": 5, "o200k": 3}
+_ENCODINGS       = {"o200k": "o200k_base"}
+
+DEFAULT_BUDGET = {"context": 4096, "reserve": 512}
+PREFIX_BLOCK   = float(os.getenv("PREFIX_BLOCK", "0.25"))     # share of the prompt evicted at once
+
+# Roughly how BPE vocabularies split text: common words are one token and long
+# ones a token per ~6 letters, digits go in groups of three, punctuation runs
+# and line breaks take about a token each, and non-ASCII text about one token
+# per character.
+_PIECES = re.compile(r" ?[A-Za-z]+|\d{1,3}| ?[^\sA-Za-z\d\x80-\U0010ffff]+|\s*\n\s*|[\x80-\U0010ffff]| +")
+
+
+@dataclass(frozen=True)
+class Budget:
+    family:     str                         # tokenizer / chat template family
+    context:    int                         # model context window
+    reserve:    int                         # held back for the reply
+    max_prompt: Optional[int] = None        # optional cap below context - reserve
+    block:      int = 0                     # evict in ~block-token steps (0: exact fit)
+
+    @property
+    def prompt(self) -> int:
+        room = self.context - self.reserve
+        return min(room, self.max_prompt) if self.max_prompt else room
+
+
+def family_of(model: str) -> str:
+    return "o200k" if model.startswith(("openai:", "gpt-")) else "llama3"
+
+
+def budget_for(tag: str) -> Budget:
+    """Budget for a ``model_routes`` tag (``openai:`` prefix included)."""
+    spec = model_budgets.get(tag) or DEFAULT_BUDGET
+    return Budget(family_of(tag), spec["context"], spec["reserve"], spec.get("max_prompt"))
+
+
+@lru_cache(maxsize=None)
+def _encoder(family: str):
+    if tiktoken is None or family not in _ENCODINGS:
+        return None
+    try:
+        return tiktoken.get_encoding(_ENCODINGS[family])
+    except Exception:                                    # not cached locally and no network
+        return None
+
+
+def estimate(text: str) -> int:
+    n = 0
+    for piece in _PIECES.findall(text):
+        n += 1 + (len(piece) - 1) // 6 if piece.strip().isalpha() and piece.isascii() else 1
+    return n
+
+
+def text_tokens(text: str, family: str) -> int:
+    enc = _encoder(family)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return estimate(text)
+
+
+def count(msg: Dict, family: str) -> int:
+    """Tokens ``msg`` takes in a prompt, computed once and cached on the message."""
+    cached = msg.get("tokens")
+    if cached is not None:
+        n = cached.get(family)
+        if n is not None:
+            return n
+    content = msg.get("content") or ""
+    n = MESSAGE_OVERHEAD.get(family, 4) + text_tokens(content if isinstance(content, str) else str(content), family)
+    msg["tokens"] = {**cached, family: n} if cached else {family: n}
+    return n
+
+
+def fit(messages: List[Dict], budget: Budget) -> List[Dict]:
+    """
+    The longest recent slice of ``messages`` that fits ``budget.prompt``.
+    Leading system messages and the first message after them (the pinned
+    memory head) always stay, as does the newest message; the rest are
+    dropped oldest first, up to the next boundary when ``budget.block`` is
+    set.  Cost is O(kept) once messages carry their counts.
+    """
+    family = budget.family
+    head   = 0
+    while head < len(messages) - 1 and messages[head].get("role") == "system":
+        head += 1
+    head += 1                                           # messages[:head] are pinned
+    if head >= len(messages):
+        return messages
+    room = budget.prompt - REPLY_PRIMER.get(family, 3) - sum(count(m, family) for m in messages[:head])
+
+    last = len(messages) - 1
+    cut  = len(messages)
+    for i in range(last, head - 1, -1):
+        n = count(messages[i], family)
+        if n > room and i != last:
+            break
+        room -= n
+        cut   = i
+    if budget.block and cut > head:
+        cut = _boundary(messages, cut, last, family, budget.block)
+    return messages if cut == head else messages[:head] + messages[cut:]
+
+
+def _boundary(messages: List[Dict], cut: int, last: int, family: str, block: int) -> int:
+    """First boundary message at or after ``cut`` (``cut`` itself if none is left)."""
+    for i in range(cut, last):
+        content = messages[i].get("content") or ""
+        key     = zlib.crc32((content if isinstance(content, str) else str(content)).encode("utf-8", "surrogatepass"))
+        if key % block < count(messages[i], family):
+            return i
+    return cut
+
+
+def prompt_tokens(messages: Iterable[Dict], family: str) -> int:
+    return REPLY_PRIMER.get(family, 3) + sum(count(m, family) for m in messages)
+
+
+def wire(messages: List[Dict]) -> List[Dict]:
+    """``messages`` as the upstream expects them: cached counts removed."""
+    return [{k: v for k, v in m.items() if k != "tokens"} if "tokens" in m else m for m in messages]
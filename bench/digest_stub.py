@@ -0,0 +1,82 @@
+"""
+bench/digest_stub.py — rolling memory digests against a stub summarizer
+
+Feeds turns to one digest-enabled agent through the write-behind writer,
+pokes the digester after each reply as ``/send`` does, and checks that:
+every turn is either still raw or was folded exactly once, the raw window
+stays under the trigger, and digest + recent turns fit the prompt budget.
+Also reports how long the request path spends building the prompt.
+
+    python -m bench.digest_stub [--turns 400] [--context 2048]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, dataclasses, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-digest-"))
+
+from app import memory, tokens                                        # noqa: E402
+from app.digest import Digester, digest_key, with_digest              # noqa: E402
+from app.persistence import MemoryWriter                              # noqa: E402
+from app.registry import AGENTS                                       # noqa: E402
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=400)
+    ap.add_argument("--context", type=int, default=2048)
+    args = ap.parse_args()
+
+    rec = dataclasses.replace(AGENTS["LlamaAgent42"], name="DigestBench", digest=True,
+                              budget=tokens.Budget("llama3", args.context, 256))
+    seen = []
+
+    async def stub(previous, span):
+        seen.extend(m["content"] for m in span)
+        await asyncio.sleep(0.005)                                   # pretend to think
+        return f"{(previous or '')[:200]} | folded {len(span)} turns ending {span[-1]['content'][:12]}"
+
+    writer   = MemoryWriter(interval=0.01)
+    digester = Digester(summarizer=stub)
+    build_us = []
+    for i in range(args.turns):
+        msg = {"role": "user", "content": f"u{i} " + "talking about build orders " * 6}
+        tokens.count(msg, "llama3")
+        writer.append(rec.name, msg)
+
+        t0 = time.perf_counter()
+        prompt = tokens.fit(with_digest(rec.name, writer.view(rec.name)), rec.budget)
+        build_us.append((time.perf_counter() - t0) * 1e6)
+        assert tokens.prompt_tokens(prompt, "llama3") <= rec.budget.prompt
+
+        reply = {"role": "assistant", "content": f"a{i} " + "sure, scouts first " * 5}
+        tokens.count(reply, "llama3")
+        writer.append(rec.name, reply)
+        digester.poke(rec)
+        await asyncio.sleep(0)
+
+    await writer.stop()
+    digester.poke(rec)
+    await digester.drain()
+    await digester.stop()
+
+    raw     = [m["content"] for m in memory.load_memory(rec.name)]
+    digests = memory.load_memory(digest_key(rec.name))
+    every   = {f"{k}{i} " for i in range(args.turns) for k in "ua"}
+    first   = lambda c: c.split(" ", 1)[0] + " "
+    folded  = [first(c) for c in seen]
+    assert len(folded) == len(set(folded)), "a turn was summarized twice"
+    assert every == set(folded) | {first(c) for c in raw}, "a turn was lost"
+    assert not set(folded) & {first(c) for c in raw[1:]}, "a folded turn is still raw"
+    raw_tokens = tokens.prompt_tokens(memory.load_memory(rec.name), "llama3")
+
+    build_us.sort()
+    print(f"{args.turns} turns: {len(digests)} digests, {len(folded)} turns folded, "
+          f"{len(raw)} raw left ({raw_tokens} tokens, trigger {int(rec.budget.prompt * digester.trigger)})")
+    print(f"prompt build p50 {build_us[len(build_us) // 2]:.0f} µs  p99 {build_us[int(len(build_us) * .99)]:.0f} µs")
+    print(digester.stats())
+    print("ok")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,330 @@
+"""
+bench/fakes.py — local stand-ins for the upstream LLM servers
+
+``FakeOllama`` speaks enough of Ollama's HTTP API (``/api/chat``,
+``/api/tags``, ``/api/ps``) to drive the gateway; ``FakeOpenAI`` replays
+streams shaped like recorded OpenAI ones (``/v1/responses`` events and
+``/v1/chat/completions`` chunks); ``serve`` runs any ASGI app under uvicorn
+on a background thread and yields its base URL.
+"""
+
+from __future__ import annotations
+import asyncio, json, random, socket, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+import uvicorn
+
+
+class FakeOllama:
+    """
+    Streams ``tokens`` chunks per chat request with configurable pacing and
+    failures.  With ``load_delay`` set, a request for a model that is not among
+    the ``max_loaded`` resident ones pays a (serialised) cold load first; with
+    ``contention`` on, token pacing slows down with the number of live streams,
+    like a single GPU shared between them.  With ``prompt_cache`` on, each model
+    keeps the messages of its last prompt as a KV cache: only the messages after
+    the common prefix count in ``prompt_eval_count``, each costing
+    ``prompt_token_delay`` seconds (tokens taken as characters / 4).
+    """
+
+    def __init__(self, tokens: int = 32, first_token_delay: float = 0.0,
+                 token_delay: float = 0.0, fail_rate: float = 0.0,
+                 framing: str = "ndjson", models: Sequence[str] = ("llama3:8b-instruct-q4_K_M",),
+                 load_delay: float = 0.0, max_loaded: int = 1, contention: bool = False,
+                 prompt_cache: bool = False, prompt_token_delay: float = 0.0):
+        self.tokens            = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay       = token_delay
+        self.fail_rate         = fail_rate
+        self.framing           = framing
+        self.models            = list(models)
+        self.load_delay        = load_delay
+        self.loaded: deque     = deque(maxlen=max_loaded)
+        self.contention        = contention
+        self.prompt_cache      = prompt_cache
+        self.prompt_token_delay = prompt_token_delay
+        self.kv: dict          = {}                     # model -> messages of its last prompt
+        self.prompt_tokens     = 0
+        self.evaluated         = 0
+        self.requests          = 0
+        self.loads             = 0
+        self.active            = 0
+        self.bodies: deque     = deque(maxlen=256)
+        self._load_lock: asyncio.Lock | None = None
+
+    async def _ensure_loaded(self, model: str) -> None:
+        if not self.load_delay:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if model not in self.loaded:
+                await asyncio.sleep(self.load_delay)
+                self.loaded.append(model)
+                self.loads += 1
+
+    def _prompt_eval(self, model: str, messages: list) -> int:
+        """Prompt tokens this request evaluates, after reusing the model's cached prefix."""
+        size   = lambda ms: sum(len(m.get("content") or "") // 4 + 4 for m in ms)
+        cached = self.kv.get(model, []) if self.prompt_cache else []
+        keep   = 0
+        while keep < min(len(cached), len(messages)) and cached[keep] == messages[keep]:
+            keep += 1
+        self.kv[model] = messages
+        total, todo = size(messages), size(messages[keep:])
+        self.prompt_tokens += total
+        self.evaluated     += todo
+        return todo
+
+    def _frame(self, obj: dict) -> bytes:
+        body = json.dumps(obj).encode()
+        return b"data: " + body + b"\n\n" if self.framing == "sse" else body + b"\n"
+
+    async def _json(self, send, status: int, obj) -> None:
+        body = json.dumps(obj).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _chat(self, receive, send) -> None:
+        raw = b""
+        while True:
+            msg = await receive()
+            raw += msg.get("body", b"")
+            if not msg.get("more_body"):
+                break
+        body  = json.loads(raw or b"{}")
+        model = body.get("model") or self.models[0]
+
+        self.requests += 1
+        if self.fail_rate and random.random() < self.fail_rate:
+            await self._json(send, 500, {"error": "injected failure"})
+            return
+        self.bodies.append(body)
+        if body.get("stream") is False and not body.get("messages"):      # load-only request
+            await self._ensure_loaded(model)
+            await self._json(send, 200, {"model": model, "message": {"role": "assistant", "content": ""},
+                                         "done_reason": "load", "done": True})
+            return
+        if body.get("stream") is False:                 # one JSON object, e.g. digest summaries
+            await self._ensure_loaded(model)
+            await asyncio.sleep(self.first_token_delay + self.token_delay * self.tokens)
+            text = "".join(f"tok{i} " for i in range(self.tokens))
+            await self._json(send, 200, {"model": model, "message": {"role": "assistant", "content": text},
+                                         "done": True, "eval_count": self.tokens})
+            return
+
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")]})
+        started = time.perf_counter_ns()
+        self.active += 1
+        try:
+            await self._ensure_loaded(model)
+            evaluated = self._prompt_eval(model, body.get("messages") or [])
+            prompt_ns = time.perf_counter_ns()
+            if self.prompt_token_delay:
+                await asyncio.sleep(self.prompt_token_delay * evaluated)
+            prompt_ns = time.perf_counter_ns() - prompt_ns
+            if self.first_token_delay:
+                await asyncio.sleep(self.first_token_delay)
+            for i in range(self.tokens):
+                if i and self.token_delay:
+                    await asyncio.sleep(self.token_delay * (self.active if self.contention else 1))
+                frame = self._frame({"model": model, "message": {"role": "assistant", "content": f"tok{i} "},
+                                     "done": False})
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+        finally:
+            self.active -= 1
+        took = time.perf_counter_ns() - started
+        await send({"type": "http.response.body", "more_body": False, "body": self._frame({
+            "model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+            "total_duration": took, "prompt_eval_count": evaluated,
+            "prompt_eval_duration": prompt_ns or took // 10,
+            "eval_count": self.tokens, "eval_duration": took,
+        })})
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        if path == "/api/chat":
+            await self._chat(receive, send)
+        elif path == "/api/tags":
+            await self._json(send, 200, {"models": [{"name": m, "model": m} for m in self.models]})
+        elif path == "/api/ps":
+            resident = list(self.loaded) if self.load_delay else self.models[:1]
+            expires  = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 300))
+            await self._json(send, 200, {"models": [{"name": m, "model": m, "expires_at": expires}
+                                                    for m in resident]})
+        else:
+            await self._json(send, 404, {"error": "not found"})
+
+
+class FakeOpenAI:
+    """
+    Streams ``tokens`` text deltas per request, in the event order a recorded
+    Responses stream has (created, in_progress, output_item/content_part added,
+    deltas, the done events, completed) or as chat.completion chunks ending in
+    ``[DONE]``.  ``fail_after`` ends a Responses stream with ``response.failed``
+    after that many deltas.  Request bodies are kept in ``bodies``; a client
+    that goes away mid-stream stops the deltas and counts in ``cancelled``.
+    Both report usage at the end (chat completions when ``include_usage`` is
+    asked for); ``cached_tokens`` is the prefix shared with the previous
+    request's input, in whole messages, as OpenAI's prompt cache would report.
+    """
+
+    def __init__(self, tokens: int = 32, first_token_delay: float = 0.0,
+                 token_delay: float = 0.0, fail_after: int | None = None):
+        self.tokens            = tokens
+        self.first_token_delay = first_token_delay
+        self.token_delay       = token_delay
+        self.fail_after        = fail_after
+        self.bodies: list      = []
+        self.requests          = 0
+        self.cancelled         = 0
+        self._last: list       = []
+
+    def _usage(self, messages: list):
+        """(prompt, cached) tokens for ``messages``, characters / 4."""
+        size = lambda ms: sum(len(json.dumps(m)) // 4 for m in ms)
+        keep = 0
+        while keep < min(len(self._last), len(messages)) and self._last[keep] == messages[keep]:
+            keep += 1
+        self._last = messages
+        return size(messages), size(messages[:keep])
+
+    @staticmethod
+    def _event(obj: dict) -> bytes:
+        return b"event: " + obj["type"].encode() + b"\ndata: " + json.dumps(obj).encode() + b"\n\n"
+
+    def _response(self, rid: str, status: str, output: list, usage=None) -> dict:
+        return {"id": rid, "object": "response", "created_at": int(time.time()), "status": status,
+                "model": "gpt-4o-2024-08-06", "output": output, "usage": usage,
+                "error": None, "incomplete_details": None, "instructions": None, "metadata": {},
+                "parallel_tool_calls": True, "temperature": 1.0, "tool_choice": "auto",
+                "tools": [], "top_p": 1.0, "text": {"format": {"type": "text"}}}
+
+    def _responses_events(self, body: dict):
+        """The recorded event sequence, as (event, is_delta) pairs."""
+        rid, mid = f"resp_{self.requests:06d}", f"msg_{self.requests:06d}"
+        seq = iter(range(1 << 30))
+        ev  = lambda type_, **kw: {"type": type_, "sequence_number": next(seq), **kw}
+        yield ev("response.created", response=self._response(rid, "in_progress", [])), False
+        yield ev("response.in_progress", response=self._response(rid, "in_progress", [])), False
+        item = {"id": mid, "type": "message", "status": "in_progress", "role": "assistant", "content": []}
+        yield ev("response.output_item.added", output_index=0, item=item), False
+        part = {"type": "output_text", "text": "", "annotations": []}
+        yield ev("response.content_part.added", item_id=mid, output_index=0, content_index=0, part=part), False
+        text = []
+        for i in range(self.tokens):
+            if self.fail_after is not None and i == self.fail_after:
+                failed = self._response(rid, "failed", [])
+                failed["error"] = {"code": "server_error", "message": "injected failure"}
+                yield ev("response.failed", response=failed), False
+                return
+            text.append(f"tok{i} ")
+            yield ev("response.output_text.delta", item_id=mid, output_index=0, content_index=0,
+                     delta=text[-1]), True
+        full = "".join(text)
+        part = {"type": "output_text", "text": full, "annotations": []}
+        yield ev("response.output_text.done", item_id=mid, output_index=0, content_index=0, text=full), False
+        yield ev("response.content_part.done", item_id=mid, output_index=0, content_index=0, part=part), False
+        item = {**item, "status": "completed", "content": [part]}
+        yield ev("response.output_item.done", output_index=0, item=item), False
+        prompt, cached = self._usage(body.get("input") or [])
+        usage  = {"input_tokens": prompt, "input_tokens_details": {"cached_tokens": cached},
+                  "output_tokens": self.tokens, "output_tokens_details": {"reasoning_tokens": 0},
+                  "total_tokens": prompt + self.tokens}
+        yield ev("response.completed", response=self._response(rid, "completed", [item], usage)), False
+
+    def _chat_events(self, body: dict):
+        cid  = f"chatcmpl-{self.requests:06d}"
+        base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "gpt-4o")}
+        chunk = lambda delta, finish=None: b"data: " + json.dumps(
+            {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}).encode() + b"\n\n"
+        yield chunk({"role": "assistant", "content": ""}), False
+        for i in range(self.tokens):
+            yield chunk({"content": f"tok{i} "}), True
+        yield chunk({}, "stop"), False
+        if (body.get("stream_options") or {}).get("include_usage"):
+            prompt, cached = self._usage(body.get("messages") or [])
+            usage = {"prompt_tokens": prompt, "completion_tokens": self.tokens,
+                     "total_tokens": prompt + self.tokens,
+                     "prompt_tokens_details": {"cached_tokens": cached}}
+            yield b"data: " + json.dumps({**base, "choices": [], "usage": usage}).encode() + b"\n\n", False
+        yield b"data: [DONE]\n\n", False
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        raw = b""
+        while True:
+            msg = await receive()
+            raw += msg.get("body", b"")
+            if not msg.get("more_body"):
+                break
+        body = json.loads(raw or b"{}")
+        path = scope["path"]
+        if path.endswith("/responses"):
+            events = ((self._event(e), d) for e, d in self._responses_events(body))
+        elif path.endswith("/chat/completions"):
+            events = self._chat_events(body)
+        else:
+            await send({"type": "http.response.start", "status": 404,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b'{"error": {"message": "not found"}}'})
+            return
+        self.requests += 1
+        self.bodies.append(body)
+
+        gone = asyncio.Event()
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            gone.set()
+
+        watcher = asyncio.create_task(watch())
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        try:
+            if self.first_token_delay:
+                await asyncio.sleep(self.first_token_delay)
+            first = True
+            for frame, is_delta in events:
+                if is_delta and not first and self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                first = first and not is_delta
+                if gone.is_set():
+                    self.cancelled += 1
+                    return
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(app, port: int = 0, lifespan: str = "off") -> Iterator[str]:
+    """Run ``app`` on 127.0.0.1 in a daemon thread; yields ``http://127.0.0.1:<port>``."""
+    port   = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                           log_level="warning", lifespan=lifespan))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
@@ -0,0 +1,230 @@
+"""
+bench/gateway.py — end-to-end load and latency suite for the chat gateway
+
+Starts ``app.main:app`` in-process (uvicorn on a background thread, startup
+hooks included) against a ``FakeOllama`` and a ``FakeOpenAI``, then drives
+``/api/chat/send`` over real HTTP, one scenario at a time:
+
+    stream        llama agents, SSE
+    plain         llama agents, one JSON reply
+    openai        the prompt agent (Responses API) plus a chat-completions agent, SSE
+    large-memory  one agent whose legacy ``<agent>.json`` is ``--memory-kb`` KiB
+                  (the first request pays the migration), SSE
+    many-agents   every registered agent at once, SSE
+
+Each scenario reports throughput, p50/p95/p99 time to first text frame and
+total latency, errors, the gateway's event-loop lag and RSS.  The harness
+shares the process, so RSS includes the fakes and the client.  ``--out``
+writes everything as JSON, with the commit, for comparing runs.
+
+    python -m bench.gateway [--requests 200] [--concurrency 16] [--token-ms 5]
+                            [--first-token-ms 20] [--tokens 32] [--fail-rate 0]
+                            [--scenarios stream,plain,...] [--out results.json]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, itertools, json, os, platform, resource, subprocess, sys, tempfile, time
+from typing import Dict, List, Optional
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-gateway-"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("PAYLOAD_LOG_SAMPLE", "0")
+
+import httpx                                                     # noqa: E402
+
+from bench.fakes import FakeOllama, FakeOpenAI, free_port, serve  # noqa: E402
+
+SCENARIOS = ("stream", "plain", "openai", "large-memory", "many-agents")
+PROMPT_AGENT, CHAT_AGENT, BIG_AGENT = "Agent4oMP", "Agent4oM", "Agent4oMP"
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+def _rss_mb() -> Dict[str, float]:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != "darwin" else 1024 ** 2)
+    try:
+        with open("/proc/self/statm") as f:
+            now = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        now = None
+    return {"rss_mb": round(now, 1) if now else None, "peak_rss_mb": round(peak, 1)}
+
+
+async def _one(client: httpx.AsyncClient, url: str, agent: str, text: str, stream: bool) -> Dict:
+    t0, first = time.perf_counter(), None
+    body = {"to": agent, "text": text, "stream": stream}
+    try:
+        if not stream:
+            r = await client.post(url, json=body)
+            ok = r.status_code == 200 and "error" not in r.json()
+            return {"ok": ok, "status": r.status_code, "ttft": None, "total": time.perf_counter() - t0}
+        error = None
+        async with client.stream("POST", url, json=body) as r:
+            if r.status_code != 200:
+                await r.aread()
+                return {"ok": False, "status": r.status_code, "ttft": None, "total": time.perf_counter() - t0}
+            async for line in r.aiter_lines():
+                if line.startswith('data: {"data"'):
+                    first = first or time.perf_counter()
+                elif line.startswith("data:") and '"error"' in line:
+                    error = json.loads(line[5:]).get("error")
+        return {"ok": error is None, "status": 200 if error is None else "stream-error",
+                "ttft": first - t0 if first else None, "total": time.perf_counter() - t0}
+    except httpx.HTTPError as exc:
+        return {"ok": False, "status": type(exc).__name__, "ttft": None, "total": time.perf_counter() - t0}
+
+
+async def _drive(base: str, agents: List[str], n: int, concurrency: int, stream: bool, tag: str) -> Dict:
+    from app.looplag import LOOP_LAG
+
+    url    = f"{base}/api/chat/send"
+    rotate = itertools.cycle(agents)
+    jobs   = [(next(rotate), f"{tag} question {i}") for i in range(n)]     # distinct: no coalescing
+    sem    = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    LOOP_LAG.samples.clear()
+    LOOP_LAG.worst = 0.0
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        async def run(agent, text):
+            async with sem:
+                return await _one(client, url, agent, text, stream)
+
+        t0      = time.perf_counter()
+        results = await asyncio.gather(*(run(a, t) for a, t in jobs))
+        wall    = time.perf_counter() - t0
+
+    ok     = [r for r in results if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    ttft  = [r["ttft"] for r in ok if r["ttft"] is not None]
+    total = [r["total"] for r in ok]
+    return {
+        "mode":        "stream" if stream else "plain",
+        "agents":      len(set(agents)),
+        "requests":    n,
+        "concurrency": concurrency,
+        "ok":          len(ok),
+        "errors":      errors,
+        "wall_s":      round(wall, 3),
+        "rps":         round(len(ok) / wall, 1) if wall else None,
+        "ttft_ms":     {q: _pct(ttft, p) for q, p in (("p50", .5), ("p95", .95), ("p99", .99))},
+        "total_ms":    {q: _pct(total, p) for q, p in (("p50", .5), ("p95", .95), ("p99", .99))},
+        "loop_lag":    LOOP_LAG.stats(),
+        **_rss_mb(),
+    }
+
+
+def _seed_legacy(agent: str, kib: int) -> int:
+    """A legacy ``<agent>.json`` of about ``kib`` KiB, as older deployments left them."""
+    from app import memory
+
+    line = "we scouted their gold line, then pushed feudal archers into the wood line " * 3
+    history, size = [], 0
+    while size < kib * 1024:
+        msg = {"role": "user" if len(history) % 2 else "assistant", "content": f"{len(history)}: {line}"}
+        history.append(msg)
+        size += len(json.dumps(msg)) + 2
+    with open(memory.memory_path(agent), "w") as f:
+        json.dump(history, f)
+    return os.path.getsize(memory.memory_path(agent))
+
+
+async def _scenarios(base: str, args) -> Dict:
+    from app.registry import AGENTS
+
+    llama = sorted(name for name, rec in AGENTS.items() if rec.backend == "ollama")
+    out: Dict[str, Dict] = {}
+    for name in args.scenarios:
+        if name == "stream":
+            out[name] = await _drive(base, llama, args.requests, args.concurrency, True, name)
+        elif name == "plain":
+            out[name] = await _drive(base, llama, args.requests, args.concurrency, False, name)
+        elif name == "openai":
+            out[name] = await _drive(base, [PROMPT_AGENT, CHAT_AGENT], args.requests, args.concurrency, True, name)
+        elif name == "large-memory":
+            size = _seed_legacy(BIG_AGENT, args.memory_kb)
+            first = await _drive(base, [BIG_AGENT], 1, 1, True, "migrate")
+            out[name] = await _drive(base, [BIG_AGENT], args.requests, args.concurrency, True, name)
+            out[name]["memory_bytes"]       = size
+            out[name]["first_request_ms"]   = first["total_ms"]["p50"]
+        elif name == "many-agents":
+            agents = sorted(AGENTS)
+            n      = max(args.requests, len(agents) * 2)
+            out[name] = await _drive(base, agents, n, max(args.concurrency, len(agents)), True, name)
+        print(_row(name, out[name]), flush=True)
+    return out
+
+
+def _row(name: str, r: Dict) -> str:
+    ms = lambda d, q: "-" if d[q] is None else f"{d[q]:.0f}"
+    return (f"{name:<13} {r['ok']:>5}/{r['requests']:<5} {r['rps'] or 0:>7.1f} "
+            f"{ms(r['ttft_ms'], 'p50'):>6} {ms(r['ttft_ms'], 'p95'):>6} {ms(r['ttft_ms'], 'p99'):>6} "
+            f"{ms(r['total_ms'], 'p50'):>6} {ms(r['total_ms'], 'p95'):>6} {ms(r['total_ms'], 'p99'):>6} "
+            f"{r['loop_lag']['p99_ms'] or 0:>7.1f} {r['rss_mb'] or 0:>6.0f}  {r['errors'] or ''}")
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--tokens", type=int, default=32)
+    ap.add_argument("--token-ms", type=float, default=5)
+    ap.add_argument("--first-token-ms", type=float, default=20)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--memory-kb", type=int, default=256)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    from app.registry import OLLAMA_MODELS
+
+    delays = dict(tokens=args.tokens, first_token_delay=args.first_token_ms / 1000,
+                  token_delay=args.token_ms / 1000)
+    ollama = FakeOllama(models=OLLAMA_MODELS, fail_rate=args.fail_rate, **delays)
+    openai = FakeOpenAI(**delays)
+    port   = free_port()
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{port}/api/chat"
+
+    with serve(ollama, port=port), serve(openai) as openai_url:
+        os.environ["OPENAI_BASE_URL"] = f"{openai_url}/v1"
+        from app.main import app
+        with serve(app, lifespan="on") as base:
+            print(f"{'scenario':<13} {'ok':>11} {'req/s':>7} {'ttft50':>6} {'95':>6} {'99':>6} "
+                  f"{'tot50':>6} {'95':>6} {'99':>6} {'lag99':>7} {'RSS':>6}  errors")
+            results = asyncio.run(_scenarios(base, args))
+
+    report = {
+        "commit":    _commit(),
+        "python":    platform.python_version(),
+        "args":      {k: v for k, v in vars(args).items() if k != "out"},
+        "upstream":  {"ollama_requests": ollama.requests, "openai_requests": openai.requests},
+        "scenarios": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+bench/memory_multiproc.py — lost-update stress test for the memory store
+
+Spawns several worker processes that each fire concurrent chat turns at the
+same agent (half through ``load/append/save`` directly, half through the
+write-behind ``MemoryWriter``), then reports the wall time and how many
+messages were stored, missing or duplicated.  Correctness is covered by
+``tests/test_memory_multiproc.py``.
+
+    python -m bench.memory_multiproc [--procs 4] [--turns 150] [--tasks 8]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, multiprocessing as mp, os, tempfile, time
+from collections import Counter
+
+AGENT = "StressAgent"
+
+
+def _worker(proc: int, turns: int, tasks: int) -> None:
+    from app import memory
+    from app.persistence import MemoryWriter
+
+    writer = MemoryWriter(interval=0.01, batch=8)
+
+    def direct(msg: dict) -> None:
+        history = memory.load_memory(AGENT)
+        memory.trim_history(history)
+        history.append(msg)
+        memory.save_memory(AGENT, history)
+
+    async def turn(i: int) -> None:
+        remember = direct if i % 2 else (lambda m: writer.append(AGENT, m))
+        remember({"role": "user", "content": f"p{proc}-u{i}"})
+        await asyncio.sleep(0)
+        remember({"role": "assistant", "content": f"p{proc}-a{i}"})
+
+    async def main() -> None:
+        sem = asyncio.Semaphore(tasks)
+
+        async def bounded(i: int) -> None:
+            async with sem:
+                await turn(i)
+
+        await asyncio.gather(*(bounded(i) for i in range(turns)))
+        await writer.stop()
+
+    asyncio.run(main())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--turns", type=int, default=150)
+    ap.add_argument("--tasks", type=int, default=8)
+    args = ap.parse_args()
+
+    os.environ["MEMORY_DIR"] = tempfile.mkdtemp(prefix="bench-mp-")
+    ctx = mp.get_context("spawn")
+    t0  = time.perf_counter()
+    procs = [ctx.Process(target=_worker, args=(p, args.turns, args.tasks)) for p in range(args.procs)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        if p.exitcode:
+            print(f"worker exited with {p.exitcode}")
+    took = time.perf_counter() - t0
+
+    from app import memory
+    seen     = Counter(m["content"] for m in memory.load_memory(AGENT))
+    expected = {f"p{p}-{k}{i}" for p in range(args.procs) for i in range(args.turns) for k in "ua"}
+    missing  = expected - set(seen)
+    dupes    = [c for c, n in seen.items() if n > 1]
+    print(f"{args.procs} procs x {args.turns} turns in {took:.2f} s: "
+          f"{sum(seen.values())} stored, {len(missing)} missing, {len(dupes)} duplicated")
+
+
+if __name__ == "__main__":
+    main()
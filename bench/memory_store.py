@@ -0,0 +1,78 @@
+"""
+bench/memory_store.py — per-turn latency of the conversation store
+
+Replays chat turns (load → trim → append → save, twice per turn: user then
+assistant) against one agent and reports the mean per-turn cost at growing
+log sizes, next to the legacy whole-file JSON rewrite for the same window.
+
+    python -m bench.memory_store [--turns 20000] [--chars 400]
+"""
+
+from __future__ import annotations
+import argparse, json, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-memory-"))
+
+from app import memory                                          # noqa: E402
+
+
+def _legacy_turn(path: str, msg: dict) -> None:
+    for _ in range(2):
+        try:
+            with open(path) as f:
+                history = json.load(f)
+        except FileNotFoundError:
+            history = []
+        memory.trim_history(history)
+        history.append(msg)
+        with open(path, "w") as f:
+            json.dump(history, f)
+
+
+def _store_turn(agent: str, msg: dict) -> None:
+    for _ in range(2):
+        history = memory.load_memory(agent)
+        memory.trim_history(history)
+        history.append(dict(msg))
+        memory.save_memory(agent, history)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=20_000)
+    ap.add_argument("--chars", type=int, default=400)
+    ap.add_argument("--window", type=int, default=200, help="turns timed per checkpoint")
+    args = ap.parse_args()
+
+    msg    = {"role": "user", "content": "x" * args.chars}
+    legacy = os.path.join(memory.MEMORY_DIR, "legacy.json")
+    checkpoints = sorted({int(args.turns * f) for f in (0.01, 0.1, 0.25, 0.5, 1.0)})
+
+    print(f"{'appended':>10} {'store ms/turn':>14} {'cold tail(20) ms':>17} {'legacy ms/turn':>15}")
+    done = 0
+    for target in checkpoints:
+        while done < target - args.window:
+            _store_turn("bench", msg)
+            done += 1
+
+        t0 = time.perf_counter()
+        for _ in range(args.window):
+            _store_turn("bench", msg)
+        store_ms = (time.perf_counter() - t0) * 1000 / args.window
+        done += args.window
+
+        memory._logs.clear()                                    # force an index-only tail read
+        t0 = time.perf_counter()
+        memory.tail_memory("bench", 20)
+        tail_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        for _ in range(args.window):
+            _legacy_turn(legacy, msg)
+        legacy_ms = (time.perf_counter() - t0) * 1000 / args.window
+
+        print(f"{done * 2:>10} {store_ms:>14.3f} {tail_ms:>17.3f} {legacy_ms:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+bench/messages_page.py — /messages paging cost against a 1M-message history
+
+Writes ``--messages`` synthetic messages as one agent's live window, then
+compares the old endpoint's approach (``load_memory`` plus the last 20) with
+``WRITER.page`` at the newest page, a page halfway back and the oldest page.
+It also times the ETag check a 304 costs and a few real requests through the
+endpoint.  Walks ``--walk`` pages back with ``X-Next-Before`` to check that the
+cursor neither skips nor repeats.
+
+    python -m bench.messages_page [--messages 1000000] [--walk 50]
+"""
+
+from __future__ import annotations
+import argparse, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-messages-"))
+
+from bench.fakes import FakeOllama, free_port, serve             # noqa: E402
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"   # the lifespan preloads models
+
+from app import memory                                           # noqa: E402
+from app.persistence import WRITER                               # noqa: E402
+
+AGENT = "WoloDaemon"                                    # any registered agent; MEMORY_DIR is scratch
+
+
+def _ms(fn, n: int = 1) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=1_000_000)
+    ap.add_argument("--walk", type=int, default=50)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    history = [{"role": "system", "content": "you are a scout"}]
+    history += [{"role": "user" if i % 2 else "assistant", "content": f"message {i} about the feudal rush"}
+                for i in range(1, args.messages)]
+    memory.save_memory(AGENT, history)
+    del history
+    size = os.path.getsize(memory.log_path(AGENT))
+    print(f"{args.messages} messages, {size / 2 ** 20:.0f} MiB log, written in {time.perf_counter() - t0:.1f} s")
+
+    memory._logs.clear()                                         # a fresh worker: nothing parsed yet
+    old = _ms(lambda: memory.load_memory(AGENT)[-20:])
+    print(f"old: load_memory + last 20       {old:9.1f} ms")
+
+    memory._logs.clear()
+    newest = _ms(lambda: WRITER.page(AGENT, None, 20), 200)
+    middle = _ms(lambda: WRITER.page(AGENT, args.messages // 2, 20), 200)
+    oldest = _ms(lambda: WRITER.page(AGENT, 20, 20), 200)
+    etag   = _ms(lambda: WRITER.stamp(AGENT), 2000)
+    print(f"page newest / middle / oldest    {newest:9.3f} / {middle:.3f} / {oldest:.3f} ms")
+    print(f"etag check (304 path)            {etag:9.3f} ms")
+    assert WRITER.page(AGENT, 3, 20)[0][0][0] == 0, "pinned record missing from the oldest page"
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.registry import OLLAMA_MODELS
+
+    with serve(FakeOllama(models=OLLAMA_MODELS), port=PORT), TestClient(app) as client:
+        url  = f"/api/chat/messages/{AGENT}"
+        seen, before = [], None
+        t0 = time.perf_counter()
+        for _ in range(args.walk):
+            r = client.get(url, params={"limit": 100, "compact": 1, **({"before": before} if before else {})})
+            assert r.status_code == 200, r.text
+            seen[:0] = [row[0] for row in r.json()]
+            before = r.headers.get("X-Next-Before")
+        walk = (time.perf_counter() - t0) / args.walk * 1000
+        assert seen == list(range(args.messages - len(seen), args.messages)), "cursor skipped or repeated"
+
+        r    = client.get(url)
+        tag  = r.headers["ETag"]
+        t0   = time.perf_counter()
+        for _ in range(200):
+            assert client.get(url, headers={"If-None-Match": tag}).status_code == 304
+        not_modified = (time.perf_counter() - t0) / 200 * 1000
+    print(f"HTTP: 100-message page {walk:.2f} ms, 304 {not_modified:.2f} ms "
+          f"(walked {len(seen)} messages back)")
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
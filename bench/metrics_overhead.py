@@ -0,0 +1,85 @@
+"""
+bench/metrics_overhead.py — cost of recording and of payload logging per request
+
+Times one histogram observation (label lookup included), the ``upstream``
+stream wrapper per chunk, a scrape with ``--agents`` x 8 series, and the
+old ``json.dumps(payload, indent=2)`` print against ``log_payload`` for a
+history of ``--turns`` messages.  Output goes to a throwaway buffer.
+
+    python -m bench.metrics_overhead [--agents 50] [--turns 400]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, contextlib, io, json, time
+
+from app import metrics
+
+
+def _per_call(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+async def _chunks(n: int):
+    for i in range(n):
+        yield f"tok{i} "
+
+
+async def _drain(gen) -> None:
+    async for _ in gen:
+        pass
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--agents", type=int, default=50)
+    ap.add_argument("--turns", type=int, default=400)
+    ap.add_argument("--chunks", type=int, default=200_000)
+    args = ap.parse_args()
+
+    hist = metrics.TTFT
+    ns = _per_call(lambda: hist.labels("Bench", "llama3").observe(0.123), 200_000)
+    print(f"histogram observe (labels + bucket): {ns:.0f} ns")
+
+    t0 = time.perf_counter()
+    asyncio.run(_drain(_chunks(args.chunks)))
+    bare = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    asyncio.run(_drain(metrics.upstream(_chunks(args.chunks), "Bench", "llama3")))
+    wrapped = time.perf_counter() - t0
+    print(f"upstream wrapper: {(wrapped - bare) / args.chunks * 1e9:.0f} ns per chunk")
+
+    for a in range(args.agents):
+        for fam in (metrics.QUEUE_WAIT, metrics.TTFT, metrics.LATENCY, metrics.TOKENS_PER_S):
+            fam.labels(f"Agent{a}", "llama3").observe(0.5)
+        metrics.MEMORY_IO.labels(f"Agent{a}", "load").observe(0.002)
+        metrics.MEMORY_IO.labels(f"Agent{a}", "save").observe(0.004)
+        metrics.UPSTREAM_OPEN.labels(f"Agent{a}", "llama3").inc()
+        metrics.CLIENT_OPEN.labels(f"Agent{a}", "llama3").inc()
+    t0 = time.perf_counter()
+    text = metrics.render()
+    print(f"scrape: {len(text.splitlines())} lines, {len(text) / 1024:.0f} KiB in "
+          f"{(time.perf_counter() - t0) * 1e3:.1f} ms")
+
+    payload = {"stream": True, "model": "llama3:8b-instruct-q4_K_M", "options": {"num_ctx": 8192},
+               "messages": [{"role": "user" if i % 2 else "assistant",
+                             "content": "the scout found their gold, then pushed the castle " * 6}
+                            for i in range(args.turns)]}
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        old = _per_call(lambda: print("🛰️ [PAYLOAD SENT TO BACKEND]", json.dumps(payload, indent=2)), 50)
+        new = _per_call(lambda: metrics.log_payload("Bench", payload), 2000)
+        metrics.PAYLOAD_LOG_SAMPLE = 1.0
+        sampled = _per_call(lambda: metrics.log_payload("Bench", payload), 50)
+        metrics.PAYLOAD_LOG_SAMPLE = 0.0
+        off = _per_call(lambda: metrics.log_payload("Bench", payload), 2000)
+    print(f"payload log ({args.turns} turns): pretty print {old / 1e3:.0f} us, "
+          f"sampled 1% {new / 1e3:.1f} us avg, "
+          f"sampled line {sampled / 1e3:.0f} us, off {off / 1e3:.2f} us")
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bench/model_warmup.py — first-request latency on a preloaded vs a cold model
+
+Serves the gateway against a ``FakeOllama`` that charges ``--load-ms`` for
+every cold model load (one resident model at a time).  Once startup's preload
+has finished, it times the first streamed reply from an agent on the preloaded
+q4_K_M tag, then from one on q3_K_M, which is not preloaded.  Checks that
+requests carry the agent's ``options`` and the tag's ``keep_alive``, and that
+the preload used the same load options, so it is not followed by a reload.
+
+    python -m bench.model_warmup [--load-ms 1500]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-warmup-"))
+
+import httpx                                                     # noqa: E402
+
+from bench.fakes import FakeOllama, free_port, serve             # noqa: E402
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"
+
+from app.model_lifecycle import MODELS                           # noqa: E402
+from app.registry import AGENTS, OLLAMA_MODELS                   # noqa: E402
+
+AGENT, COLD_AGENT = "LlamaAgent42", "LlamaAgent38BIQ3KM"
+
+
+async def _first_reply(base: str, agent: str) -> float:
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as client:
+        async with client.stream("POST", f"{base}/api/chat/send",
+                                 json={"to": agent, "text": "first!", "stream": True}) as r:
+            async for line in r.aiter_lines():
+                if line.startswith('data: {"data"'):
+                    return (time.perf_counter() - t0) * 1000
+    raise AssertionError("no reply")
+
+
+async def _replies(base: str):
+    return await _first_reply(base, AGENT), await _first_reply(base, COLD_AGENT)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--load-ms", type=float, default=1500)
+    args = ap.parse_args()
+
+    rec  = AGENTS[AGENT]
+    fake = FakeOllama(models=OLLAMA_MODELS, load_delay=args.load_ms / 1000, max_loaded=1,
+                      tokens=16, token_delay=0.005)
+    with serve(fake, port=PORT):
+        from app.main import app
+        with serve(app, lifespan="on") as base:
+            deadline = time.monotonic() + args.load_ms / 1000 * 3
+            while not MODELS.warmed and time.monotonic() < deadline:
+                time.sleep(0.01)                                 # a deploy's first request comes later
+            loads = fake.loads
+            warm, cold = asyncio.run(_replies(base))
+
+    chat    = [b for b in fake.bodies if b.get("messages") and b["model"] == rec.model]
+    preload = [b for b in fake.bodies if not b.get("messages")]
+    assert preload, "nothing was preloaded"
+    assert chat[-1]["options"] == dict(rec.options), chat[-1]["options"]
+    assert chat[-1]["keep_alive"] == rec.keep_alive, chat[-1].get("keep_alive")
+    assert preload[-1]["options"]["num_ctx"] == rec.options["num_ctx"], preload[-1]["options"]
+    assert preload[-1]["model"] == rec.model
+
+    print(f"cold load {args.load_ms:.0f} ms; preloaded at startup: {MODELS.warmed}")
+    print(f"first reply, {AGENT} ({rec.model}, preloaded)      {warm:7.0f} ms")
+    print(f"first reply, {COLD_AGENT} ({AGENTS[COLD_AGENT].model}, not)  {cold:7.0f} ms")
+    print(f"model loads after startup: {fake.loads - loads} (the q3 swap only)")
+    print(f"options sent: {chat[-1]['options']}")
+    assert warm < cold / 2, "preload did not help"
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
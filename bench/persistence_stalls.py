@@ -0,0 +1,82 @@
+"""
+bench/persistence_stalls.py — event-loop stalls caused by memory writes
+
+Runs concurrent simulated chat turns (persist user turn, "stream" for a
+moment, persist reply) against one agent with a ~100 KB history while
+``LoopLagMonitor`` samples the loop.  Compares the old whole-file JSON
+rewrite on the loop, the append-only store called synchronously, and the
+write-behind ``MemoryWriter``.
+
+    python -m bench.persistence_stalls [--turns 400] [--concurrency 16]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, json, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-stall-"))
+
+from app import memory                                          # noqa: E402
+from app.looplag import LoopLagMonitor                          # noqa: E402
+from app.persistence import MemoryWriter                        # noqa: E402
+
+SEED = [{"role": "user" if i % 2 else "assistant", "content": "w" * 900} for i in range(110)]
+
+
+def _legacy_remember(path: str, msg: dict) -> None:
+    with open(path) as f:
+        history = json.load(f)
+    memory.trim_history(history)
+    history.append(msg)
+    with open(path, "w") as f:
+        json.dump(history, f)
+
+
+def _store_remember(agent: str, msg: dict) -> None:
+    history = memory.load_memory(agent)
+    memory.trim_history(history)
+    history.append(msg)
+    memory.save_memory(agent, history)
+
+
+async def _scenario(label: str, remember, turns: int, concurrency: int) -> None:
+    lag, sem = LoopLagMonitor(interval=0.005, window=100_000), asyncio.Semaphore(concurrency)
+    lag.start()
+
+    async def turn(i: int) -> None:
+        async with sem:
+            remember({"role": "user", "content": f"question {i} " + "q" * 400})
+            await asyncio.sleep(0.002)
+            remember({"role": "assistant", "content": f"answer {i} " + "a" * 1200})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(turn(i) for i in range(turns)))
+    wall = time.perf_counter() - t0
+    await lag.stop()
+    s = lag.stats()
+    print(f"{label:<18} wall {wall:6.2f} s   loop lag p50 {s['p50_ms']:6.2f} ms  "
+          f"p99 {s['p99_ms']:6.2f} ms  max {s['max_ms']:6.2f} ms")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+
+    legacy = os.path.join(memory.MEMORY_DIR, "legacy.json")
+    with open(legacy, "w") as f:
+        json.dump(SEED, f)
+    memory.save_memory("sync", list(SEED))
+    memory.save_memory("behind", list(SEED))
+    writer = MemoryWriter()
+
+    await _scenario("legacy json", lambda m: _legacy_remember(legacy, m), args.turns, args.concurrency)
+    await _scenario("store, on loop", lambda m: _store_remember("sync", m), args.turns, args.concurrency)
+    await _scenario("write-behind", lambda m: writer.append("behind", m), args.turns, args.concurrency)
+    await writer.stop()
+    assert memory.load_memory("behind")[-1]["content"].startswith("answer"), "write-behind lost the tail"
+    print("write-behind:", writer.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+bench/prefix_cache.py — prompt-cache reuse with exact-fit vs block eviction
+
+Serves the gateway against a ``FakeOllama`` that keeps each model's last
+prompt as a KV cache and charges ``--prompt-us`` per prompt token it has to
+evaluate (the ones after the common prefix).  Holds one long conversation,
+``--turns`` sequential messages of ``--chars`` characters, first with
+WoloDaemon set to ``prefix_block: 0`` (the old exact fit: the window start
+moves every turn once the history is full), then with LlamaAgent42 on the
+default ``PREFIX_BLOCK``.  Both run on the same tag, one after the other.
+Reports prompt tokens sent and evaluated, the cache hit share and the
+prompt-eval time, over the turns after the history first overflowed, and
+checks that the gateway's ``chat_prompt_cached_tokens`` counter moved.
+
+    python -m bench.prefix_cache [--turns 150] [--chars 600] [--prompt-us 20]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, os, random, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-prefix-"))
+os.environ.setdefault("PAYLOAD_LOG_SAMPLE", "0")
+
+import httpx                                                     # noqa: E402
+
+from bench.fakes import FakeOllama, free_port, serve             # noqa: E402
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"
+
+from app.agent_models import agent_settings                      # noqa: E402
+
+EXACT, BLOCK = "WoloDaemon", "LlamaAgent42"
+agent_settings[EXACT] = {**agent_settings.get(EXACT, {}), "prefix_block": 0}
+
+from app import metrics                                          # noqa: E402
+from app.registry import AGENTS, OLLAMA_MODELS                   # noqa: E402
+
+_WORDS = ("scout the gold line then wall the wood line and boom villagers into a fast castle "
+          "with crossbows while the opponent rushes feudal archers").split()
+
+
+def _text(rng: random.Random, turn: int, chars: int) -> str:
+    words = [f"turn {turn}:"]
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(_WORDS))
+    return " ".join(words)
+
+
+async def _conversation(base: str, fake: FakeOllama, agent: str, turns: int, chars: int) -> dict:
+    rng  = random.Random(agent)
+    rows = []
+    fake.kv.clear()
+    async with httpx.AsyncClient(timeout=120) as client:
+        for turn in range(turns):
+            sent, evaluated = fake.prompt_tokens, fake.evaluated
+            t0 = time.perf_counter()
+            r  = await client.post(f"{base}/api/chat/send",
+                                   json={"to": agent, "text": _text(rng, turn, chars), "stream": False})
+            assert r.status_code == 200 and "error" not in r.json(), r.text
+            rows.append((fake.prompt_tokens - sent, fake.evaluated - evaluated,
+                         len(fake.bodies[-1]["messages"]), time.perf_counter() - t0))
+    # Steady state: from the first turn whose prompt lost its oldest turn.
+    full = next((i for i in range(1, len(rows)) if rows[i][2] <= rows[i - 1][2]), len(rows))
+    tail = rows[full:]
+    sent      = sum(r[0] for r in tail)
+    evaluated = sum(r[1] for r in tail)
+    return {"turns": len(tail), "overflow_at": full, "sent": sent, "evaluated": evaluated,
+            "hit": 1 - evaluated / sent if sent else 0.0,
+            "eval_s": evaluated * fake.prompt_token_delay,
+            "p50_ms": sorted(r[3] for r in tail)[len(tail) // 2] * 1000 if tail else 0.0}
+
+
+async def _run(base: str, fake: FakeOllama, args) -> dict:
+    return {agent: await _conversation(base, fake, agent, args.turns, args.chars) for agent in (EXACT, BLOCK)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=150)
+    ap.add_argument("--chars", type=int, default=600)
+    ap.add_argument("--prompt-us", type=float, default=20)
+    args = ap.parse_args()
+
+    fake = FakeOllama(models=OLLAMA_MODELS, tokens=8, prompt_cache=True,
+                      prompt_token_delay=args.prompt_us / 1e6)
+    with serve(fake, port=PORT):
+        from app.main import app
+        with serve(app) as base:
+            results = asyncio.run(_run(base, fake, args))
+
+    for agent, rec in ((EXACT, AGENTS[EXACT]), (BLOCK, AGENTS[BLOCK])):
+        r = results[agent]
+        print(f"{agent:<13} block {rec.budget.block:>5} tok  prompt {rec.budget.prompt} tok  "
+              f"history full at turn {r['overflow_at']}")
+        print(f"{'':<13} {r['turns']} turns after: sent {r['sent']} tok, evaluated {r['evaluated']} tok, "
+              f"cache hit {r['hit']:.0%}, prompt eval {r['eval_s']:.2f} s, turn p50 {r['p50_ms']:.0f} ms")
+        cached = metrics.CACHED_TOKENS.labels(agent, rec.model).value
+        assert cached > 0, f"no cached tokens recorded for {agent}"
+
+    exact, block = results[EXACT], results[BLOCK]
+    assert exact["turns"] and block["turns"], "the history never overflowed; raise --turns"
+    print(f"prompt eval time, block vs exact fit: {block['eval_s'] / exact['eval_s']:.2f}x")
+    assert block["hit"] > exact["hit"], "block eviction did not improve prefix reuse"
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+bench/prompt_budget.py — prompt-assembly time against history length
+
+For each history length, times fitting the history to a model's token budget
+with cold counts (every message tokenized once), and again with warm counts
+(the steady state, since counts are stored with the messages), next to the
+character trim that ``trim_history`` does.
+
+    python -m bench.prompt_budget [--sizes 100,1000,10000,100000] [--model llama3:8b-instruct-q4_K_M]
+"""
+
+from __future__ import annotations
+import argparse, os, random, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-budget-"))
+
+from app import tokens                                  # noqa: E402
+from app.memory import trim_history                     # noqa: E402
+
+_WORDS = ("the model replied with a fairly ordinary sentence about villagers, "
+          "scouts, 1v1 openings, build orders and internationalization").split()
+
+
+def _messages(n: int, words: int):
+    rng = random.Random(n)
+    return [{"role": "user" if i % 2 else "assistant",
+             "content": " ".join(rng.choice(_WORDS) for _ in range(words))} for i in range(n)]
+
+
+def _time(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / reps
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,10000,100000")
+    ap.add_argument("--words", type=int, default=40)
+    ap.add_argument("--model", default="llama3:8b-instruct-q4_K_M")
+    args = ap.parse_args()
+
+    budget = tokens.budget_for(args.model)
+    print(f"{args.model}: family {budget.family}, prompt budget {budget.prompt} tokens "
+          f"(tiktoken: {'yes' if tokens._encoder(budget.family) else 'no, estimator'})")
+    print(f"{'msgs':>8} {'cold µs':>12} {'warm µs':>10} {'chars µs':>10} {'kept':>6} {'tokens':>7}")
+    for n in map(int, args.sizes.split(",")):
+        msgs = _messages(n, args.words)
+        reps = max(1, 20_000 // n)
+
+        copies = [[dict(m) for m in msgs] for _ in range(3)]
+        cold = _time(lambda: tokens.fit(copies.pop(), budget), 3)
+        kept = tokens.fit(msgs, budget)                           # warms the counts
+        warm = _time(lambda: tokens.fit(msgs, budget), reps * 10)
+        chars = _time(lambda: trim_history(list(msgs)), reps)
+        used = tokens.prompt_tokens(kept, budget.family)
+        assert used <= budget.prompt or len(kept) <= 2
+
+        print(f"{n:>8} {cold:>12.0f} {warm:>10.1f} {chars:>10.0f} {len(kept):>6} {used:>7}")
+
+
+if __name__ == "__main__":
+    main()
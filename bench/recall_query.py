@@ -0,0 +1,91 @@
+"""
+bench/recall_query.py — recall index build and query latency at 100k messages
+
+Archives ``--messages`` synthetic turns for one agent in batches (the writer's
+incremental path), then reports: build time, cold load of the archive into a
+fresh index (what a new worker pays: the BM25 snapshot plus the tail written
+after it, next to a full replay without the snapshot), query latency p50/p99,
+and the cost of one incremental append followed by a query.  ``--no-numpy`` forces the
+pure-Python BM25 path.
+
+    python -m bench.recall_query [--messages 100000] [--queries 200] [--no-numpy]
+"""
+
+from __future__ import annotations
+import argparse, os, random, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-recall-"))
+
+from app import recall                                              # noqa: E402
+
+_VOCAB = ("scout villager castle feudal imperial archer knight monk trebuchet market "
+          "wood gold stone food farm mill lumber dock galley hussar pike skirmisher "
+          "replay parser ingest postgres uvicorn ollama memory digest budget token "
+          "deploy nginx pm2 cache stream latency queue worker index retrieval").split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_VOCAB) for _ in range(words))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=100_000)
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--no-numpy", action="store_true")
+    args = ap.parse_args()
+    if args.no_numpy:
+        recall.np = None
+
+    rng   = random.Random(7)
+    agent = "RecallBench"
+    needle = "the tournament final is on saturday at the riverside lan cafe"
+
+    t0 = time.perf_counter()
+    store = recall.Recall()
+    store.enable([agent])
+    for start in range(0, args.messages, args.batch):
+        batch = [{"role": "user" if i % 2 else "assistant", "content": _sentence(rng, 25)}
+                 for i in range(start, min(start + args.batch, args.messages))]
+        if start == args.messages // 2:
+            batch[0]["content"] = needle
+        store.index(agent, batch)
+    build = time.perf_counter() - t0
+
+    snap = recall.snapshot_path(agent)
+    os.rename(snap, snap + ".aside")
+    t0 = time.perf_counter()
+    recall.Recall().search(agent, "warm up", 1)
+    replay = time.perf_counter() - t0
+    os.replace(snap + ".aside", snap)
+
+    t0 = time.perf_counter()
+    fresh = recall.Recall()
+    fresh.search(agent, "warm up", 1)
+    load = time.perf_counter() - t0
+    tail = fresh.indexes[agent].count - fresh.indexes[agent].saved
+
+    def timed(fn):
+        t = time.perf_counter()
+        fn()
+        return (time.perf_counter() - t) * 1e3
+
+    lat = sorted(timed(lambda: fresh.search(agent, _sentence(rng, 8), recall.RECALL_K))
+                 for _ in range(args.queries))
+    hit = fresh.search(agent, "when is the tournament final", 1)
+    assert hit and hit[0]["content"] == needle, hit
+
+    inc = timed(lambda: (store.index(agent, [{"role": "user", "content": _sentence(rng, 25)}]),
+                         fresh.search(agent, _sentence(rng, 8), recall.RECALL_K)))
+
+    mode = "bm25" if recall.np is None else "bm25 + vectors"
+    print(f"{args.messages} messages ({mode}): build {build:.1f} s, cold load {load:.2f} s "
+          f"(snapshot + {tail}-doc tail; full replay {replay:.2f} s)")
+    print(f"query p50 {lat[len(lat) // 2]:.2f} ms  p99 {lat[int(len(lat) * .99)]:.2f} ms  "
+          f"append + query {inc:.2f} ms")
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
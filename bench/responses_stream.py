@@ -0,0 +1,94 @@
+"""
+bench/responses_stream.py — time to first token for prompt agents, end to end
+
+Serves the gateway (``app.main``), a ``FakeOpenAI`` and a ``FakeOllama`` (for
+the local agents' preload) on local ports, seeds the prompt agent's memory with
+a few turns, then streams ``--streams`` concurrent ``/send`` requests and
+reports time to the first text frame versus the whole reply, then how long the
+upstream stream takes to stop after a client leaves mid-stream.  Behaviour
+(input shape, saved reply, error frames, cancellation) is covered by
+``tests/test_responses_stream.py``.
+
+    python -m bench.responses_stream [--streams 20] [--tokens 60] [--token-ms 20]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, json, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-responses-"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import httpx                                                     # noqa: E402
+
+from bench.fakes import FakeOllama, FakeOpenAI, free_port, serve  # noqa: E402
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"
+
+AGENT = "Agent4oMP"
+
+
+async def _stream(client: httpx.AsyncClient, url: str, text: str) -> dict:
+    t0, first, out, error = time.perf_counter(), None, [], None
+    async with client.stream("POST", url, json={"to": AGENT, "text": text, "stream": True}) as r:
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            frame = json.loads(line[5:])
+            if "data" in frame:
+                first = first or time.perf_counter() - t0
+                out.append(frame["data"])
+            error = error or frame.get("error")
+    return {"ttft": first, "total": time.perf_counter() - t0, "text": "".join(out), "error": error}
+
+
+async def _disconnect(client: httpx.AsyncClient, url: str, fake: FakeOpenAI) -> float:
+    before = fake.cancelled
+    async with client.stream("POST", url, json={"to": AGENT, "text": "leave early", "stream": True}) as r:
+        async for line in r.aiter_lines():
+            if '"data"' in line:
+                break
+    t0 = time.perf_counter()
+    while fake.cancelled == before and time.perf_counter() - t0 < 5:
+        await asyncio.sleep(0.005)
+    return (time.perf_counter() - t0) * 1000
+
+
+async def _run(base: str, fake: FakeOpenAI, args) -> None:
+    from app import memory
+
+    url = f"{base}/api/chat/send"
+    memory.save_memory(AGENT, [{"role": "user", "content": "my clan is called Riverside Scouts"},
+                               {"role": "assistant", "content": "noted, Riverside Scouts it is"}])
+    async with httpx.AsyncClient(timeout=60) as client:
+        await _stream(client, url, "warm up")                    # SDK import, first connection
+        runs = await asyncio.gather(*(_stream(client, url, f"question {i}") for i in range(args.streams)))
+        errors = sum(1 for r in runs if r["error"])
+
+        ttft  = sorted(r["ttft"] for r in runs if r["ttft"] is not None) or [0.0]
+        total = sorted(r["total"] for r in runs)
+        print(f"{args.streams} streams x {args.tokens} deltas every {args.token_ms} ms, {errors} errors")
+        print(f"first token p50 {ttft[len(ttft) // 2] * 1000:.0f} ms   "
+              f"whole reply p50 {total[len(total) // 2] * 1000:.0f} ms")
+        print(f"disconnect -> upstream stopped in {await _disconnect(client, url, fake):.0f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--streams", type=int, default=20)
+    ap.add_argument("--tokens", type=int, default=60)
+    ap.add_argument("--token-ms", type=float, default=20)
+    args = ap.parse_args()
+
+    from app.registry import OLLAMA_MODELS
+
+    fake = FakeOpenAI(tokens=args.tokens, first_token_delay=0.05, token_delay=args.token_ms / 1000)
+    with serve(FakeOllama(models=OLLAMA_MODELS), port=PORT), serve(fake) as upstream:
+        os.environ["OPENAI_BASE_URL"] = f"{upstream}/v1"
+        from app.main import app
+        with serve(app, port=free_port(), lifespan="on") as base:
+            asyncio.run(_run(base, fake, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+bench/scheduler_load.py — Ollama scheduler under mixed-model load
+
+Fires requests from several llama agents (three quantisations) at a
+``FakeOllama`` that charges a cold-load penalty whenever it has to swap the
+resident model, once straight through ``_ollama_stream`` and once through the
+scheduler.  Reports p50/p99 end-to-end latency and how many model loads each
+run caused.
+
+    python -m bench.scheduler_load [--requests 120] [--clients 12] [--load-delay 0.25]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, os, random, time
+
+from bench.fakes import FakeOllama, free_port, serve
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"
+
+from app import clients                                          # noqa: E402
+from app.llama3_router import _ollama_scheduled, _ollama_stream  # noqa: E402
+from app.registry import AGENTS                                  # noqa: E402
+from app.scheduler import SCHEDULER                              # noqa: E402
+
+AGENT_MIX = ["LlamaAgent42", "WoloDaemon", "LlamaAgent38BIQ4KM",
+             "LlamaAgent38BIQ2KM", "LlamaAgent38BIQ3KM", "LlamaBear"]
+
+
+async def _drive(label: str, stream, n: int, concurrency: int, fake: FakeOllama) -> None:
+    rng, sem, samples = random.Random(7), asyncio.Semaphore(concurrency), []
+    loads_before = fake.loads
+
+    async def one(agent: str) -> None:
+        payload = {"model": AGENTS[agent].model, "messages": [{"role": "user", "content": "hi"}],
+                   "stream": True}
+        async with sem:
+            t0 = time.perf_counter()
+            async for _ in stream(payload, agent):
+                pass
+            samples.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(rng.choice(AGENT_MIX)) for _ in range(n)))
+    wall = time.perf_counter() - t0
+
+    samples.sort()
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    print(f"{label:<16} p50 {p(0.50):8.1f} ms  p99 {p(0.99):8.1f} ms  "
+          f"throughput {n / wall:6.1f} req/s  model loads {fake.loads - loads_before}")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=120)
+    ap.add_argument("--clients", type=int, default=12)
+    ap.add_argument("--tokens", type=int, default=20)
+    ap.add_argument("--token-delay", type=float, default=0.002)
+    ap.add_argument("--load-delay", type=float, default=0.25)
+    args = ap.parse_args()
+
+    fake = FakeOllama(tokens=args.tokens, token_delay=args.token_delay,
+                      load_delay=args.load_delay, max_loaded=1, contention=True)
+    with serve(fake, port=PORT):
+        await _drive("no scheduler", lambda p, a: _ollama_stream(p), args.requests, args.clients, fake)
+        await _drive("with scheduler", _ollama_scheduled, args.requests, args.clients, fake)
+        print("scheduler state:", SCHEDULER.snapshot())
+        await clients.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+bench/send_many.py — /send_many fan-out versus one /send per agent
+
+Serves the gateway against a ``FakeOllama`` and a ``FakeOpenAI`` and asks the
+three quantised llama agents plus a chat-completions agent one question,
+first with a ``/send`` each in turn, then with one ``/send_many``, and reports
+both wall times, the frame count and how often the multiplexed stream
+switched agents.  Behaviour is covered by ``tests/test_send_many.py``.
+
+    python -m bench.send_many [--tokens 32] [--token-ms 10]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, json, os, tempfile, time
+from typing import Dict, List
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-send-many-"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("PAYLOAD_LOG_SAMPLE", "0")
+
+import httpx                                                     # noqa: E402
+
+from bench.fakes import FakeOllama, FakeOpenAI, free_port, serve  # noqa: E402
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"
+
+AGENTS = ["LlamaAgent38BIQ2KM", "LlamaAgent38BIQ3KM", "LlamaAgent38BIQ4KM", "Agent4oM"]
+
+
+async def _frames(client: httpx.AsyncClient, url: str, body: Dict) -> List[Dict]:
+    out = []
+    async with client.stream("POST", url, json=body) as r:
+        assert r.status_code == 200, r.status_code
+        async for line in r.aiter_lines():
+            if line.startswith("data:"):
+                out.append(json.loads(line[5:]))
+    return out
+
+
+async def _run(base: str) -> None:
+    one, many = f"{base}/api/chat/send", f"{base}/api/chat/send_many"
+    async with httpx.AsyncClient(timeout=60) as client:
+        t0 = time.perf_counter()
+        for agent in AGENTS:
+            await client.post(one, json={"to": agent, "text": "which civ for arabia?"})
+        sequential = time.perf_counter() - t0
+
+        t0     = time.perf_counter()
+        frames = await _frames(client, many, {"to": AGENTS, "text": "which civ for water maps?", "stream": True})
+        fanned = time.perf_counter() - t0
+
+        order    = [f["agent"] for f in frames if "data" in f]
+        switches = sum(a != b for a, b in zip(order, order[1:]))
+        print(f"{len(AGENTS)} agents: /send one by one {sequential * 1000:.0f} ms, "
+              f"/send_many {fanned * 1000:.0f} ms ({len(frames)} frames, {switches} agent switches)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tokens", type=int, default=32)
+    ap.add_argument("--token-ms", type=float, default=10)
+    args = ap.parse_args()
+
+    from app.registry import OLLAMA_MODELS
+
+    delays = dict(tokens=args.tokens, first_token_delay=0.02, token_delay=args.token_ms / 1000)
+    ollama = FakeOllama(models=OLLAMA_MODELS, **delays)
+    openai = FakeOpenAI(**delays)
+    with serve(ollama, port=PORT), serve(openai) as openai_url:
+        os.environ["OPENAI_BASE_URL"] = f"{openai_url}/v1"
+        from app.main import app
+        with serve(app) as base:
+            asyncio.run(_run(base))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+bench/singleflight_load.py — duplicate requests against one stub backend
+
+Sends bursts of identical ``/api/chat/send`` turns (a retry storm: several
+tabs, same agent, same text) through the ASGI app at a ``FakeOllama`` and
+reports each burst's upstream calls, stored copies of the turn and wall
+time.  The behaviour itself is covered by ``tests/test_singleflight.py``.
+
+    python -m bench.singleflight_load [--clients 16] [--bursts 5]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, json, os, tempfile, time
+
+from bench.fakes import FakeOllama, free_port, serve
+
+PORT = free_port()
+os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{PORT}/api/chat"
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-sf-"))
+
+import httpx                                                     # noqa: E402
+
+from app import clients                                          # noqa: E402
+from app.main import app                                         # noqa: E402
+from app.persistence import WRITER                               # noqa: E402
+
+
+async def _client(http: httpx.AsyncClient, agent: str, text: str, stream: bool) -> str:
+    body = {"to": agent, "text": text, "stream": stream}
+    if not stream:
+        return (await http.post("/api/chat/send", json=body)).json()["text"]
+    parts = []
+    async with http.stream("POST", "/api/chat/send", json=body) as resp:
+        async for line in resp.aiter_lines():
+            if line.startswith("data:"):
+                frame = json.loads(line[5:])
+                parts.append(frame.get("data", ""))
+    return "".join(parts)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--bursts", type=int, default=5)
+    ap.add_argument("--agent", default="LlamaAgent42")
+    args = ap.parse_args()
+
+    fake = FakeOllama(tokens=40, token_delay=0.005)
+    with serve(fake, port=PORT):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway", timeout=30) as http:
+            for burst in range(args.bursts):
+                before = fake.requests
+                t0     = time.perf_counter()
+                text   = f"status report #{burst}"
+                replies = await asyncio.gather(*(
+                    _client(http, args.agent, text, stream=bool(i % 2)) for i in range(args.clients)
+                ))
+                took = (time.perf_counter() - t0) * 1000
+
+                upstream = fake.requests - before
+                stored   = sum(m["content"] == text for m in WRITER.view(args.agent))
+                distinct = len({r.strip() for r in replies})
+                print(f"burst {burst}: {args.clients} clients, upstream calls {upstream}, "
+                      f"distinct replies {distinct}, turn stored {stored}x, {took:6.1f} ms")
+        await clients.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+bench/sse_frames.py — SSE frames/sec and CPU per stream, per coalescing window
+
+Runs ``--streams`` concurrent flights fed by a stub token source, each read by
+the ``/send`` frame generator, and compares the original per-token
+``json.dumps`` framing against ``app.sse.frames`` at a few windows.  Checks
+that the coalesced text reassembles byte-for-byte (whitespace included) and
+that closing the reader cancels the upstream immediately.
+
+    python -m bench.sse_frames [--streams 200] [--tokens 300] [--token-ms 5]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, json, os, tempfile, time
+from contextlib import aclosing
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-sse-"))
+
+from app import sse                                              # noqa: E402
+from app.singleflight import SingleFlight                        # noqa: E402
+
+_WORDS = [" the", " scout", " found", " their", " gold", ",", " then", "\n", " ", " pushed", " castle", "."]
+
+
+def _tokens(n: int):
+    return [_WORDS[i % len(_WORDS)] for i in range(n)]
+
+
+async def _source(tokens, delay: float, closed: list):
+    try:
+        for tok in tokens:
+            await asyncio.sleep(delay)
+            yield tok
+    finally:
+        closed.append(time.perf_counter())
+
+
+async def _legacy(flight):
+    """The framing ``/send`` used before: one json.dumps frame per non-blank token."""
+    async for chunk in flight.subscribe():
+        if chunk.strip():
+            yield f"data: {json.dumps({'data': chunk, 'done': False})}\n\n".encode()
+    yield b'data: {"done": true}\n\n'
+
+
+def _text(frames) -> str:
+    return "".join(json.loads(f[5:]).get("data", "") for f in frames)
+
+
+async def _run(mode, args) -> dict:
+    flights = SingleFlight()
+    tokens  = _tokens(args.tokens)
+    closed: list = []
+
+    async def reader(i: int):
+        flight = flights.start(None, _source(tokens, args.token_ms / 1000, closed))
+        gen    = _legacy(flight) if mode is None else sse.frames(flight, *mode)
+        async with aclosing(gen) as frames:
+            return [f async for f in frames]
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*(reader(i) for i in range(args.streams)))
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+
+    expect = "".join(tokens)
+    intact = sum(_text(r) == expect for r in results)
+    frames = sum(len(r) for r in results)
+    return {"frames": frames, "fps": frames / wall, "bytes": sum(len(f) for r in results for f in r),
+            "cpu_ms": cpu * 1000 / args.streams, "intact": intact}
+
+
+async def _disconnect(args) -> float:
+    """Close a reader mid-stream; how long until the upstream source is closed."""
+    flights = SingleFlight()
+    closed: list = []
+    flight = flights.start(None, _source(_tokens(10_000), 0.01, closed))
+
+    async def reader():
+        async for _ in sse.frames(flight, 0.02, 256):
+            pass
+
+    task = asyncio.create_task(reader())
+    await asyncio.sleep(0.1)
+    t0 = time.perf_counter()
+    task.cancel()                                                # what Starlette does on disconnect
+    while not closed and time.perf_counter() - t0 < 1:
+        await asyncio.sleep(0.001)
+    assert closed, "upstream kept running after the client left"
+    return (closed[0] - t0) * 1000
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--streams", type=int, default=200)
+    ap.add_argument("--tokens", type=int, default=300)
+    ap.add_argument("--token-ms", type=float, default=5)
+    args = ap.parse_args()
+
+    modes = [("legacy per-token", None), ("window 0", (0.0, 0)),
+             ("20 ms / 256 B", (0.02, 256)), ("50 ms / 1 KiB", (0.05, 1024))]
+    print(f"{args.streams} streams x {args.tokens} tokens every {args.token_ms} ms")
+    print(f"{'mode':<18} {'frames':>8} {'frames/s':>10} {'KiB':>8} {'CPU ms/stream':>14} {'intact':>7}")
+    for name, mode in modes:
+        r = await _run(mode, args)
+        print(f"{name:<18} {r['frames']:>8} {r['fps']:>10.0f} {r['bytes'] / 1024:>8.0f} "
+              f"{r['cpu_ms']:>14.2f} {r['intact']:>7}")
+        if mode is not None:
+            assert r["intact"] == args.streams, "coalesced text differs from the upstream text"
+
+    print(f"disconnect -> upstream closed in {await _disconnect(args):.1f} ms")
+    print("ok")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
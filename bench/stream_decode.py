@@ -0,0 +1,122 @@
+"""
+bench/stream_decode.py — Ollama stream parsing cost per token
+
+Replays a recorded ``/api/chat`` stream (``--record``, one NDJSON object per
+line as Ollama sends it) or a synthetic one, cut into network-sized reads,
+through the old line parser (``data:``-prefixed text lines + ``json.loads``,
+fed the SSE-framed copy since it skips bare NDJSON) and through
+``OllamaDecoder`` with each JSON backend available.
+
+    python -m bench.stream_decode [--record stream.ndjson] [--tokens 2000] [--reps 50]
+"""
+
+from __future__ import annotations
+import argparse, json, random, time
+from functools import partial
+
+from app import stream_decode
+from app.stream_decode import OllamaDecoder
+
+_PIECES = [" the", " villager", "s", " —", " build", "\n\n", " a", " \"mill\"", " café", " \U0001f40e", ",", " 42"]
+
+
+def _synthetic(tokens: int) -> bytes:
+    lines = [json.dumps({"model": "llama3:8b-instruct-q4_K_M", "created_at": "2026-10-16T12:00:00.000000Z",
+                         "message": {"role": "assistant", "content": _PIECES[i % len(_PIECES)]},
+                         "done": False}) for i in range(tokens)]
+    lines.append(json.dumps({"model": "llama3:8b-instruct-q4_K_M", "created_at": "2026-10-16T12:00:09Z",
+                             "message": {"role": "assistant", "content": ""}, "done": True,
+                             "done_reason": "stop", "total_duration": 9_000_000_000, "load_duration": 5_000_000,
+                             "prompt_eval_count": 412, "prompt_eval_duration": 300_000_000,
+                             "eval_count": tokens, "eval_duration": 8_600_000_000}))
+    return "\n".join(lines).encode() + b"\n"
+
+
+def _reads(raw: bytes, rng: random.Random):
+    out, pos = [], 0
+    while pos < len(raw):
+        n = rng.choice((64, 180, 512, 1400, 4096))
+        out.append(raw[pos:pos + n])
+        pos += n
+    return out
+
+
+def _legacy(reads) -> str:
+    """What ``_ollama_stream`` did: str lines (aiter_lines), ``data:`` prefix, json.loads."""
+    text, buf = [], ""
+    for data in reads:
+        buf += data.decode()
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            if not line or not line.startswith("data:"):
+                continue
+            obj = json.loads(line[5:].lstrip())
+            chunk = obj.get("message", {}).get("content") or ""
+            if chunk:
+                text.append(chunk)
+    return "".join(text)
+
+
+def _decode(reads) -> str:
+    dec, text = OllamaDecoder(), []
+    for data in reads:
+        text.extend(dec.feed(data))
+    text.extend(dec.close())
+    assert dec.stats is not None
+    return "".join(text)
+
+
+def _time(fn, reads, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn(reads)
+    return (time.perf_counter() - t0) / reps
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--record", help="recorded Ollama /api/chat NDJSON stream")
+    ap.add_argument("--tokens", type=int, default=2000)
+    ap.add_argument("--reps", type=int, default=50)
+    args = ap.parse_args()
+
+    raw = open(args.record, "rb").read() if args.record else _synthetic(args.tokens)
+    rng = random.Random(1)
+    ndjson = _reads(raw, rng)
+    sse    = _reads(b"".join(b"data: " + line + b"\n\n" for line in raw.splitlines() if line), rng)
+    tokens = sum(1 for line in raw.splitlines() if b'"done":false' in line.replace(b" ", b""))
+
+    expect = _decode(ndjson)
+    assert _decode(sse) == expect and _legacy(sse) == expect
+
+    decode   = json.JSONDecoder().decode
+    backends = {"json": lambda line: decode(line.decode())}
+    try:
+        import jiter
+        backends["jiter"] = partial(jiter.from_json, cache_mode="all")
+    except ImportError:
+        pass
+    try:
+        import orjson
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        pass
+
+    base = _time(_legacy, sse, args.reps)
+    print(f"{tokens} tokens, {len(ndjson)} reads")
+    print(f"{'parser':<28} {'µs/token':>9} {'speedup':>8}")
+    print(f"{'legacy lines + json.loads':<28} {base * 1e6 / tokens:>9.2f} {1.0:>8.2f}")
+    default = stream_decode._loads
+    try:
+        for name, loads in backends.items():
+            stream_decode._loads = loads
+            for framing, reads in (("ndjson", ndjson), ("sse", sse)):
+                took = _time(_decode, reads, args.reps)
+                print(f"{'decoder ' + name + ' / ' + framing:<28} {took * 1e6 / tokens:>9.2f} {base / took:>8.2f}")
+    finally:
+        stream_decode._loads = default
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
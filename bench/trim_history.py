@@ -0,0 +1,59 @@
+"""
+bench/trim_history.py — cost of trimming a history back under budget
+
+Times the original re-sum-per-pop trim against ``trim_history`` on a plain
+list, on a fresh ``load_memory`` view, and ``History.trim`` after one append
+(the steady-state per-turn case).
+
+    python -m bench.trim_history [--sizes 1000,10000,50000]
+"""
+
+from __future__ import annotations
+import argparse, os, tempfile, time
+
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="bench-trim-"))
+
+from app.memory import History, MAX_HISTORY_CHARS, trim_history     # noqa: E402
+
+
+def _legacy_trim(history):
+    while sum(len(m["content"]) for m in history) > MAX_HISTORY_CHARS and len(history) > 2:
+        history.pop(1)
+
+
+def _messages(n: int, chars: int):
+    return [{"role": "user" if i % 2 else "assistant", "content": "y" * chars} for i in range(n)]
+
+
+def _time(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / reps
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,5000,20000")
+    ap.add_argument("--chars", type=int, default=40)
+    args = ap.parse_args()
+
+    print(f"{'msgs':>8} {'legacy µs':>12} {'list µs':>10} {'History µs':>11} {'steady µs':>10}")
+    for n in map(int, args.sizes.split(",")):
+        msgs = _messages(n, args.chars)
+        reps = max(1, 2000 // n)
+
+        legacy = _time(lambda: _legacy_trim(list(msgs)), 1) if n <= 20_000 else float("nan")
+        as_list = _time(lambda: trim_history(list(msgs)), reps)
+        as_hist = _time(lambda: History(msgs).trim(), reps) - _time(lambda: History(msgs), reps)
+
+        steady = History(msgs)
+        steady.trim()
+        new = {"role": "user", "content": "z" * args.chars}
+        per_turn = _time(lambda: (steady.append(new), steady.trim()), 10_000)
+
+        print(f"{n:>8} {legacy:>12.0f} {as_list:>10.0f} {as_hist:>11.0f} {per_turn:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
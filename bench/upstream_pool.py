@@ -0,0 +1,64 @@
+"""
+bench/upstream_pool.py — time-to-first-token with and without connection reuse
+
+Streams chat requests at a local ``FakeOllama`` two ways: a fresh
+``httpx.AsyncClient`` per request (the old ``_ollama_stream``), and the shared
+pool from ``app.clients``.  Reports TTFT percentiles for each.
+
+    python -m bench.upstream_pool [--requests 500] [--concurrency 8]
+"""
+
+from __future__ import annotations
+import argparse, asyncio, statistics, time
+
+import httpx
+
+from app import clients
+from bench.fakes import FakeOllama, serve
+
+
+async def _ttft(cli: httpx.AsyncClient, url: str) -> float:
+    t0 = time.perf_counter()
+    async with cli.stream("POST", url, json={"model": "llama3:8b-instruct-q4_K_M", "stream": True}) as resp:
+        ttft = None
+        async for _ in resp.aiter_bytes():
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+    return ttft * 1000
+
+
+async def _fresh(url: str) -> float:
+    async with httpx.AsyncClient(timeout=None) as cli:
+        return await _ttft(cli, url)
+
+
+async def _run(label: str, fn, n: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one() -> float:
+        async with sem:
+            return await fn()
+
+    samples = sorted(await asyncio.gather(*(one() for _ in range(n))))
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    print(f"{label:<14} p50 {p(0.50):7.2f} ms   p99 {p(0.99):7.2f} ms   mean {statistics.mean(samples):7.2f} ms")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--tokens", type=int, default=8)
+    args = ap.parse_args()
+
+    with serve(FakeOllama(tokens=args.tokens)) as base:
+        url = base + "/api/chat"
+        pooled = clients.ollama()
+        await _ttft(pooled, url)                                    # warm the pool once
+        await _run("fresh client", lambda: _fresh(url), args.requests, args.concurrency)
+        await _run("pooled client", lambda: _ttft(pooled, url), args.requests, args.concurrency)
+        await clients.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
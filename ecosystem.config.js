@@ -8,7 +8,12 @@ module.exports = {
 
       /* Call the venv’s Uvicorn launcher directly */
       script: "venv/bin/uvicorn",
-      args: "app.main:app --host 127.0.0.1 --port 8006",
+      /* One worker: the Ollama scheduler caps, model affinity, pool breaker,
+         preload, single-flight table and response cache are all per process,
+         so N workers means N times the load on Ollama.  Memory is
+         flock-guarded per agent, so --workers N is safe for the store; divide
+         the OLLAMA_* limits by N first if you raise it. */
+      args: "app.main:app --host 127.0.0.1 --port 8006 --workers 1",
 
       /* Tell PM2 this is a stand-alone binary */
       interpreter: "none",        // <— critical line
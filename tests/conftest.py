@@ -0,0 +1,91 @@
+"""
+Shared fixtures: the gateway served in-process (uvicorn on a background
+thread) against the stub backends from ``bench.fakes``, with memory kept in a
+throwaway directory.  The environment is set before anything from ``app`` is
+imported, since modules read their configuration at import time.
+"""
+
+from __future__ import annotations
+import asyncio, json, os, tempfile, time
+from typing import Dict, List
+
+os.environ["MEMORY_DIR"] = tempfile.mkdtemp(prefix="tests-memory-")
+os.environ["PAYLOAD_LOG_SAMPLE"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import httpx                                                     # noqa: E402
+import pytest                                                    # noqa: E402
+
+from bench.fakes import FakeOllama, FakeOpenAI, free_port, serve  # noqa: E402
+
+OLLAMA_PORT, OPENAI_PORT = free_port(), free_port()
+os.environ["OLLAMA_URL"]      = f"http://127.0.0.1:{OLLAMA_PORT}/api/chat"
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{OPENAI_PORT}/v1"
+
+TOKENS = 16
+REPLY  = "".join(f"tok{i} " for i in range(TOKENS))
+
+
+@pytest.fixture(scope="session")
+def ollama():
+    from app.registry import OLLAMA_MODELS
+
+    fake = FakeOllama(models=OLLAMA_MODELS, tokens=TOKENS, first_token_delay=0.01, token_delay=0.002)
+    with serve(fake, port=OLLAMA_PORT):
+        yield fake
+
+
+@pytest.fixture(scope="session")
+def openai():
+    fake = FakeOpenAI(tokens=TOKENS, first_token_delay=0.01, token_delay=0.002)
+    with serve(fake, port=OPENAI_PORT):
+        yield fake
+
+
+@pytest.fixture(scope="session")
+def gateway(ollama, openai) -> str:
+    """Base URL of the running gateway."""
+    from app.main import app
+
+    with serve(app) as base:
+        yield base
+
+
+async def sse(client: httpx.AsyncClient, url: str, body: Dict) -> List[Dict]:
+    """Every ``data:`` frame of a streamed POST, decoded."""
+    frames = []
+    async with client.stream("POST", url, json=body) as r:
+        assert r.status_code == 200, r.status_code
+        async for line in r.aiter_lines():
+            if line.startswith("data:"):
+                frames.append(json.loads(line[5:]))
+    return frames
+
+
+def text_of(frames: List[Dict]) -> str:
+    return "".join(f.get("data", "") for f in frames)
+
+
+def leave_early(fake, url: str, body: Dict, timeout: float = 5.0) -> bool:
+    """
+    Stream ``body`` to ``url``, hang up after the first text frame, and report
+    whether ``fake`` saw its upstream stream cancelled within ``timeout``.
+    """
+    before, delay = fake.cancelled, fake.token_delay
+    fake.token_delay = 0.02                              # still mid-reply when we leave
+
+    async def run():
+        async with httpx.AsyncClient(timeout=30) as client:
+            async with client.stream("POST", url, json={**body, "stream": True}) as r:
+                async for line in r.aiter_lines():
+                    if '"data"' in line:
+                        break
+
+    try:
+        asyncio.run(run())
+        deadline = time.monotonic() + timeout
+        while fake.cancelled == before and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        fake.token_delay = delay
+    return fake.cancelled > before
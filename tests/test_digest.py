@@ -0,0 +1,69 @@
+"""Digest compaction: the digest stands in for the folded turns; recall and paging still agree."""
+
+import asyncio, dataclasses
+
+import pytest
+
+from app import memory, recall, tokens
+from app.digest import DIGEST_PREFIX, Digester, digest_key, latest, with_digest
+from app.registry import AGENTS
+
+AGENT = "DigestTest"
+
+
+def _turns(n):
+    out = []
+    for i in range(n):
+        msg = {"role": "user" if i % 2 else "assistant", "content": f"turn{i} " + "we talked about build orders " * 4}
+        tokens.count(msg, "llama3")
+        out.append(msg)
+    return out
+
+
+@pytest.fixture
+def rec(monkeypatch):
+    monkeypatch.setattr(recall.RECALL, "enabled", set(recall.RECALL.enabled) | {AGENT})
+    return dataclasses.replace(AGENTS["LlamaAgent42"], name=AGENT, digest=True,
+                               budget=tokens.Budget("llama3", 640, 128))
+
+
+def test_digest_replaces_the_folded_range(rec):
+    history = [{"role": "system", "content": "pinned persona"}] + _turns(40)
+    memory.save_memory(AGENT, history)
+    spans = []
+
+    async def stub(previous, span):
+        spans.append(list(span))
+        return f"{previous or ''} folded {len(span)}"
+
+    folded = asyncio.run(Digester(summarizer=stub).compact(rec))
+    assert folded and len(spans) >= 1
+
+    raw = memory.load_memory(AGENT)
+    assert [m for span in spans for m in span] == history[1:1 + folded]     # each turn folded once, in order
+    assert raw == history[:1] + history[1 + folded:]
+    assert tokens.prompt_tokens(raw, "llama3") <= rec.budget.prompt * Digester().trigger
+
+    digest = latest(AGENT)
+    assert digest["covers"] == folded and digest["content"].startswith(DIGEST_PREFIX)
+    assert len(memory.load_memory(digest_key(AGENT))) == len(spans)
+    prompt = with_digest(AGENT, raw)
+    assert prompt[0] == raw[0] and prompt[1]["content"] == digest["content"] and prompt[2:] == raw[1:]
+
+    # recall still finds a folded turn, and archived each turn exactly once
+    hit = recall.RECALL.search(AGENT, "turn3", 1)
+    assert [m["content"] for m in hit] == [history[4]["content"]]
+    with open(recall.docs_path(AGENT), "rb") as f:
+        assert [recall._content(line) for line in f] == [m["content"] for m in history[1:]]
+
+    # paging walks exactly the raw window, newest page last, seq numbers intact
+    seen, before = [], None
+    while True:
+        page, end = memory.page_memory(AGENT, before, 7)
+        if not page:
+            break
+        seen[:0] = page
+        before = page[0][0]
+    assert [m["content"] for _, m in seen] == [m["content"] for m in raw]
+    assert [seq for seq, _ in seen] == [0] + list(range(1 + folded, len(history)))
+    assert end == len(history)
@@ -0,0 +1,36 @@
+"""Shutdown drains memory first and survives a failed recall warm-up."""
+
+import asyncio
+
+from app import main
+
+SERVICES = {"POOL": main.POOL, "MODELS": main.MODELS, "WRITER": main.WRITER,
+            "DIGESTS": main.DIGESTS, "LOOP_LAG": main.LOOP_LAG}
+
+
+def test_failed_warm_still_stops_everything(monkeypatch):
+    stopped = []
+
+    def recorder(name):
+        async def call():
+            stopped.append(name)
+        return call
+
+    for name, service in SERVICES.items():
+        monkeypatch.setattr(service, "start", lambda: None)
+        monkeypatch.setattr(service, "stop", recorder(name))
+    monkeypatch.setattr(main.clients, "startup", recorder("startup"))
+    monkeypatch.setattr(main.clients, "shutdown", recorder("clients"))
+    monkeypatch.setattr(main.RECALL, "enable", lambda names: None)
+
+    def warm():
+        raise OSError("archive unreadable")
+    monkeypatch.setattr(main.RECALL, "warm", warm)
+
+    async def run():
+        async with main.lifespan(main.app):
+            pass
+    asyncio.run(run())
+
+    assert stopped[0] == "startup" and stopped[1] == "WRITER"
+    assert set(stopped[1:]) == set(SERVICES) | {"clients"}
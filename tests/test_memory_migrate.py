@@ -0,0 +1,44 @@
+"""Legacy ``<agent>.json`` migration, including the old Agent4oM record shape."""
+
+import json, os
+
+import pytest
+
+from app import memory
+
+LEGACY = [
+    {"timestamp": "2025-01-01T10:00:00", "message": "Hallo Agent4oM"},
+    {"timestamp": "2025-01-01T10:00:05", "message": "what beats knights?"},
+]
+
+
+def _legacy(agent, records):
+    with open(memory.memory_path(agent), "w") as f:
+        json.dump(records, f)
+
+
+def _leftovers(agent):
+    return [n for n in os.listdir(memory.MEMORY_DIR) if n.startswith(agent) and ".tmp" in n]
+
+
+def test_timestamp_message_records_become_user_messages():
+    _legacy("LegacyStamped", LEGACY)
+    assert "LegacyStamped" in memory.migrate_all()
+    msgs = list(memory.load_memory("LegacyStamped"))
+    assert msgs == [{"role": "user", "content": r["message"]} for r in LEGACY]
+    memory.save_memory("LegacyStamped", msgs + [{"role": "assistant", "content": "pikes"}])
+    assert list(memory.load_memory("LegacyStamped"))[-1]["content"] == "pikes"
+
+
+def test_non_chat_records_are_skipped():
+    _legacy("LegacyJunk", [{"role": "system", "content": "persona"}, "stray", {"timestamp": 1}, LEGACY[0]])
+    memory.migrate_all()
+    assert [m["content"] for m in memory.load_memory("LegacyJunk")] == ["persona", LEGACY[0]["message"]]
+
+
+def test_failed_rewrite_leaves_no_files():
+    with pytest.raises(TypeError):
+        with memory.locked("LegacyBroken") as log:
+            log.rewrite([{"role": "user", "content": 5}])
+    assert not os.path.exists(memory.log_path("LegacyBroken"))
+    assert not _leftovers("LegacyBroken")
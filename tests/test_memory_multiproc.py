@@ -0,0 +1,24 @@
+"""Several worker processes appending to one agent's memory lose nothing."""
+
+from __future__ import annotations
+import multiprocessing as mp
+from collections import Counter
+
+from app import memory
+from bench.memory_multiproc import AGENT, _worker
+
+
+def test_no_lost_or_duplicated_messages():
+    procs, turns = 3, 40                                         # every turn of a worker in flight at once
+    ctx     = mp.get_context("spawn")
+    workers = [ctx.Process(target=_worker, args=(p, turns, turns)) for p in range(procs)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+        assert w.exitcode == 0
+
+    seen     = Counter(m["content"] for m in memory.load_memory(AGENT))
+    expected = {f"p{p}-{k}{i}" for p in range(procs) for i in range(turns) for k in "ua"}
+    assert expected <= set(seen)
+    assert [c for c, n in seen.items() if n > 1] == []
@@ -0,0 +1,122 @@
+"""The JSONL + offset-index store: crash recovery, index rebuilds, compaction, edits."""
+
+import os
+
+import pytest
+
+from app import memory
+
+
+def _msgs(n, start=0):
+    return [{"role": "user" if i % 2 else "assistant", "content": f"m{i}"} for i in range(start, start + n)]
+
+
+def _texts(agent):
+    return [m["content"] for m in memory.load_memory(agent)]
+
+
+def _reopen(agent):
+    """Forget the in-process state so the next call reads the files from scratch."""
+    log = memory._logs.pop(agent, None)
+    if log is not None and log.lock_fd is not None:
+        os.close(log.lock_fd)
+
+
+def _lines(agent):
+    with open(memory.log_path(agent), "rb") as f:
+        return f.read().splitlines()
+
+
+def test_torn_tail_is_dropped():
+    memory.save_memory("StoreTorn", _msgs(4))
+    with open(memory.log_path("StoreTorn"), "ab") as f:
+        f.write(b'{"role": "user", "content": "half a rec')
+    _reopen("StoreTorn")
+    assert _texts("StoreTorn") == ["m0", "m1", "m2", "m3"]
+    memory.update_memory("StoreTorn", lambda view: view.append({"role": "user", "content": "m4"}))
+    _reopen("StoreTorn")
+    assert _texts("StoreTorn") == ["m0", "m1", "m2", "m3", "m4"]
+
+
+def test_lost_index_is_rebuilt():
+    memory.save_memory("StoreNoIdx", _msgs(5))
+    os.remove(memory.index_path("StoreNoIdx"))
+    _reopen("StoreNoIdx")
+    assert _texts("StoreNoIdx") == ["m0", "m1", "m2", "m3", "m4"]
+    assert os.path.exists(memory.index_path("StoreNoIdx"))
+
+
+def test_stale_index_catches_up():
+    memory.save_memory("StoreStale", _msgs(3))
+    with open(memory.index_path("StoreStale"), "rb") as f:
+        stale = f.read()
+    memory.update_memory("StoreStale", lambda view: view.extend(_msgs(2, start=3)))
+    with open(memory.index_path("StoreStale"), "wb") as f:     # the index lost the last two offsets
+        f.write(stale)
+    _reopen("StoreStale")
+    assert _texts("StoreStale") == ["m0", "m1", "m2", "m3", "m4"]
+
+
+def test_index_of_another_log_is_ignored():
+    memory.save_memory("StoreOther", _msgs(2))
+    memory.save_memory("StoreMixed", _msgs(6))
+    with open(memory.index_path("StoreOther"), "rb") as f:
+        foreign = f.read()
+    with open(memory.index_path("StoreMixed"), "wb") as f:
+        f.write(foreign)
+    _reopen("StoreMixed")
+    assert _texts("StoreMixed") == ["m0", "m1", "m2", "m3", "m4", "m5"]
+
+
+def test_compaction_keeps_the_live_window(monkeypatch):
+    monkeypatch.setattr(memory, "COMPACT_MIN_DEAD", 4)
+    memory.save_memory("StoreCompact", _msgs(3))
+
+    fresh = iter(_msgs(6, start=3))
+
+    def turn(view):
+        view.append(next(fresh))
+        del view[1:3]
+
+    for _ in range(6):
+        memory.update_memory("StoreCompact", turn)
+    live = _texts("StoreCompact")
+    assert live[0] == "m0" and len(live) < 5
+    assert len(_lines("StoreCompact")) < 9                    # dead records were reclaimed
+    _reopen("StoreCompact")
+    assert _texts("StoreCompact") == live
+
+
+@pytest.mark.parametrize("name, edit, expected", [
+    ("Set",     lambda h: h.__setitem__(2, {"role": "user", "content": "X"}), ["m0", "m1", "X", "m3", "m4"]),
+    ("Delete",  lambda h: h.__delitem__(3),                                   ["m0", "m1", "m2", "m4"]),
+    ("Mutate",  lambda h: h[1].update(content="edited"),                      ["m0", "edited", "m2", "m3", "m4"]),
+    ("Insert",  lambda h: h.insert(2, {"role": "user", "content": "in"}),     ["m0", "m1", "in", "m2", "m3", "m4"]),
+    ("Replace", lambda h: (h.pop(), h.append({"role": "user", "content": "n"})), ["m0", "m1", "m2", "m3", "n"]),
+])
+def test_edits_beyond_append_and_trim_are_saved(name, edit, expected):
+    agent = f"StoreEdit{name}"
+    memory.save_memory(agent, _msgs(5))
+    view = memory.load_memory(agent)
+    edit(view)
+    memory.save_memory(agent, view)
+    assert _texts(agent) == expected
+    _reopen(agent)
+    assert _texts(agent) == expected
+
+
+def test_loaded_messages_are_copies():
+    memory.save_memory("StoreCopies", _msgs(3))
+    memory.load_memory("StoreCopies")[1]["content"] = "scribbled"
+    assert _texts("StoreCopies") == ["m0", "m1", "m2"]
+
+
+def test_append_and_trim_still_append():
+    memory.save_memory("StoreAppend", _msgs(4))
+    view = memory.load_memory("StoreAppend")
+    del view[1:2]
+    view.append({"role": "user", "content": "m4"})
+    before = len(_lines("StoreAppend"))
+    memory.save_memory("StoreAppend", view)
+    assert len(_lines("StoreAppend")) == before + 1           # no rewrite
+    assert _texts("StoreAppend") == ["m0", "m2", "m3", "m4"]
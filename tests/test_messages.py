@@ -0,0 +1,77 @@
+"""``GET /api/chat/messages/{agent}``: agent validation, read-only probing, paging, ETags."""
+
+import os
+
+import httpx
+import pytest
+
+from app import memory, metrics
+
+QUIET = "Agent4o"                      # no test sends to it, so it has no history
+PAGED = "Agent4.1M"                    # seeded directly by the paging test
+
+
+def test_unknown_agent_is_404(gateway):
+    r = httpx.get(f"{gateway}/api/chat/messages/Nobody")
+    assert r.status_code == 404
+    assert not os.path.exists(memory.lock_path("Nobody"))
+    assert "Nobody" not in memory._logs
+    assert "Nobody" not in metrics.render()
+
+
+def test_empty_history_takes_no_lock(gateway):
+    r = httpx.get(f"{gateway}/api/chat/messages/{QUIET}")
+    assert r.status_code == 200 and r.json() == []
+    assert not os.path.exists(memory.lock_path(QUIET))
+    assert QUIET not in memory._logs
+
+
+@pytest.mark.parametrize("header, status", [
+    ("{etag}", 304),
+    ('"other", {etag}', 304),
+    ("{bare}", 304),                   # weak comparison ignores W/
+    ("*", 304),
+    ('"other"', 200),
+    ("{etag}x", 200),                  # a longer tag is not a match
+    ("{short}", 200),                  # nor is a prefix of one
+])
+def test_if_none_match(gateway, header, status):
+    url  = f"{gateway}/api/chat/messages/{QUIET}"
+    etag = httpx.get(url).headers["etag"]
+    header = header.format(etag=etag, bare=etag[2:], short=etag[:-2] + '"')
+    r = httpx.get(url, headers={"If-None-Match": header})
+    assert r.status_code == status
+    assert r.headers["etag"] == etag
+
+
+def _walk(base, limit):
+    """Follow ``X-Next-Before`` to the oldest page; returns the ids, oldest first."""
+    ids, before, pages = [], None, 0
+    while True:
+        params = {"limit": limit, "compact": 1, **({"before": before} if before is not None else {})}
+        r = httpx.get(f"{base}/api/chat/messages/{PAGED}", params=params)
+        assert r.status_code == 200, r.text
+        rows = r.json()
+        assert len(rows) <= limit
+        ids[:0] = [row[0] for row in rows]
+        pages += 1
+        before = r.headers.get("X-Next-Before")
+        if before is None:
+            return ids, pages
+        assert f"before={before}" in r.headers["Link"]
+        assert rows and int(before) == rows[0][0]
+
+
+def test_cursor_paging(gateway):
+    history = [{"role": "system", "content": "pinned persona"}]
+    history += [{"role": "user" if i % 2 else "assistant", "content": f"m{i}"} for i in range(1, 57)]
+    memory.save_memory(PAGED, history)
+
+    ids, pages = _walk(gateway, 10)
+    assert ids == list(range(57)) and pages == 6
+
+    memory.update_memory(PAGED, lambda view: view.__delitem__(slice(1, 21)))     # window now starts at 21
+    ids, _ = _walk(gateway, 9)                        # 36 live body records: four full pages, then the pin
+    assert ids == [0] + list(range(21, 57))
+    rows = httpx.get(f"{gateway}/api/chat/messages/{PAGED}", params={"before": 21, "limit": 5}).json()
+    assert rows == [{"id": 0, "from": PAGED, "text": "pinned persona"}]
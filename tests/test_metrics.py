@@ -0,0 +1,62 @@
+"""``/api/chat/metrics`` exposition and the upstream timings behind it."""
+
+import asyncio
+
+import pytest
+
+from app import metrics
+from app.scheduler import QueueStatus
+
+SUFFIXES = {"counter": ("",), "gauge": ("",), "histogram": ("_bucket", "_sum", "_count")}
+
+
+def _exposition() -> str:
+    metrics.ERRORS.labels("MetricsAgent", "m", "500").inc()
+    metrics.UPSTREAM_OPEN.labels("MetricsAgent", "m").inc()
+    metrics.MEMORY_IO.labels("MetricsAgent", "load").observe(0.002)
+    return metrics.render()
+
+
+def test_samples_belong_to_their_declared_family():
+    declared = {}
+    for line in _exposition().splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            declared[name] = kind
+        elif line and not line.startswith("#"):
+            sample = line.split("{", 1)[0]
+            assert any(sample == name + s for name, k in declared.items() for s in SUFFIXES[k]), sample
+    assert declared["chat_upstream_errors_total"] == "counter"
+    assert declared["chat_upstream_streams"] == "gauge"
+
+
+def test_prometheus_parser_reads_every_family():
+    parser = pytest.importorskip("prometheus_client.parser")
+    families = {f.name: f for f in parser.text_string_to_metric_families(_exposition())}
+    assert not [f.name for f in families.values() if f.type == "unknown"]
+    errors = families["chat_upstream_errors"]
+    assert errors.type == "counter"
+    assert errors.samples and {s.name for s in errors.samples} == {"chat_upstream_errors_total"}
+    assert families["chat_memory_seconds"].type == "histogram"
+
+
+def test_families_must_say_how_to_render():
+    with pytest.raises(TypeError):
+        metrics._Family("chat_incomplete", "No _render.")
+    assert not [f for f in metrics.REGISTRY if f.name == "chat_incomplete"]
+
+
+def test_timings_start_when_the_request_is_sent():
+    async def backend():
+        yield QueueStatus(0, 1.0)
+        await asyncio.sleep(0.2)                                  # the scheduler wait
+        yield metrics.SENT
+        yield "first"
+        yield "second"
+
+    async def run():
+        return [c async for c in metrics.upstream(backend(), "MetricsQueued", "m")]
+    assert asyncio.run(run()) == [QueueStatus(0, 1.0), "first", "second"]
+    for family in (metrics.TTFT, metrics.LATENCY):
+        series = family.labels("MetricsQueued", "m")
+        assert sum(series.counts) == 1 and series.sum < 0.1
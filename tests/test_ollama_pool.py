@@ -0,0 +1,96 @@
+"""Ollama node routing: placement ranking, the circuit breaker, first-token failover."""
+
+import asyncio, time
+
+import pytest
+from fastapi import HTTPException
+
+from app import clients, llama3_router, ollama_pool
+from app.ollama_pool import OllamaPool
+from bench.fakes import free_port
+from tests.conftest import OLLAMA_PORT, REPLY
+
+MODEL = "llama3:8b-instruct-q4_K_M"
+
+
+def _trip(node):
+    for _ in range(ollama_pool.BREAKER_FAILURES):
+        node.failed()
+
+
+def _cool(node):
+    node.open_until = time.monotonic() - 1                       # cooldown over: half-open
+
+
+def test_pick_prefers_resident_then_pulled_then_least_busy():
+    pool = OllamaPool(["http://a/api/chat", "http://b/api/chat", "http://c/api/chat"])
+    a, b, c = pool.nodes
+    a.models, b.models, c.models = {"other"}, {MODEL}, {MODEL}
+    b.outstanding = 2
+    assert pool.pick(MODEL) is c
+    b.resident = {MODEL}
+    assert pool.pick(MODEL) is b
+    assert pool.pick(MODEL, exclude=[b]) is c
+    assert pool.pick(MODEL, exclude=[b, c]) is a                 # last resort: pull there
+
+
+def test_half_open_admits_a_single_probe():
+    pool = OllamaPool(["http://a/api/chat", "http://b/api/chat"])
+    a, b = pool.nodes
+    a.resident = {MODEL}
+    _trip(a)
+    assert a.circuit == "open" and pool.pick(MODEL) is b
+
+    _cool(a)
+    assert a.circuit == "half-open"
+    assert pool.pick(MODEL) is a                                 # the probe
+    assert [pool.pick(MODEL) for _ in range(3)] == [b, b, b]     # nobody else while it is out
+    a.failed()
+    assert a.circuit == "open" and not a.probing
+
+    _cool(a)
+    assert pool.pick(MODEL) is a
+    a.succeeded()
+    assert a.circuit == "closed" and [pool.pick(MODEL) for _ in range(3)] == [a, a, a]
+
+
+def test_a_lone_half_open_node_still_gets_its_probe():
+    pool = OllamaPool(["http://a/api/chat"])
+    (a,) = pool.nodes
+    _trip(a)
+    assert pool.pick(MODEL) is None
+    _cool(a)
+    assert pool.pick(MODEL) is a and pool.pick(MODEL) is None
+    assert pool.status()[0]["circuit"] == "half-open"
+
+
+def test_fails_over_before_the_first_token(ollama, monkeypatch):
+    dead = f"http://127.0.0.1:{free_port()}/api/chat"            # nothing listens here
+    pool = OllamaPool([dead, f"http://127.0.0.1:{OLLAMA_PORT}/api/chat"])
+    monkeypatch.setattr(llama3_router, "POOL", pool)
+    monkeypatch.setattr(clients, "_ollama", None)                # a client for this test's loop
+
+    async def run():
+        try:
+            return [c async for c in llama3_router._ollama_stream(
+                {"model": MODEL, "stream": True, "messages": [{"role": "user", "content": "hi"}]})
+                if isinstance(c, str)]
+        finally:
+            await clients.ollama().aclose()
+
+    assert "".join(asyncio.run(run())) == REPLY
+    down, up = pool.nodes
+    assert down.failures == 1 and up.healthy and not up.outstanding
+
+
+def test_no_live_node_is_502(monkeypatch):
+    pool = OllamaPool(["http://a/api/chat"])
+    _trip(pool.nodes[0])
+    monkeypatch.setattr(llama3_router, "POOL", pool)
+
+    async def run():
+        async for _ in llama3_router._ollama_stream({"model": MODEL}):
+            pass
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(run())
+    assert err.value.status_code == 502
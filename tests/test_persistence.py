@@ -0,0 +1,90 @@
+"""The write-behind writer never stalls other agents (or the loop) on one agent's disk."""
+
+from __future__ import annotations
+import asyncio, fcntl, os, threading, time
+from contextlib import contextmanager
+
+import httpx
+
+from app import memory
+from app.persistence import MemoryWriter
+from tests.conftest import REPLY, sse, text_of
+
+
+@contextmanager
+def held_flock(agent: str):
+    """Hold ``agent``'s store lock from another open file, as another worker would."""
+    fd = os.open(memory.lock_path(agent), os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _flush_in_background(writer: MemoryWriter) -> threading.Thread:
+    thread = threading.Thread(target=asyncio.run, args=(writer.flush(),))
+    thread.start()
+    return thread
+
+
+def test_view_of_one_agent_ignores_a_stuck_write_of_another():
+    writer = MemoryWriter()
+    memory.save_memory("PersistB", [{"role": "user", "content": "b0"}])
+    writer._overlay("PersistA").pending.append({"role": "user", "content": "a0"})
+    with held_flock("PersistA"):
+        flusher = _flush_in_background(writer)
+        time.sleep(0.05)                                  # the writer thread now waits on A's flock
+        t0 = time.perf_counter()
+        assert [m["content"] for m in writer.view("PersistB")] == ["b0"]
+        assert time.perf_counter() - t0 < 0.2
+    flusher.join(5)
+    assert [m["content"] for m in writer.view("PersistA")] == ["a0"]
+
+
+def test_readers_see_each_message_once_while_flushing():
+    writer, agent, n = MemoryWriter(), "PersistC", 300
+    seen, stop = [], threading.Event()
+
+    def read():
+        while not stop.is_set():
+            seen.append([m["content"] for m in writer.view(agent)])
+
+    async def write():
+        for i in range(n):
+            writer.append(agent, {"role": "user", "content": f"c{i}"})
+            if i % 7 == 0:
+                await writer.flush()
+        await writer.stop()
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        asyncio.run(write())
+    finally:
+        stop.set()
+        reader.join()
+    for snapshot in seen:
+        assert snapshot == [f"c{i}" for i in range(len(snapshot))]
+    assert [m["content"] for m in memory.load_memory(agent)] == [f"c{i}" for i in range(n)]
+
+
+def test_event_loop_keeps_serving_while_a_turn_waits_on_disk(gateway):
+    agent = "WoloDaemon"
+
+    async def run():
+        async with httpx.AsyncClient(timeout=30) as client:
+            with held_flock(agent):
+                turn = asyncio.create_task(sse(client, f"{gateway}/api/chat/send",
+                                               {"to": agent, "text": "are you stuck?", "stream": True}))
+                await asyncio.sleep(0.1)
+                t0 = time.perf_counter()
+                assert (await client.get(f"{gateway}/api/chat/agents")).status_code == 200
+                elapsed = time.perf_counter() - t0
+                assert not turn.done()
+            return elapsed, await turn
+
+    elapsed, frames = asyncio.run(run())
+    assert elapsed < 0.5
+    assert text_of(frames) == REPLY
@@ -0,0 +1,129 @@
+"""Recall archive: BM25 snapshot + tail replay, retrieval, and the store's save hook."""
+
+import asyncio, os
+
+import pytest
+
+from app import memory, recall
+from app.persistence import MemoryWriter
+
+NEEDLE = "the tournament final is on saturday at the riverside lan cafe"
+
+
+def _turns(n, start=0):
+    words = "scout villager castle feudal archer knight monk market wood gold stone farm".split()
+    return [{"role": "user" if i % 2 else "assistant",
+             "content": " ".join(words[(i * 7 + j) % len(words)] for j in range(6)) + f" turn{i}"}
+            for i in range(start, start + n)]
+
+
+def _archive(agent, msgs):
+    store = recall.Recall()
+    store.enable([agent])
+    store.index(agent, msgs)
+    return store
+
+
+def _fresh(agent):
+    store = recall.Recall()
+    store.search(agent, "warm up", 1)
+    return store.indexes[agent]
+
+
+@pytest.fixture(autouse=True)
+def small_snapshots(monkeypatch):
+    monkeypatch.setattr(recall, "RECALL_SNAPSHOT_EVERY", 10)
+
+
+def test_snapshot_plus_tail_matches_a_full_replay():
+    store = _archive("RecallSnap", _turns(25) + [{"role": "user", "content": NEEDLE}])
+    assert os.path.exists(recall.snapshot_path("RecallSnap"))
+    store.index("RecallSnap", _turns(8, start=25))               # too few for a new snapshot
+
+    warm = _fresh("RecallSnap")
+    assert warm.count == 34 and warm.saved == 26                 # snapshot, then the tail replayed
+    os.remove(recall.snapshot_path("RecallSnap"))
+    cold = _fresh("RecallSnap")
+    assert cold.saved == 34                                      # the full replay wrote a new one
+    assert list(warm.offsets) == list(cold.offsets) and list(warm.lengths) == list(cold.lengths)
+    assert warm.total == cold.total
+    assert {t: (list(d), list(f)) for t, (d, f) in warm.postings.items()} == \
+           {t: (list(d), list(f)) for t, (d, f) in cold.postings.items()}
+
+    store = recall.Recall()
+    assert store.search("RecallSnap", "when is the tournament final", 1)[0]["content"] == NEEDLE
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garble", "foreign"])
+def test_unusable_snapshot_falls_back_to_replay(damage):
+    agent = f"RecallBad{damage}"
+    _archive(agent, _turns(12))
+    snap = recall.snapshot_path(agent)
+    with open(snap, "rb") as f:
+        raw = f.read()
+    if damage == "truncate":
+        raw = raw[:len(raw) - 7]
+    elif damage == "garble":
+        raw = raw[:8] + b"\xff" * 16 + raw[24:]
+    else:                                                        # another archive's snapshot
+        _archive("RecallDonor", _turns(11))
+        with open(recall.snapshot_path("RecallDonor"), "rb") as f:
+            raw = f.read()
+    with open(snap, "wb") as f:
+        f.write(raw)
+    index = _fresh(agent)
+    assert index.count == 12
+    assert [m["content"] for m in recall.Recall().search(agent, "turn11", 1)] == [_turns(1, start=11)[0]["content"]]
+
+
+def test_relevant_skips_the_window_and_fits_the_budget():
+    msgs  = _turns(20) + [{"role": "user", "content": NEEDLE}]
+    store = _archive("RecallRelevant", msgs)
+    quoted = store.relevant("RecallRelevant", "tournament final saturday", msgs[:5], 200, lambda m: len(m["content"]) // 4)
+    assert quoted["role"] == "system" and NEEDLE in quoted["content"]
+    assert store.relevant("RecallRelevant", "tournament final saturday", msgs, 200, lambda m: 1) is None
+    assert store.relevant("RecallRelevant", "tournament final saturday", [], 3, lambda m: 2) is None
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    def enable(*agents):
+        monkeypatch.setattr(recall.RECALL, "enabled", set(recall.RECALL.enabled) | set(agents))
+    return enable
+
+
+def _archived(agent):
+    with open(recall.docs_path(agent), "rb") as f:
+        return [recall._content(line) for line in f]
+
+
+def test_every_store_save_is_archived(enabled):
+    enabled("RecallHook")
+    memory.save_memory("RecallHook", [{"role": "system", "content": "persona"}, *_turns(2)])
+    memory.update_memory("RecallHook", lambda view: view.append(_turns(1, start=2)[0]))
+    view = memory.load_memory("RecallHook")
+    view[1] = {"role": "user", "content": "edited turn"}
+    memory.save_memory("RecallHook", view)
+    assert _archived("RecallHook") == [m["content"] for m in _turns(3)] + ["edited turn"]
+
+
+def test_writer_flush_archives_once(enabled):
+    enabled("RecallWriter")
+    writer = MemoryWriter()
+
+    async def run():
+        for msg in _turns(3):
+            writer.append("RecallWriter", msg)
+        await writer.stop()
+    asyncio.run(run())
+    assert _archived("RecallWriter") == [m["content"] for m in _turns(3)]
+
+
+def test_remember_is_archived(enabled, monkeypatch, tmp_path):
+    from agents import agent4om_core
+    enabled(agent4om_core.AGENT4OM["name"])
+    monkeypatch.chdir(tmp_path)                                  # remember() writes to the cwd
+    monkeypatch.setitem(agent4om_core.AGENT4OM, "memory", [])
+    before = len(_archived("Agent4oM")) if os.path.exists(recall.docs_path("Agent4oM")) else 0
+    agent4om_core.remember("my main civ is the franks")
+    assert _archived("Agent4oM")[before:] == ["my main civ is the franks"]
@@ -0,0 +1,98 @@
+"""Response cache: key normalisation, replay shape, LRU/TTL, and the disk tier."""
+
+import asyncio, json, os
+from types import SimpleNamespace
+
+import pytest
+
+from app.response_cache import ResponseCache, cache_key
+from app.stream_decode import OllamaStats
+
+REC   = SimpleNamespace(backend="ollama", model="m", system_prompt="persona")
+STATS = OllamaStats(eval_count=3, eval_duration=3_000_000, prompt_eval_count=9)
+
+
+def _key(text, **extra):
+    return cache_key(REC, {"messages": [{"role": "user", "content": text}], **extra})
+
+
+def test_key_ignores_the_ends_but_not_inner_whitespace():
+    assert _key("hi there") == _key("  hi there\n") == _key("hi there", stream=False)
+    assert _key("hi there") != _key("hi  there")
+    assert _key("line\n\nbreak") != _key("line break")
+
+
+def _backend(chunks, fail=False):
+    calls = []
+
+    async def backend(payload):
+        calls.append(payload)
+        for chunk in chunks:
+            yield chunk
+        if fail:
+            raise RuntimeError("upstream went away")
+    return backend, calls
+
+
+def _drain(cache, key, backend):
+    async def run():
+        return [c async for c in cache.stream(key, backend, {})]
+    return asyncio.run(run())
+
+
+def test_a_hit_replays_text_and_stats():
+    cache = ResponseCache()
+    backend, calls = _backend(["a", "b", STATS])
+    miss = _drain(cache, "k", backend)
+    hit  = _drain(cache, "k", backend)
+    assert hit == miss == ["a", "b", STATS] and len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_a_failed_stream_is_not_stored():
+    cache = ResponseCache()
+    backend, calls = _backend(["a"], fail=True)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            _drain(cache, "k", backend)
+    assert len(calls) == 2 and not cache.entries
+
+
+def test_byte_budget_and_ttl():
+    cache = ResponseCache(max_bytes=40)
+
+    async def run():
+        await cache.put("a", ["x" * 15])
+        await cache.put("b", ["y" * 15])
+        assert await cache.get("a")                              # a is now the most recent
+        await cache.put("c", ["z" * 15])
+        assert await cache.get("b") is None and await cache.get("a") and await cache.get("c")
+        await cache.put("d", ["w"], ttl=-1)
+        assert await cache.get("d") is None
+    asyncio.run(run())
+    assert cache.evictions == 1 and cache.bytes <= 40
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    backend, _ = _backend(["a", "b", STATS])
+    _drain(ResponseCache(disk_dir=str(tmp_path)), "k", backend)
+    fresh = ResponseCache(disk_dir=str(tmp_path))
+    assert asyncio.run(fresh.get("k")) == ("a", "b", STATS)
+    assert fresh.disk_hits == 1
+
+
+@pytest.mark.parametrize("raw", [
+    "{\"expires\": 9e99, \"chu",                                 # torn write
+    "{}",
+    "[]",
+    json.dumps({"expires": 9e99}),
+    json.dumps({"expires": "soon", "chunks": ["a"]}),
+    json.dumps({"expires": 9e99, "chunks": [1, 2]}),
+    json.dumps({"expires": 9e99, "chunks": ["a"], "stats": "fast"}),
+])
+def test_a_malformed_disk_entry_is_a_miss(tmp_path, raw):
+    cache = ResponseCache(disk_dir=str(tmp_path))
+    with open(os.path.join(tmp_path, "k.json"), "w") as f:
+        f.write(raw)
+    assert asyncio.run(cache.get("k")) is None
+    assert cache.misses == 1 and not os.path.exists(os.path.join(tmp_path, "k.json"))
@@ -0,0 +1,48 @@
+"""Prompt agents stream through the Responses API with their memory as input."""
+
+from __future__ import annotations
+import asyncio
+
+import httpx
+
+from app import memory
+from app.persistence import WRITER
+from tests.conftest import REPLY, leave_early, sse, text_of
+
+AGENT = "Agent4oMP"
+
+
+def _stream(base: str, text: str):
+    async def run():
+        async with httpx.AsyncClient(timeout=30) as client:
+            return await sse(client, f"{base}/api/chat/send", {"to": AGENT, "text": text, "stream": True})
+    return asyncio.run(run())
+
+
+def test_memory_goes_upstream_as_input(gateway, openai):
+    memory.save_memory(AGENT, [{"role": "user", "content": "my clan is called Riverside Scouts"},
+                               {"role": "assistant", "content": "noted, Riverside Scouts it is"}])
+    frames = _stream(gateway, "what is my clan called?")
+    assert text_of(frames) == REPLY and frames[-1]["done"]
+
+    sent = openai.bodies[-1]
+    assert "prompt" in sent and sent["stream"] is True
+    contents = [m["content"] for m in sent["input"]]
+    assert "my clan is called Riverside Scouts" in contents
+    assert contents[-1] == "what is my clan called?"
+    assert all("tokens" not in m for m in sent["input"])
+    assert [m["content"] for m in WRITER.view(AGENT)][-1] == REPLY
+
+
+def test_response_failed_becomes_error_frame(gateway, openai):
+    openai.fail_after = 3
+    try:
+        frames = _stream(gateway, "this one fails")
+    finally:
+        openai.fail_after = None
+    assert "injected failure" in frames[-1]["error"]
+    assert frames[-1]["done"]
+
+
+def test_client_leaving_stops_upstream(gateway, openai):
+    assert leave_early(openai, f"{gateway}/api/chat/send", {"to": AGENT, "text": "leave early"})
@@ -0,0 +1,68 @@
+"""Ollama admission: round-robin across agents, caps, bounded affinity, refusals."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.scheduler import OllamaScheduler
+
+
+def _order(sched, submits):
+    """Submit ``(agent, model)`` pairs, then release one grant at a time; returns the grant order."""
+    async def run():
+        tickets = [sched.submit(agent, model) for agent, model in submits]
+        order = []
+        while len(order) < len(tickets):
+            granted = [t for t in tickets if t.granted.done() and not t.done]
+            assert len(granted) <= sched.max_concurrency
+            ticket = min(granted, key=lambda t: t.started)
+            order.append((ticket.agent, ticket.model))
+            ticket.release()
+        return order
+    return asyncio.run(run())
+
+
+def test_agents_take_turns():
+    sched = OllamaScheduler(max_concurrency=1)
+    order = _order(sched, [("Z", "m")] + [("A", "m")] * 4 + [("B", "m"), ("C", "m")])
+    assert [a for a, _ in order] == ["Z", "A", "B", "C", "A", "A", "A"]      # Z holds the slot while the rest queue
+    assert sched.queued == 0 and not sched.running
+
+
+def test_warm_model_first_but_only_for_a_burst():
+    sched = OllamaScheduler(max_concurrency=1, affinity_burst=2)
+    order = _order(sched, [("A", "warm"), ("B", "warm"), ("C", "cold"), ("D", "warm"), ("E", "warm")])
+    assert order == [("A", "warm"), ("B", "warm"), ("D", "warm"), ("C", "cold"), ("E", "warm")]
+
+
+def test_caps_hold():
+    async def run():
+        sched = OllamaScheduler(max_concurrency=3, per_model=2, max_loaded=1)
+        a = [sched.submit(f"A{i}", "m1") for i in range(3)]
+        b = sched.submit("B", "m2")
+        assert [t.granted.done() for t in a] == [True, True, False]   # per-model cap
+        assert not b.granted.done()                                  # would evict a busy model
+        for t in a[:2]:
+            t.release()
+        assert a[2].granted.done() and not b.granted.done()          # m1 is still busy
+        a[2].release()
+        assert b.granted.done()
+        b.release()
+    asyncio.run(run())
+
+
+def test_full_queue_and_timeout_are_503():
+    async def run():
+        sched = OllamaScheduler(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        first = sched.submit("A", "m")                              # granted: not queued
+        waiting = sched.submit("B", "m")
+        with pytest.raises(HTTPException) as full:
+            sched.submit("C", "m")
+        assert full.value.status_code == 503
+        with pytest.raises(HTTPException) as late:
+            await waiting.acquire()
+        assert late.value.status_code == 503 and sched.queued == 0
+        first.release()
+        assert not sched.running
+    asyncio.run(run())
@@ -0,0 +1,87 @@
+"""/send_many fans one message out to several agents over one connection."""
+
+from __future__ import annotations
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from app.persistence import WRITER
+from tests.conftest import REPLY, leave_early, sse
+
+AGENTS  = ["LlamaAgent38BIQ2KM", "LlamaAgent38BIQ3KM", "LlamaAgent38BIQ4KM", "Agent4oM"]
+FAILING = "Agent4oMP"                                            # Responses stream
+
+
+def _texts(frames: List[Dict]) -> Dict[str, str]:
+    texts: Dict[str, str] = {}
+    for f in frames:
+        if "data" in f:
+            texts[f["agent"]] = texts.get(f["agent"], "") + f["data"]
+    return texts
+
+
+def _fan_out(base: str, body: Dict, copies: int = 1) -> List[List[Dict]]:
+    async def run():
+        async with httpx.AsyncClient(timeout=30) as client:
+            return await asyncio.gather(*(sse(client, f"{base}/api/chat/send_many", {**body, "stream": True})
+                                          for _ in range(copies)))
+    return asyncio.run(run())
+
+
+def _stored(agent: str, text: str) -> int:
+    page, _ = WRITER.page(agent, None, 50)
+    return sum(1 for _, m in page if m.get("role") == "user" and m.get("content") == text)
+
+
+def test_streams_are_tagged_and_interleaved(gateway):
+    [frames] = _fan_out(gateway, {"to": AGENTS, "text": "which civ for water maps?"})
+    assert frames[-1] == {"done": True}
+    assert all(f.get("agent") in AGENTS for f in frames[:-1])
+    first_done = next(i for i, f in enumerate(frames) if f.get("done"))
+    assert len({f["agent"] for f in frames[:first_done] if "data" in f}) > 1
+    assert sorted(f["agent"] for f in frames if f.get("done") and "agent" in f) == sorted(AGENTS)
+    assert _texts(frames) == {agent: REPLY for agent in AGENTS}
+
+
+def test_each_agent_persists_the_turn_once(gateway):
+    text = "same question twice"
+    a, b = _fan_out(gateway, {"to": AGENTS + AGENTS[:1], "text": text}, copies=2)
+    assert _texts(a) == _texts(b)
+    for agent in AGENTS:
+        assert _stored(agent, text) == 1
+
+
+def test_one_failing_agent_does_not_stop_the_others(gateway, openai):
+    openai.fail_after = 3
+    try:
+        [frames] = _fan_out(gateway, {"to": [FAILING] + AGENTS[:2], "text": "mixed"})
+    finally:
+        openai.fail_after = None
+    assert {f["agent"] for f in frames if f.get("error")} == {FAILING}
+    assert _texts(frames)[AGENTS[0]] == _texts(frames)[AGENTS[1]] == REPLY
+    assert frames[-1] == {"done": True}
+
+
+def test_without_stream_replies_come_in_request_order(gateway):
+    r = httpx.post(f"{gateway}/api/chat/send_many", json={"to": AGENTS, "text": "no stream"}, timeout=30)
+    replies = r.json()["replies"]
+    assert [x["from"] for x in replies] == AGENTS
+    assert all(x["text"] == REPLY for x in replies)
+    assert "stats" in replies[0]
+
+
+@pytest.mark.parametrize("body", [
+    {"to": AGENTS + ["Nobody"], "text": "x"},
+    {"to": "LlamaBear", "text": "x"},
+    {"to": AGENTS, "text": " "},
+    {"to": [], "text": "x"},
+    {"to": [1, 2], "text": "x"},
+])
+def test_bad_requests(gateway, body):
+    assert httpx.post(f"{gateway}/api/chat/send_many", json=body, timeout=30).status_code == 400
+
+
+def test_client_leaving_stops_upstream(gateway, openai):
+    assert leave_early(openai, f"{gateway}/api/chat/send_many", {"to": AGENTS, "text": "leave early"})
@@ -0,0 +1,121 @@
+"""Identical in-flight turns share one upstream stream and one memory write; flight framing."""
+
+from __future__ import annotations
+import asyncio, time
+from contextlib import aclosing
+
+import httpx
+from fastapi import HTTPException
+
+from app.persistence import WRITER
+from app.singleflight import SingleFlight
+from tests.conftest import REPLY, sse, text_of
+
+AGENT = "LlamaAgent42"
+
+
+async def _burst(base: str, text: str, clients: int):
+    url  = f"{base}/api/chat/send"
+    body = {"to": AGENT, "text": text}
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def one(i: int) -> str:
+            if i % 2:
+                return text_of(await sse(client, url, {**body, "stream": True}))
+            return (await client.post(url, json=body)).json()["text"]
+        return await asyncio.gather(*(one(i) for i in range(clients)))
+
+
+def test_burst_costs_one_upstream_call(gateway, ollama):
+    before  = ollama.requests
+    replies = asyncio.run(_burst(gateway, "status report #1", 12))
+    assert ollama.requests - before == 1
+    assert set(replies) == {REPLY}
+
+
+def test_burst_persists_turn_and_reply_once(gateway):
+    text = "status report #2"
+    asyncio.run(_burst(gateway, text, 8))
+    history = WRITER.view(AGENT)
+    assert [m["content"] for m in history].count(text) == 1
+    assert history[-2]["content"] == text
+    assert (history[-1]["role"], history[-1]["content"]) == ("assistant", REPLY)
+
+
+def test_distinct_turns_are_not_coalesced(gateway, ollama):
+    before = ollama.requests
+
+    async def run():
+        async with httpx.AsyncClient(timeout=30) as client:
+            await asyncio.gather(*(client.post(f"{gateway}/api/chat/send", json={"to": AGENT, "text": f"q{i}"})
+                                   for i in range(3)))
+
+    asyncio.run(run())
+    assert ollama.requests - before == 3
+
+
+async def _tokens(first_gap: float, n: int, gap: float):
+    yield "first "
+    await asyncio.sleep(first_gap)
+    for i in range(n):
+        yield f"t{i} "
+        await asyncio.sleep(gap)
+
+
+def test_first_text_is_not_held_for_the_window():
+    async def run():
+        flights = SingleFlight()
+        flight  = flights.start(None, _tokens(0.3, 10, 0.001))
+        t0, seen = time.perf_counter(), []
+        async with aclosing(flight.batches(window=0.2, max_bytes=1 << 16)) as batches:
+            async for batch in batches:
+                seen.append((time.perf_counter() - t0, batch))
+        return seen
+
+    seen = asyncio.run(run())
+    assert seen[0][1] == ["first "] and seen[0][0] < 0.1        # not after the 200 ms window
+    assert len(seen) <= 3                                       # the rest still coalesced
+    assert "".join(c for _, b in seen for c in b) == "first " + "".join(f"t{i} " for i in range(10))
+
+
+async def _numbers(n: int):
+    for i in range(n):
+        yield f"{i} "
+        await asyncio.sleep(0)
+
+
+def test_lagging_subscriber_is_cut_off_and_the_log_stays_bounded():
+    async def run():
+        flights = SingleFlight(buffer=8)
+        flight  = flights.start("lag", _numbers(100))
+        stalled = flight.subscribe()
+        first   = await stalled.__anext__()                     # reads one chunk, then stops
+        fast    = [c async for c in flight.subscribe()]
+        longest = len(flight.chunks)
+        try:
+            rest = [c async for c in stalled]
+        except HTTPException as exc:
+            rest = exc.status_code
+        return first, fast, longest, rest, flights.get("lag"), flights.stats()
+
+    first, fast, longest, rest, joinable, stats = asyncio.run(run())
+    assert first == "0 " and fast == [f"{i} " for i in range(100)]
+    assert longest <= 8 and rest == 503
+    assert joinable is None and stats["dropped"] == 1
+
+
+async def _drain(stream):
+    return [c async for c in stream]
+
+
+def test_late_joiner_replays_from_the_start():
+    async def run():
+        flights = SingleFlight(buffer=64)
+        flight  = flights.start("late", _numbers(40))
+        early   = flight.subscribe()
+        await early.__anext__()
+        late    = flights.get("late")
+        assert late is flight
+        return await asyncio.gather(_drain(early), _drain(late.subscribe()))
+
+    early, late = asyncio.run(run())
+    assert len(early) == 39 and late == [f"{i} " for i in range(40)]
@@ -0,0 +1,83 @@
+"""``OllamaDecoder``: any buffer split, NDJSON and SSE framing, stats, errors."""
+
+import json
+
+import pytest
+
+from app import stream_decode
+from app.stream_decode import OllamaDecoder, OllamaStats, OllamaStreamError
+
+PIECES = ["Hé", "llo ", "wörld ", "🙂", "\n", "\"quoted\""]
+DONE   = {"done": True, "eval_count": 6, "eval_duration": 2_000_000_000, "prompt_eval_count": 11}
+
+
+def _ndjson(pieces=PIECES, done=DONE) -> bytes:
+    lines = [{"message": {"role": "assistant", "content": p}, "done": False} for p in pieces]
+    return b"".join(json.dumps(obj, ensure_ascii=False).encode() + b"\n" for obj in lines + [done])
+
+
+def _sse(raw: bytes) -> bytes:
+    out = b": keep-alive\r\n\r\nevent: message\r\n"
+    for line in raw.splitlines():
+        out += b"data: " + line + b"\r\n\r\n"
+    return out + b"data: [DONE]\r\n\r\n"
+
+
+def _decode(raw: bytes, sizes):
+    decoder, out, i = OllamaDecoder(), [], 0
+    for size in sizes:
+        out += decoder.feed(raw[i:i + size])
+        i += size
+    out += decoder.feed(raw[i:])
+    return out + decoder.close(), decoder
+
+
+def _loaders():
+    loaders = {"default": stream_decode._loads, "json": lambda b: json.loads(b.decode())}
+    try:
+        import orjson
+        loaders["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    return loaders
+
+
+@pytest.fixture(params=sorted(_loaders()))
+def loader(request, monkeypatch):
+    monkeypatch.setattr(stream_decode, "_loads", _loaders()[request.param])
+
+
+@pytest.mark.parametrize("frame", [_ndjson, lambda: _sse(_ndjson())])
+def test_every_split_point_decodes_the_same(loader, frame):
+    raw = frame()
+    for cut in range(1, len(raw)):                              # includes cuts inside UTF-8 sequences
+        out, decoder = _decode(raw, [cut])
+        assert out == PIECES and decoder.done, cut
+    out, decoder = _decode(raw, [1] * len(raw))
+    assert out == PIECES
+    assert decoder.stats == OllamaStats.from_obj(DONE) and decoder.stats.tokens_per_s == 3.0
+
+
+def test_nothing_after_done_is_read(loader):
+    raw = _ndjson() + _ndjson(["late"])
+    out, decoder = _decode(raw, [7])
+    assert out == PIECES and decoder.close() == []
+
+
+def test_an_unterminated_last_line_is_kept_by_close(loader):
+    raw = _ndjson()[:-1]                                       # no newline after the done line
+    decoder = OllamaDecoder()
+    assert decoder.feed(raw) == PIECES and not decoder.done
+    assert decoder.close() == [] and decoder.done
+
+
+def test_noise_is_skipped(loader):
+    raw = b"\n\n   \nnot json\n{broken\n" + _ndjson()
+    assert _decode(raw, [5])[0] == PIECES
+
+
+def test_an_error_line_raises(loader):
+    raw = _ndjson(["partial "], done={"error": "model 'x' not found"})
+    decoder = OllamaDecoder()
+    with pytest.raises(OllamaStreamError, match="not found"):
+        decoder.feed(raw)
@@ -0,0 +1,85 @@
+"""``tokens.fit``: exact-budget edges, what stays pinned, and block-aligned cuts."""
+
+import pytest
+
+from app import tokens
+from app.tokens import Budget, fit, prompt_tokens
+
+PRIMER = tokens.REPLY_PRIMER["llama3"]
+
+
+def _msg(content, n, role="user"):
+    return {"role": role, "content": content, "tokens": {"llama3": n}}
+
+
+def _history(sizes, system=1):
+    msgs = [_msg(f"system {i}", 10, "system") for i in range(system)]
+    return msgs + [_msg(f"turn {i}", n, "user" if i % 2 else "assistant") for i, n in enumerate(sizes)]
+
+
+def _budget(prompt, **kw):
+    return Budget("llama3", prompt + 100, 100, **kw)
+
+
+def test_an_exact_fit_keeps_everything():
+    msgs = _history([20, 20, 20, 20])
+    assert fit(msgs, _budget(prompt_tokens(msgs, "llama3"))) is msgs
+
+
+def test_one_token_over_drops_the_oldest_unpinned():
+    msgs = _history([20, 20, 20, 20])
+    kept = fit(msgs, _budget(prompt_tokens(msgs, "llama3") - 1))
+    assert kept == msgs[:2] + msgs[3:]                           # system + pinned head, then the suffix
+    assert prompt_tokens(kept, "llama3") <= prompt_tokens(msgs, "llama3") - 1
+
+
+@pytest.mark.parametrize("over", [0, 1, 19, 20, 21])
+def test_the_kept_slice_is_the_longest_fitting_suffix(over):
+    msgs   = _history([5, 20, 20, 20, 20, 20])
+    budget = _budget(prompt_tokens(msgs[:2] + msgs[3:], "llama3") - over)
+    kept   = fit(msgs, budget)
+    assert kept[:2] == msgs[:2] and kept[2:] == msgs[len(msgs) - len(kept) + 2:]
+    assert prompt_tokens(kept, "llama3") <= budget.prompt
+    if len(kept) > 3:                                            # one more message would not have fit
+        assert prompt_tokens(kept, "llama3") + 20 > budget.prompt
+
+
+def test_pins_and_the_newest_message_survive_any_budget():
+    msgs = _history([20, 20, 500], system=2)
+    assert fit(msgs, _budget(10)) == msgs[:3] + msgs[-1:]
+    assert fit(msgs[:3], _budget(10)) == msgs[:3]               # nothing unpinned to drop
+    only_system = _history([], system=3)
+    assert fit(only_system, _budget(1)) is only_system
+
+
+def test_max_prompt_caps_the_room():
+    msgs  = _history([20] * 6)
+    full  = prompt_tokens(msgs, "llama3")
+    assert fit(msgs, Budget("llama3", full * 4, 0, max_prompt=full)) is msgs
+    assert len(fit(msgs, Budget("llama3", full * 4, 0, max_prompt=full - 1))) == len(msgs) - 1
+
+
+def test_block_cuts_hold_the_prefix_still():
+    budget = _budget(400, block=100)
+    exact  = _budget(400)
+    msgs   = _history([])
+    starts = []
+    for i in range(120):
+        msgs.append(_msg(f"turn {i} " + "x" * (i % 7), 15 + i % 11, "user" if i % 2 else "assistant"))
+        kept, tight = fit(msgs, budget), fit(msgs, exact)
+        assert kept[:2] == msgs[:2] and kept[-1] is msgs[-1]
+        assert prompt_tokens(kept, "llama3") <= budget.prompt
+        assert len(kept) <= len(tight)                           # a block cut only ever drops more
+        starts.append(msgs.index(kept[2]) if len(kept) > 2 else None)
+    moves = sum(1 for a, b in zip(starts, starts[1:]) if a != b)
+    assert moves < len(starts) // 3                              # the kept prefix mostly stays put
+
+
+def test_counts_are_cached_and_kept_off_the_wire():
+    msg = {"role": "user", "content": "hello there, general"}
+    n   = tokens.count(msg, "llama3")
+    assert msg["tokens"] == {"llama3": n} and n > tokens.MESSAGE_OVERHEAD["llama3"]
+    msg["content"] = "changed"                                   # counted once; the cache wins
+    assert tokens.count(msg, "llama3") == n
+    assert tokens.wire([msg]) == [{"role": "user", "content": "changed"}]
+    assert PRIMER + n == prompt_tokens([msg], "llama3")